@@ -0,0 +1,242 @@
+"""
+Timeline-based autonomous.
+
+A routine in autonConfig's ROUTINES is a list of steps that run one after
+another:
+
+    ('DRIVE', (x, y, rcw), seconds)   drive like MyRobot.move for seconds; forward is -y, as on the stick
+    ('PATH', name)                    follow a trajectory from trajectory.py until it ends
+    ('HOOK', name, seconds)           toggle a hook ('FRONT', 'BACK', 'LEFT' or 'RIGHT'), then wait
+    ('WAIT', seconds)
+    ('PARALLEL', (step, ...))         start every step together; done when the longest is
+    ('SEQUENCE', (step, ...))         one after another, for use inside PARALLEL
+
+Every routine is compiled at startup into a Timeline: the drive segments
+(DRIVE and PATH steps) sorted by start time, and the hook toggles sorted
+by time. Drive segments must not overlap; hook toggles can happen
+alongside anything. While the robot drives nothing else has to wait, so a
+hook can go up while the robot is moving.
+
+Each loop reads the clock once. The active drive segment is found by
+advancing a cursor, since time only moves forward; the toggles fire as the
+clock passes them. Which routine runs is picked from the dashboard
+(Auton/routine) when autonomous starts, defaulting to autonConfig's ROUTINE.
+"""
+from bisect import bisect_right
+
+import logger
+from tunables import tunables
+
+log = logger.get_logger('auton')
+
+HOOK_NAMES = ('FRONT', 'BACK', 'LEFT', 'RIGHT')
+
+STOP = (0.0, 0.0, 0.0)
+
+
+class Timeline:
+    """
+    One compiled routine.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        # Drive segments, sorted by start: an (x, y, rcw) or a Trajectory each
+        self.starts = []
+        self.ends = []
+        self.drives = []
+        # Hook toggles, sorted by time
+        self.toggle_times = []
+        self.toggles = []
+        self.duration = 0.0
+
+        self.reset()
+
+    def reset(self):
+        self.cursor = 0
+        self.fired = 0
+
+    def drive_at(self, elapsed):
+        """
+        :param elapsed: seconds since the routine started; each call should be no earlier than the last
+        :returns: the index of the active drive segment, or -1 between segments
+        """
+        ends = self.ends
+        cursor = self.cursor
+
+        if cursor and elapsed < ends[cursor - 1]:
+            # The clock went back: find the place again
+            cursor = bisect_right(ends, elapsed)
+        while cursor < len(ends) and elapsed >= ends[cursor]:
+            cursor += 1
+
+        self.cursor = cursor
+        if cursor < len(ends) and self.starts[cursor] <= elapsed:
+            return cursor
+        return -1
+
+    def due_toggles(self, elapsed):
+        """
+        :returns: the hooks to toggle that came due since the last call
+        """
+        start = self.fired
+        end = bisect_right(self.toggle_times, elapsed, start)
+        self.fired = end
+        return self.toggles[start:end]
+
+
+def _compile(step, start, timeline, trajectories):
+    """
+    Add a step starting at start to the timeline.
+    :returns: when the step is done
+    """
+    kind = step[0]
+
+    if kind == 'PATH':
+        name = step[1]
+        if name not in trajectories:
+            raise ValueError("%s: unknown path %s" % (timeline.name, name))
+        trajectory = trajectories[name]
+        end = start + trajectory.duration
+        timeline.starts.append(start)
+        timeline.ends.append(end)
+        timeline.drives.append(trajectory)
+        return end
+
+    if kind == 'DRIVE':
+        vector, seconds = step[1], step[2]
+        end = start + seconds
+        timeline.starts.append(start)
+        timeline.ends.append(end)
+        timeline.drives.append(tuple(float(value) for value in vector))
+        return end
+
+    if kind == 'HOOK':
+        name, seconds = step[1], step[2]
+        if name not in HOOK_NAMES:
+            raise ValueError("%s: unknown hook %s" % (timeline.name, name))
+        timeline.toggle_times.append(start)
+        timeline.toggles.append(name)
+        return start + seconds
+
+    if kind == 'WAIT':
+        return start + step[1]
+
+    if kind == 'SEQUENCE':
+        for child in step[1]:
+            start = _compile(child, start, timeline, trajectories)
+        return start
+
+    if kind == 'PARALLEL':
+        return max((_compile(child, start, timeline, trajectories) for child in step[1]), default=start)
+
+    raise ValueError("%s: unknown step %s" % (timeline.name, kind))
+
+
+def compile_routine(name, steps, trajectories=None):
+    """
+    :param name: the routine's name, for errors
+    :param steps: the routine's steps, run one after another
+    :param trajectories: {name: Trajectory} for the PATH steps
+    :returns: the Timeline
+    """
+    timeline = Timeline(name)
+    timeline.duration = _compile(('SEQUENCE', steps), 0.0, timeline, trajectories or {})
+
+    # Sort the drive segments by start, then make sure none overlap
+    order = sorted(range(len(timeline.starts)), key=timeline.starts.__getitem__)
+    timeline.starts = [timeline.starts[index] for index in order]
+    timeline.ends = [timeline.ends[index] for index in order]
+    timeline.drives = [timeline.drives[index] for index in order]
+    for index in range(1, len(order)):
+        if timeline.starts[index] < timeline.ends[index - 1]:
+            raise ValueError("%s: drive steps overlap at %.2f s" % (name, timeline.starts[index]))
+
+    order = sorted(range(len(timeline.toggle_times)), key=timeline.toggle_times.__getitem__)
+    timeline.toggle_times = [timeline.toggle_times[index] for index in order]
+    timeline.toggles = [timeline.toggles[index] for index in order]
+
+    return timeline
+
+
+class Autonomous:
+    """
+    Runs the selected routine's timeline.
+    """
+
+    def __init__(self, config, trajectories=None):
+        """
+        :param config: autonConfig
+        :param trajectories: {name: Trajectory} for the PATH steps
+        """
+        self.routines = {name: compile_routine(name, steps, trajectories) for name, steps in config['ROUTINES'].items()}
+        self.default = config['ROUTINE']
+        if self.default not in self.routines:
+            raise ValueError("Unknown autonomous routine %s" % self.default)
+
+        self.selected = tunables.register('/SmartDashboard/Auton/routine', self.default)
+
+        self.timeline = None
+        self.start_time = None
+        self.drive = None
+        self.hooks = None
+        self.follower = None
+        self._driving = -1
+
+    def start(self, drive, hooks, follower=None):
+        """
+        Start the routine picked on the dashboard.
+        :param drive: called with (x, y, rcw) every loop, like MyRobot.move; None without a drivetrain
+        :param hooks: the Hooks, or None
+        :param follower: the HolonomicFollower for PATH steps; None without odometry
+        """
+        name = self.selected.value
+        if name not in self.routines:
+            log.warning("unknown autonomous routine %s, running %s", name, self.default)
+            name = self.default
+
+        self.timeline = self.routines[name]
+        self.timeline.reset()
+        self.start_time = None
+        self.drive = drive
+        self.hooks = hooks
+        self.follower = follower
+        self._driving = -1
+        log.info("autonomous routine %s, %.2f s", name, self.timeline.duration)
+
+    def update(self, now):
+        """
+        Run one loop of the routine.
+        :param now: the time, read once for the whole loop
+        """
+        timeline = self.timeline
+        if timeline is None:
+            return
+
+        if self.start_time is None:
+            self.start_time = now
+        elapsed = now - self.start_time
+
+        hooks = self.hooks
+        for name in timeline.due_toggles(elapsed):
+            log.info("%.2f s: toggle the %s hook", elapsed, name.lower())
+            if hooks:
+                getattr(hooks, 'change_' + name.lower())()
+        if hooks:
+            hooks.update()
+
+        index = timeline.drive_at(elapsed)
+        drive = timeline.drives[index] if index >= 0 else STOP
+        if index != self._driving:
+            log.info("%.2f s: drive %s", elapsed, drive)
+            self._driving = index
+
+        if not self.drive:
+            return
+        if isinstance(drive, tuple):
+            self.drive(*drive)
+        elif self.follower:
+            self.drive(*self.follower.command(drive, elapsed - timeline.starts[index]))
+        else:
+            # A path needs the odometry
+            self.drive(*STOP)
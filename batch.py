@@ -0,0 +1,191 @@
+"""
+Batch evaluation of the swerve command pipeline with NumPy.
+
+Pushes whole arrays of (fwd, strafe, rcw, gyro angle) samples, and optionally
+the gyro rate for the heading prediction, through the
+same math as SwerveDrive.move, SwerveDrive._calculate_vectors and
+SwerveModule.move, in one vectorized call and without any hardware:
+
+    from batch import evaluate
+    commands = evaluate(fwd, strafe, rcw, gyro_angle)
+    commands.speeds[:, 0], commands.angles[:, 0], ...
+
+Columns are modules in MODULE_KEYS order. The module flip logic compares
+each requested angle with the module's current angle; offline there is no
+current angle, so the modules are assumed to reach every requested angle
+before the next sample, as they do in a settled loop.
+
+The setpoint generator (MAX_STEER_RATE) and cosine scaling depend on where
+the wheels point, so they are not modeled either: the results match a
+drivetrain with both off, as drivetrainConfig has them by default.
+
+Needs NumPy, which the robot itself does not.
+"""
+from collections import namedtuple
+
+import numpy
+
+from kinematics import SwerveKinematics
+from robotconfig import drivetrainConfig
+
+# The SwerveDrive dashboard defaults
+XY_MULTIPLIER = 0.65
+ROTATION_MULTIPLIER = 0.5
+
+# speeds: the drive motor output of every module, after flipping
+# angles: the steering setpoint of every module, 0 to 360 degrees
+# flipped: whether the module was flipped (driving backwards) at each sample
+BatchCommands = namedtuple('BatchCommands', ['speeds', 'angles', 'flipped'])
+
+
+def _square(values):
+    return numpy.copysign(values * values, values)
+
+
+def chassis_vectors(fwd, strafe, rcw, gyro_angle, xy_multiplier=XY_MULTIPLIER,
+                    rotation_multiplier=ROTATION_MULTIPLIER, squared_inputs=False,
+                    gyro_rate=None, lookahead=0.0, gyro_acceleration=None):
+    """
+    SwerveDrive.move for arrays: the field-oriented request rotated into the
+    chassis frame, filtered and scaled.
+    :param gyro_angle: SwerveDrive.getGyroAngle() for every sample, degrees
+    :param gyro_rate: the sampled gyro rate for every sample, degrees per second; with lookahead,
+                      like SwerveDrive.enable_heading_prediction
+    :param lookahead: SwerveDrive.heading_lookahead, seconds
+    :param gyro_acceleration: SwerveDrive.gyro_acceleration for every sample, for the second-order prediction
+    :returns: (fwd, strafe, rcw) arrays in the chassis frame
+    """
+    fwd = numpy.asarray(fwd, dtype=float)
+    strafe = numpy.asarray(strafe, dtype=float)
+    rcw = numpy.asarray(rcw, dtype=float)
+
+    gyro_angle = numpy.asarray(gyro_angle, dtype=float)
+    if lookahead and gyro_rate is not None:
+        gyro_angle = gyro_angle + numpy.asarray(gyro_rate, dtype=float) * lookahead
+        if gyro_acceleration is not None:
+            gyro_angle = gyro_angle + 0.5 * numpy.asarray(gyro_acceleration, dtype=float) * lookahead * lookahead
+
+    heading = numpy.radians(gyro_angle)
+    cos_heading = numpy.cos(heading)
+    sin_heading = numpy.sin(heading)
+
+    magnitude = numpy.hypot(fwd, strafe)
+    scale = numpy.where(magnitude > 1.0, 1.0 / numpy.maximum(magnitude, 1.0), 1.0)
+    fwd = fwd * scale
+    strafe = strafe * scale
+
+    chassis_strafe = strafe * cos_heading + fwd * sin_heading
+    chassis_fwd = fwd * cos_heading - strafe * sin_heading
+
+    if squared_inputs:
+        chassis_fwd = _square(chassis_fwd)
+        chassis_strafe = _square(chassis_strafe)
+        rcw = _square(rcw)
+
+    return chassis_fwd * xy_multiplier, chassis_strafe * xy_multiplier, rcw * rotation_multiplier
+
+
+def module_vectors(fwd, strafe, rcw, kinematics, lower_input_thresh=None, initial_angles=None):
+    """
+    SwerveDrive._calculate_vectors for arrays.
+    :param kinematics: the SwerveKinematics of the chassis
+    :param lower_input_thresh: drop inputs below this, like threshold_input_vectors; None to keep them
+    :param initial_angles: the module angles before the first sample, held while the input is dropped
+    :returns: (speeds, angles) arrays of shape (samples, modules); angles in degrees from -180 to 180
+    """
+    fwd = numpy.array(fwd, dtype=float)
+    strafe = numpy.array(strafe, dtype=float)
+    rcw = numpy.array(rcw, dtype=float)
+
+    largest = numpy.maximum(numpy.maximum(numpy.abs(fwd), numpy.abs(strafe)), numpy.abs(rcw))
+    scale = numpy.where(largest > 1.0, 1.0 / numpy.maximum(largest, 1.0), 1.0)
+    fwd *= scale
+    strafe *= scale
+    rcw *= scale
+
+    idle = None
+    if lower_input_thresh is not None:
+        for values in (fwd, strafe, rcw):
+            values[numpy.abs(values) < lower_input_thresh] = 0.0
+        idle = (fwd == 0) & (strafe == 0) & (rcw == 0)
+
+    left_rcw = numpy.array([row[1] for row in kinematics.inverse_rows])
+    forward_rcw = numpy.array([row[2] for row in kinematics.inverse_rows])
+
+    left = strafe[:, None] + rcw[:, None] * left_rcw
+    forward = fwd[:, None] + rcw[:, None] * forward_rcw
+    speeds = numpy.hypot(left, forward)
+    angles = numpy.degrees(numpy.arctan2(left, forward))
+
+    fastest = speeds.max(axis=1, keepdims=True)
+    speeds /= numpy.where(fastest > 1.0, fastest, 1.0)
+
+    if idle is not None and idle.any():
+        # The drive stops but does NOT reset the wheel angles: carry the last angle forward
+        speeds[idle] = 0.0
+        last = numpy.where(idle, -1, numpy.arange(len(idle)))
+        numpy.maximum.accumulate(last, out=last)
+        held = angles[numpy.maximum(last, 0)]
+        # Before the first active sample, the angles the drive started with
+        held[last < 0] = 0.0 if initial_angles is None else initial_angles
+        angles = numpy.where(idle[:, None], held, angles)
+
+    return speeds, angles
+
+
+def module_commands(speeds, angles, initial_angles=None, allow_reverse=True):
+    """
+    SwerveModule.move for arrays: flip a module instead of turning it more than 90 degrees.
+    :param speeds: (samples, modules) requested speeds
+    :param angles: (samples, modules) requested angles in degrees
+    :param initial_angles: every module's angle before the first sample, 0 to 360
+    :returns: BatchCommands
+    """
+    speeds = numpy.asarray(speeds, dtype=float)
+    angles = numpy.asarray(angles, dtype=float)
+    requested = angles % 360
+
+    if not allow_reverse:
+        return BatchCommands(speeds, requested, numpy.zeros(speeds.shape, dtype=bool))
+
+    if initial_angles is None:
+        initial_angles = numpy.zeros(speeds.shape[1])
+
+    # The module settled on the previous setpoint, so that is its current angle
+    current = numpy.empty_like(requested)
+    current[0] = numpy.asarray(initial_angles, dtype=float) % 360
+    current[1:] = requested[:-1]
+
+    # Same distance as SwerveModule.move, including how it treats differences over 360
+    diff = numpy.abs(angles - current)
+    diff = numpy.where(diff > 180, 360 - diff, diff)
+
+    # Every toggle flips the module, so the state is the running XOR of the toggles
+    flipped = (numpy.cumsum(diff > 90, axis=0) & 1).astype(bool)
+
+    return BatchCommands(numpy.where(flipped, -speeds, speeds), requested, flipped)
+
+
+def evaluate(fwd, strafe, rcw, gyro_angle, positions=None, xy_multiplier=XY_MULTIPLIER,
+             rotation_multiplier=ROTATION_MULTIPLIER, squared_inputs=False, lower_input_thresh=None,
+             initial_angles=None, gyro_rate=None, lookahead=0.0, gyro_acceleration=None):
+    """
+    Run arrays of drive requests through the whole pipeline, from SwerveDrive.move to SwerveModule.move.
+    :param fwd: forward requests, like SwerveDrive.move
+    :param strafe: left requests
+    :param rcw: clockwise rotation requests
+    :param gyro_angle: SwerveDrive.getGyroAngle() at every sample, degrees
+    :param positions: (left, forward) of each module in meters; defaults to drivetrainConfig
+    :param lower_input_thresh: drop inputs below this, like threshold_input_vectors; None to keep them
+    :param initial_angles: every module's angle before the first sample
+    :param gyro_rate: the sampled gyro rate at every sample, degrees per second, for the heading prediction
+    :param lookahead: the heading prediction's lookahead, ROTATION_CORRECTION; 0 to use gyro_angle as it is
+    :param gyro_acceleration: the gyro rate's change at every sample, for the second-order prediction
+    :returns: BatchCommands with arrays of shape (samples, modules)
+    """
+    kinematics = SwerveKinematics(positions or drivetrainConfig['MODULE_POSITIONS'])
+
+    chassis = chassis_vectors(fwd, strafe, rcw, gyro_angle, xy_multiplier, rotation_multiplier, squared_inputs,
+                              gyro_rate, lookahead, gyro_acceleration)
+    speeds, angles = module_vectors(*chassis, kinematics, lower_input_thresh, initial_angles)
+    return module_commands(speeds, angles, initial_angles)
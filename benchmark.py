@@ -0,0 +1,257 @@
+"""
+Benchmarks for the drivetrain and robot-loop hot paths.
+
+Runs against the simulated devices from simulation.py, writes the results
+to a JSON file and compares them with the baseline committed in
+benchmark_baseline.json. A missing baseline fails the run, and so does a
+case that is only in the baseline or only in the results: the config
+decides which cases exist (SwerveDrive.steer needs the scheduler), so the
+baseline must be taken with the same config. Cases that got slower than
+the baseline by more than the tolerance are reported; they only fail the
+run with --strict.
+
+    $ python benchmark.py                   # run and compare with the baseline
+    $ python benchmark.py --strict          # ... and fail on a slowdown too
+    $ python benchmark.py --save-baseline   # run and store the results as the new baseline
+
+Times are also stored relative to a fixed pure-Python calibration workload,
+and the comparison uses that ratio, so a baseline taken on one machine is
+still meaningful on another. Each case's time is the fastest of REPEATS
+runs, the one least disturbed by the rest of the machine.
+
+The slowdown check is advisory because it is only as steady as the machine:
+on a shared single-core VM six back-to-back runs of the same code spread
+their ratios by 30 to 130%, far more than any regression worth catching.
+Use --strict on a quiet machine, where repeated runs stay within a few
+percent of each other and TOLERANCE leaves room for that.
+
+The baseline records the command, machine, Python and robot config it was
+taken with under 'generated'. To regenerate it, run
+python benchmark.py --save-baseline from the repository root, with the
+robot's dependencies installed, and commit benchmark_baseline.json.
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+
+from simulation import Simulation
+
+RESULTS_FILE = 'bench_results.json'
+BASELINE_FILE = 'benchmark_baseline.json'
+
+# A case is reported as a slowdown when it is this much slower than the baseline
+TOLERANCE = 0.25
+
+ITERATIONS = 2000
+REPEATS = 7
+
+
+def calibrate(iterations=ITERATIONS):
+    """
+    A fixed workload of float math and attribute access, roughly the mix
+    the robot loop does. Used to normalize the other results.
+    """
+    values = [0.1 * index for index in range(16)]
+
+    def workload():
+        total = 0.0
+        for value in values:
+            total += value * value - total * 0.5
+        return total
+
+    return time_case(workload, [()], iterations)
+
+
+def time_case(func, inputs, iterations=ITERATIONS, repeats=REPEATS):
+    """
+    :param func: the function to time
+    :param inputs: argument tuples, cycled through so every call gets different input
+    :returns: nanoseconds per call, the fastest mean of all repeats
+    """
+    count = len(inputs)
+    best = None
+
+    for repeat in range(repeats):
+        start = time.perf_counter_ns()
+        for index in range(iterations):
+            func(*inputs[index % count])
+        elapsed = (time.perf_counter_ns() - start) / iterations
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def build_cases(sim, samples=64, seed=1076):
+    """
+    :param sim: a Simulation in teleop
+    :returns: (name, function, inputs) for every benchmark
+    """
+    rng = random.Random(seed)
+    robot = sim.robot
+    drivetrain = robot.drivetrain
+    module = drivetrain.modules['front_left']
+    driver = sim.driver
+
+    sticks = [(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1)) for sample in range(samples)]
+    module_inputs = [(rng.uniform(0, 1), rng.uniform(-180, 180)) for sample in range(samples)]
+
+    def calculate_vectors(fwd, strafe, rcw):
+        vectors = drivetrain._requested_vectors
+        vectors[0] = fwd
+        vectors[1] = strafe
+        vectors[2] = rcw
+        drivetrain._calculate_vectors()
+
+    def teleop_periodic(x, y, rcw):
+        driver.axes['RightX'] = x
+        driver.axes['RightY'] = y
+        driver.axes['LeftX'] = rcw
+        robot.teleopPeriodic()
+
+    cases = [
+        ('SwerveDrive.move', drivetrain.move, sticks),
+        ('SwerveDrive._calculate_vectors', calculate_vectors, sticks),
+        ('SwerveDrive.execute', drivetrain.execute, [()]),
+        ('SwerveModule.move', module.move, module_inputs),
+        ('SwerveModule.execute', module.execute, [()]),
+    ]
+
+    if drivetrain.steering_scheduled:
+        cases.append(('SwerveDrive.steer', drivetrain.steer, [()]))
+
+    if robot.hooks:
+        cases.append(('Hooks.update', robot.hooks.update, [()]))
+
+    cases.append(('MyRobot.teleopPeriodic', teleop_periodic, sticks))
+    cases.append(('MyRobot.robotPeriodic', robot.robotPeriodic, [()]))
+
+    return cases
+
+
+def run(iterations=ITERATIONS, repeats=REPEATS):
+    """
+    :returns: the results: how they were generated, calibration time and,
+        per case, nanoseconds per call and ratio to the calibration
+    """
+    sim = Simulation()
+    sim.enable('teleop')
+    # Let the modules settle so the steering PID sees realistic errors
+    sim.run(1.0)
+
+    calibration = calibrate(iterations)
+    cases = {}
+    for name, func, inputs in build_cases(sim):
+        cases[name] = time_case(func, inputs, iterations, repeats)
+    # Calibrate again afterwards and keep the faster one, in case the machine was busy
+    calibration = min(calibration, calibrate(iterations))
+
+    results = {
+        'python': sys.version.split()[0],
+        'generated': {
+            'command': ' '.join(['python', 'benchmark.py'] + sys.argv[1:]),
+            'date': datetime.date.today().isoformat(),
+            'machine': '%s, %s' % (platform.platform(), platform.processor() or platform.machine()),
+            'config': sorted(sim.robot.config),
+            'iterations': iterations,
+            'repeats': repeats,
+        },
+        'calibration_ns': calibration,
+        'cases': {},
+    }
+
+    for name, ns in cases.items():
+        results['cases'][name] = {'ns': ns, 'ratio': ns / calibration}
+
+    return results
+
+
+def mismatches(results, baseline):
+    """
+    :returns: a line for every case that is in the results or the baseline but not both
+    """
+    lines = ['%s: not in the baseline' % name for name in results['cases'] if name not in baseline['cases']]
+    lines.extend('%s: in the baseline but not run' % name for name in baseline['cases'] if name not in results['cases'])
+    return lines
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    :returns: the names of the cases that got slower than the baseline by more than the tolerance
+    """
+    regressions = []
+    for name, result in results['cases'].items():
+        reference = baseline['cases'][name]
+        if result['ratio'] > reference['ratio'] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def report(results, baseline=None):
+    lines = ['%-34s %10s %10s %10s' % ('case', 'us/call', 'baseline', 'change')]
+    for name, result in results['cases'].items():
+        reference = baseline['cases'].get(name) if baseline else None
+        if reference:
+            change = result['ratio'] / reference['ratio'] - 1
+            lines.append('%-34s %10.2f %10.2f %+9.0f%%' % (
+                name, result['ns'] / 1000, reference['ratio'] * results['calibration_ns'] / 1000, change * 100))
+        else:
+            lines.append('%-34s %10.2f %10s %10s' % (name, result['ns'] / 1000, '-', '-'))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=RESULTS_FILE, help='where to write the results')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='the baseline to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown, 0.25 is 25%%')
+    parser.add_argument('--strict', action='store_true', help='fail when a case is slower than the tolerance allows')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    args = parser.parse_args(argv)
+
+    results = run(args.iterations, args.repeats)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(report(results))
+        print('\nSaved baseline to %s' % args.baseline)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(report(results))
+        print('\nFAILED: no baseline at %s; run with --save-baseline to create one' % args.baseline)
+        return 1
+
+    print(report(results, baseline))
+
+    missing = mismatches(results, baseline)
+    if missing:
+        print('\nFAILED: the cases do not match the baseline; regenerate it with the same config:\n  %s' % '\n  '.join(missing))
+        return 1
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('\n%s: slower than the baseline by more than %d%%: %s' % (
+            'FAILED' if args.strict else 'WARNING', args.tolerance * 100, ', '.join(regressions)))
+        return 1 if args.strict else 0
+
+    print('\nOK: no case slower than the baseline by more than %d%%' % (args.tolerance * 100))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
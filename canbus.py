@@ -0,0 +1,303 @@
+"""
+Motor output layer: drops redundant CAN writes and counts the ones sent.
+
+Every SparkMax the robot creates is wrapped in a MotorOutput. A set(),
+setVoltage() or PID setReference() that asks for the same thing as the last
+frame sent to that device (same control mode, value within that mode's
+epsilon) is not sent, unless KEEPALIVE seconds have passed since the last
+frame, so the motor controller's safety timeout still sees regular frames.
+Everything else is passed through to the device untouched. When the robot
+is enabled, the last frames are forgotten so the first outputs always go out.
+
+Each device counts the frames it sent and suppressed. report() turns them
+into frames per second and an estimate of the bus load, and the totals are
+published to the dashboard.
+
+The devices' own status frames are set here too, from the per-role profiles
+in robotconfig's statusFrameConfig, and verify_status_frames() checks at
+startup that every device took its settings.
+"""
+import threading
+
+import wpilib
+
+from telemetry import telemetry, SLOW
+
+# Values closer than this to the last frame count as unchanged, in the units of each control mode.
+# Absolute, not relative: an unwrapped steering position far from zero must move as finely as one near it.
+EPSILON = 1e-3              # duty cycle
+VOLTAGE_EPSILON = 1e-2      # volts, also for the PID's arbitrary feedforward
+POSITION_EPSILON = 1e-2     # the encoder's position units; module degrees for onboard steering
+VELOCITY_EPSILON = 0.5      # the encoder's velocity units; motor RPM for the drive
+
+# Resend an unchanged value after this many seconds
+KEEPALIVE = 0.1
+
+# An extended CAN frame with 8 data bytes, including worst-case bit stuffing, on a 1 Mbit/s bus
+FRAME_BITS = 160
+BUS_BITRATE = 1000000
+
+# Status frames by their robotconfig names: (the frame's name in the vendor library, factory period in milliseconds)
+SPARKMAX_STATUS_FRAMES = {
+    'STATUS_0': ('kStatus0', 10),
+    'STATUS_1': ('kStatus1', 20),
+    'STATUS_2': ('kStatus2', 20),
+    'STATUS_3': ('kStatus3', 50),
+}
+CANCODER_STATUS_FRAMES = {
+    'SENSOR_DATA': ('SensorData', 10),
+    'VBAT_AND_FAULTS': ('VbatAndFaults', 100),
+}
+
+# How long a CTRE device may take to answer a configuration call, in milliseconds; only used at startup
+CONFIG_TIMEOUT = 50
+
+# Control modes of the frames, besides the PID controller's control types
+DUTY_CYCLE = 'duty'
+VOLTAGE = 'voltage'
+
+
+class MotorOutput:
+    """
+    Wraps a motor controller and only sends a frame when the output changes
+    or the keepalive is due.
+    """
+
+    def __init__(self, device, name, keepalive=KEEPALIVE):
+        self.device = device
+        self.name = name
+        self.keepalive = keepalive
+
+        self.sent = 0
+        self.suppressed = 0
+
+        self._mode = None
+        self._value = 0.0
+        self._feedforward = 0.0
+        self._time = 0.0
+        self._pid = None
+
+    def __getattr__(self, name):
+        # Everything that isn't a write goes straight to the device
+        return getattr(self.device, name)
+
+    def _changed(self, mode, value, feedforward, epsilon):
+        """
+        :param epsilon: the largest change of value that counts as unchanged
+        :returns: True if a frame with this output should be sent now, and records it as sent
+        """
+        now = wpilib.Timer.getFPGATimestamp()
+
+        if (mode == self._mode
+                and abs(value - self._value) <= epsilon
+                and abs(feedforward - self._feedforward) <= VOLTAGE_EPSILON
+                and now - self._time < self.keepalive):
+            self.suppressed += 1
+            return False
+
+        self._mode = mode
+        self._value = value
+        self._feedforward = feedforward
+        self._time = now
+        self.sent += 1
+        return True
+
+    def set(self, speed):
+        if self._changed(DUTY_CYCLE, speed, 0.0, EPSILON):
+            self.device.set(speed)
+
+    def setVoltage(self, volts):
+        if self._changed(VOLTAGE, volts, 0.0, VOLTAGE_EPSILON):
+            self.device.setVoltage(volts)
+
+    def stopMotor(self):
+        # Always sent: stopping must never be dropped, and the next write always goes out after it
+        self._mode = None
+        self._value = 0.0
+        self._feedforward = 0.0
+        self._time = wpilib.Timer.getFPGATimestamp()
+        self.sent += 1
+        self.device.stopMotor()
+
+    def getPIDController(self):
+        if self._pid is None:
+            self._pid = PIDOutput(self, self.device.getPIDController())
+        return self._pid
+
+    def reset(self):
+        """
+        Forget the last frame, so the next write is always sent.
+        """
+        self._mode = None
+
+
+class PIDOutput:
+    """
+    Wraps a SparkMax PID controller; setReference is deduplicated with the
+    motor's other writes, everything else goes straight through.
+    """
+
+    def __init__(self, output, controller):
+        import rev
+
+        self.output = output
+        self.controller = controller
+
+        control_type = rev.CANSparkMax.ControlType
+        self._epsilons = {
+            control_type.kDutyCycle: EPSILON,
+            control_type.kVoltage: VOLTAGE_EPSILON,
+            control_type.kPosition: POSITION_EPSILON,
+            control_type.kVelocity: VELOCITY_EPSILON,
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.controller, name)
+
+    def setReference(self, value, controlType, pidSlot=0, arbFeedforward=0.0, *args):
+        # Other control types (e.g. Smart Motion) are always sent
+        epsilon = self._epsilons.get(controlType, 0.0)
+        if self.output._changed((controlType, pidSlot), value, arbFeedforward, epsilon):
+            self.controller.setReference(value, controlType, pidSlot, arbFeedforward, *args)
+
+
+class CANBus:
+    """
+    Keeps every MotorOutput so the frame counts can be reported together.
+    """
+
+    def __init__(self):
+        self.outputs = []
+        self._start = None
+
+        # (name, device, {frame name: period}, [problems]) of every device whose status frames were set
+        self.status_frames = []
+
+        # Devices are brought up in parallel at startup
+        self._lock = threading.Lock()
+
+    def wrap(self, device, name):
+        """
+        :param device: the motor controller
+        :param name: how the device is shown in reports
+        :returns: the MotorOutput wrapping it
+        """
+        output = MotorOutput(device, name)
+        with self._lock:
+            if not self.outputs:
+                telemetry.add_number('CAN/sent', lambda: self.total('sent'), rate=SLOW)
+                telemetry.add_number('CAN/suppressed', lambda: self.total('suppressed'), rate=SLOW)
+                telemetry.add_number('CAN/load', self.load, rate=SLOW, deadband=0.001)
+            self.outputs.append(output)
+        return output
+
+    def total(self, counter):
+        """
+        :param counter: 'sent' or 'suppressed'
+        """
+        return sum(getattr(output, counter) for output in self.outputs)
+
+    def _elapsed(self):
+        now = wpilib.Timer.getFPGATimestamp()
+        if self._start is None:
+            self._start = now
+        return max(now - self._start, 1e-9)
+
+    def load(self):
+        """
+        :returns: the estimated share of the bus taken by motor control frames since the last reset, 0 to 1
+        """
+        return self.total('sent') / self._elapsed() * FRAME_BITS / BUS_BITRATE
+
+    def report(self):
+        """
+        :returns: a table of frames sent and suppressed per device, with the bus load estimate
+        """
+        elapsed = self._elapsed()
+        lines = ['%-24s %8s %10s %8s' % ('device', 'sent', 'suppressed', 'frames/s')]
+        for output in self.outputs:
+            lines.append('%-24s %8d %10d %8.1f' % (output.name, output.sent, output.suppressed, output.sent / elapsed))
+        lines.append('estimated control frame load: %.1f%% of the bus' % (self.load() * 100))
+        return '\n'.join(lines)
+
+    def set_status_frames(self, device, name, profile):
+        """
+        Set a device's status frame periods and remember them for verify_status_frames().
+        Frames the profile leaves out keep their factory period.
+        :param device: a SparkMax, wrapped or not, or a CANCoder
+        :param name: how the device is shown in reports
+        :param profile: {frame name: period in milliseconds}, from robotconfig's statusFrameConfig
+        """
+        import ctre
+        import rev
+
+        sparkmax = hasattr(device, 'setPeriodicFramePeriod')
+        frames = SPARKMAX_STATUS_FRAMES if sparkmax else CANCODER_STATUS_FRAMES
+        problems = []
+
+        for frame, period in profile.items():
+            if frame not in frames:
+                raise ValueError("%s has no status frame %s" % (name, frame))
+
+            if sparkmax:
+                error = device.setPeriodicFramePeriod(getattr(rev.CANSparkMaxLowLevel.PeriodicFrame, frames[frame][0]), period)
+                if error != rev.REVLibError.kOk:
+                    problems.append('%s: %s' % (frame, error))
+            else:
+                error = device.setStatusFramePeriod(getattr(ctre.CANCoderStatusFrame, frames[frame][0]), period, CONFIG_TIMEOUT)
+                if error != ctre.ErrorCode.OK:
+                    problems.append('%s: %s' % (frame, error))
+
+        with self._lock:
+            self.status_frames.append((name, device, profile, problems))
+
+    def verify_status_frames(self):
+        """
+        Check that every device took its status frame periods. The SparkMax
+        can't report its periods back, so its settings are checked by the
+        errors they returned; the CANCoder's are read back.
+        :returns: a list of 'device: problem' strings, empty if all is well
+        """
+        import ctre
+
+        failures = []
+        for name, device, profile, problems in self.status_frames:
+            failures.extend('%s: %s' % (name, problem) for problem in problems)
+
+            if not hasattr(device, 'setPeriodicFramePeriod'):
+                for frame, period in profile.items():
+                    status_frame = getattr(ctre.CANCoderStatusFrame, CANCODER_STATUS_FRAMES[frame][0])
+                    actual = device.getStatusFramePeriod(status_frame, CONFIG_TIMEOUT)
+                    if actual != period:
+                        failures.append('%s: %s is %d ms, expected %d' % (name, frame, actual, period))
+
+        return failures
+
+    def status_frame_load(self, factory=False):
+        """
+        :param factory: estimate the load at the factory periods instead
+        :returns: the estimated share of the bus taken by the configured devices' status frames, 0 to 1
+        """
+        frames_per_second = 0.0
+        for name, device, profile, problems in self.status_frames:
+            frames = SPARKMAX_STATUS_FRAMES if hasattr(device, 'setPeriodicFramePeriod') else CANCODER_STATUS_FRAMES
+            for frame, (vendor_name, factory_period) in frames.items():
+                period = factory_period if factory else profile.get(frame, factory_period)
+                frames_per_second += 1000.0 / period
+        return frames_per_second * FRAME_BITS / BUS_BITRATE
+
+    def reset(self):
+        for output in self.outputs:
+            output.sent = 0
+            output.suppressed = 0
+        self._start = wpilib.Timer.getFPGATimestamp()
+
+    def resend(self):
+        """
+        Forget every device's last frame, so the first write after the robot is enabled is always sent.
+        """
+        for output in self.outputs:
+            output.reset()
+
+
+canbus = CANBus()
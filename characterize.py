@@ -0,0 +1,208 @@
+"""
+Drive feedforward characterization.
+
+Runs the standard quasistatic (slow voltage ramp) and dynamic (voltage
+step) tests forward and backward with every wheel pointed straight ahead,
+records the commanded voltage and the measured wheel speed, and fits
+
+    voltage = kS * sign(velocity) + kV * velocity + kA * acceleration
+
+with a least-squares solve. The fitted gains go in drivetrainConfig's
+DRIVE_FEEDFORWARD.
+
+On the robot (up on blocks, or on the floor with room to drive), enable
+Test mode: the robot runs the tests and saves the data next to the match
+recordings. Then fit it on a laptop:
+
+    $ python characterize.py --fit drive-characterization-20220312-101500.json
+
+Or run the whole thing against the simulation:
+
+    $ python characterize.py
+
+Fitting needs NumPy; collecting the data on the robot does not.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Quasistatic ramp rate and the voltage it stops at
+QUASISTATIC_RAMP = 0.5  # volts per second
+QUASISTATIC_VOLTAGE = 7.0
+# Dynamic step voltage and how long it is held
+DYNAMIC_VOLTAGE = 6.0
+DYNAMIC_TIME = 2.0  # seconds
+# Pause with the motors off between tests, so each starts from rest
+REST_TIME = 2.0  # seconds
+
+# (name, direction) of every test, in the order they run
+TESTS = (
+    ('quasistatic', 1),
+    ('quasistatic', -1),
+    ('dynamic', 1),
+    ('dynamic', -1),
+)
+
+# Samples slower than this (meters per second) are left out of the fit; static friction makes them noise
+MIN_VELOCITY = 0.05
+
+
+class Characterization:
+    """
+    Runs the tests one after another. Call update() every loop while in Test mode.
+    """
+
+    def __init__(self, drivetrain, velocity_factor):
+        """
+        :param drivetrain: the SwerveDrive
+        :param velocity_factor: drive motor RPM to wheel meters per second
+        """
+        self.drivetrain = drivetrain
+        self.velocity_factor = velocity_factor
+
+        self.test = 0
+        self.start_time = None
+        self.resting = True
+        self.done = False
+
+        # One entry per loop while a test is running
+        self.samples = {'test': [], 'time': [], 'voltage': [], 'velocity': []}
+
+    def _voltage(self, elapsed):
+        name, direction = TESTS[self.test]
+        if name == 'quasistatic':
+            return direction * QUASISTATIC_RAMP * elapsed
+        return direction * DYNAMIC_VOLTAGE
+
+    def _finished(self, elapsed):
+        name, direction = TESTS[self.test]
+        if name == 'quasistatic':
+            return QUASISTATIC_RAMP * elapsed >= QUASISTATIC_VOLTAGE
+        return elapsed >= DYNAMIC_TIME
+
+    def update(self, now):
+        """
+        Command this loop's voltage and record the wheel speed.
+        :param now: the time the sensors were sampled
+        :returns: False once every test has run
+        """
+        if self.done:
+            return False
+
+        if self.start_time is None:
+            self.start_time = now
+        elapsed = now - self.start_time
+
+        if self.resting and elapsed >= REST_TIME:
+            self.resting = False
+            self.start_time = now
+            elapsed = 0.0
+        elif not self.resting and self._finished(elapsed):
+            self.test += 1
+            self.resting = True
+            self.start_time = now
+            elapsed = 0.0
+            if self.test == len(TESTS):
+                self.done = True
+
+        voltage = 0.0 if self.resting or self.done else self._voltage(elapsed)
+
+        # Hold every wheel straight ahead and drive it at the test voltage
+        velocity = 0.0
+        modules = self.drivetrain._indexed_modules
+        for index, module in modules:
+            module.move(0.0, 0.0)
+            module.execute()
+            module.driveMotor.setVoltage(-voltage if module.moduleFlipped else voltage)
+            velocity += module.get_drive_velocity() * self.velocity_factor
+
+        if not self.resting and not self.done:
+            samples = self.samples
+            samples['test'].append(self.test)
+            samples['time'].append(now)
+            samples['voltage'].append(voltage)
+            samples['velocity'].append(velocity / len(modules))
+
+        return not self.done
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.samples, f)
+
+
+def default_path(directory):
+    """
+    :returns: a file name in directory for data collected now
+    """
+    return os.path.join(directory, time.strftime('drive-characterization-%Y%m%d-%H%M%S.json'))
+
+
+def fit(samples):
+    """
+    Fit the feedforward gains to the collected data.
+    :param samples: Characterization.samples, or the same loaded from a file
+    :returns: (kS, kV, kA, r_squared)
+    """
+    import numpy
+
+    test = numpy.asarray(samples['test'])
+    timestamps = numpy.asarray(samples['time'], dtype=float)
+    voltage = numpy.asarray(samples['voltage'], dtype=float)
+    velocity = numpy.asarray(samples['velocity'], dtype=float)
+
+    # Differentiate each test on its own, so the jumps between tests don't show up as acceleration
+    acceleration = numpy.zeros_like(velocity)
+    for index in numpy.unique(test):
+        rows = test == index
+        if rows.sum() > 2:
+            acceleration[rows] = numpy.gradient(velocity[rows], timestamps[rows])
+
+    rows = numpy.abs(velocity) > MIN_VELOCITY
+    A = numpy.column_stack((numpy.sign(velocity[rows]), velocity[rows], acceleration[rows]))
+    b = voltage[rows]
+
+    (kS, kV, kA), residuals, rank, singular = numpy.linalg.lstsq(A, b, rcond=None)
+
+    error = b - A @ (kS, kV, kA)
+    spread = b - b.mean()
+    r_squared = 1 - (error @ error) / (spread @ spread)
+
+    return kS, kV, kA, r_squared
+
+
+def simulate():
+    """
+    Run the tests against the simulation.
+    :returns: the collected samples
+    """
+    from simulation import Simulation
+
+    sim = Simulation()
+    sim.enable('test')
+    characterization = sim.robot.characterization
+    while not characterization.done:
+        sim.step()
+    return characterization.samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit the drive feedforward gains")
+    parser.add_argument('--fit', metavar='DATA', help='fit data saved by the robot instead of running the simulation')
+    args = parser.parse_args(argv)
+
+    if args.fit:
+        with open(args.fit) as f:
+            samples = json.load(f)
+    else:
+        samples = simulate()
+
+    kS, kV, kA, r_squared = fit(samples)
+    print('kS = %.4f V\nkV = %.4f V/(m/s)\nkA = %.4f V/(m/s^2)\nr^2 = %.4f' % (kS, kV, kA, r_squared))
+    print("\n'DRIVE_FEEDFORWARD': (%.3f, %.3f, %.3f)," % (kS, kV, kA))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
 import wpilib
+import logger
+
+log = logger.get_logger('feeder')
 
 
 class Feeder:
@@ -10,7 +13,7 @@ class Feeder:
         self.encoder.setPosition(0)  # Reset position of motor to zero
 
     def setFeeder(self, speed):
-        print("Setting feeder speed: ", speed)
+        log.debug("Setting feeder speed: %s", speed)
         self.motor.set(speed)
 
     def setPosition(self, position):
@@ -3,15 +3,16 @@ import rev
 from robotconfig import robotconfig
 
 class Hooks:
-    def __init__(self, motors):
+    #switch_factory builds a limit switch from its DIO port (the simulation passes its own)
+    def __init__(self, motors, switch_factory=wpilib.DigitalInput):
         #self.hookSpeed = 0.5
         config = robotconfig["HOOKS"]
         #front, back, left, right
         self.motors = motors
-        self.modules = [HookModule(motors[0], config['FRONT_TOP_PORT'], config['FRONT_BOTTOM_PORT']), 
-                            HookModule(motors[1], config['BACK_TOP_PORT'], config['BACK_BOTTOM_PORT']), 
-                                HookModule(motors[2], config['LEFT_TOP_PORT'], config['LEFT_BOTTOM_PORT']), 
-                                    HookModule(motors[3], config['RIGHT_TOP_PORT'], config['RIGHT_BOTTOM_PORT'])]
+        self.modules = [HookModule(motors[0], config['FRONT_TOP_PORT'], config['FRONT_BOTTOM_PORT'], switch_factory), 
+                            HookModule(motors[1], config['BACK_TOP_PORT'], config['BACK_BOTTOM_PORT'], switch_factory), 
+                                HookModule(motors[2], config['LEFT_TOP_PORT'], config['LEFT_BOTTOM_PORT'], switch_factory), 
+                                    HookModule(motors[3], config['RIGHT_TOP_PORT'], config['RIGHT_BOTTOM_PORT'], switch_factory)]
 
     def get_front(self):
         return(self.modules[0].get_state())
@@ -45,16 +46,16 @@ class Hooks:
         self.modules[3].update()
 
 class HookModule:
-    #motor, top limit switch port number, bottom limit switch port number
-    def __init__(self, motor, top_port, bottom_port):
+    #motor, top limit switch port number, bottom limit switch port number, limit switch factory
+    def __init__(self, motor, top_port, bottom_port, switch_factory=wpilib.DigitalInput):
         self.hookSpeed = 0.5
         self.motor = motor
         #0:raised, 1:raising, 2:lowered, 3:lowering
         self.state = 2
         #top switch
-        self.top_switch = wpilib.DigitalInput(top_port)
+        self.top_switch = switch_factory(top_port)
         #bottom switch
-        self.bottom_switch = wpilib.DigitalInput(bottom_port)
+        self.bottom_switch = switch_factory(bottom_port)
         #making sure that the motor is only stopped once...allows motor to turn other direction without stopping it
         self.trigger_once = False
 
@@ -0,0 +1,127 @@
+"""
+Swerve kinematics for any number of modules at any positions.
+
+The inverse kinematics matrix (chassis motion to module velocities) and its
+pseudoinverse (module velocities to the chassis motion that best explains
+them) are computed once, when the module positions are set. Each direction
+is then a handful of multiply-adds per module. With at most eight rows the
+products are written out over precomputed tuples; NumPy's per-call overhead
+would cost more than the arithmetic itself.
+
+Conventions match SwerveDrive: positions are (left, forward) from the center
+of the robot, fwd is forward, strafe is left, and rcw is clockwise rotation
+given as the speed of the module farthest from the center.
+"""
+import math
+
+FEET_TO_METERS = 0.3048
+
+
+def rectangle(width, length):
+    """
+    :param width: half the distance between the left and right modules
+    :param length: half the distance between the front and rear modules
+    :returns: (left, forward) of four modules at the corners, in MODULE_KEYS order
+    """
+    return ((width, length), (-width, length), (width, -length), (-width, -length))
+
+
+def _invert3(m):
+    """
+    :returns: the inverse of a 3x3 matrix given as nested sequences
+    """
+    (a, b, c), (d, e, f), (g, h, i) = m
+    cofactors = (
+        (e * i - f * h, c * h - b * i, b * f - c * e),
+        (f * g - d * i, a * i - c * g, c * d - a * f),
+        (d * h - e * g, b * g - a * h, a * e - b * d),
+    )
+    determinant = a * cofactors[0][0] + b * cofactors[1][0] + c * cofactors[2][0]
+    if abs(determinant) < 1e-12:
+        raise ValueError("Module positions do not determine the chassis motion")
+    return [[value / determinant for value in row] for row in cofactors]
+
+
+class SwerveKinematics:
+
+    def __init__(self, positions):
+        """
+        :param positions: (left, forward) of every module, in the order speeds and angles are indexed
+        """
+        self.positions = tuple((float(left), float(forward)) for left, forward in positions)
+        self.count = len(self.positions)
+        if self.count < 2:
+            raise ValueError("Swerve kinematics needs at least two modules")
+
+        # rcw is the speed of the farthest module, so a pure rotation never asks for more than 1
+        self.radius = max(math.hypot(left, forward) for left, forward in self.positions)
+
+        # Inverse kinematics, (index, left_rcw, forward_rcw) per module:
+        #   left velocity    = strafe + rcw * left_rcw
+        #   forward velocity = fwd    + rcw * forward_rcw
+        # Public for code that needs the module velocities rather than speeds and angles
+        self.inverse_rows = tuple((index, -forward / self.radius, left / self.radius)
+                                   for index, (left, forward) in enumerate(self.positions))
+
+        # Angles that line every wheel up with the center, so the robot is hard to push.
+        # Kept between -90 and 90; the wheel direction doesn't matter when locked.
+        self.lock_angles = tuple(math.degrees(math.atan(left / forward)) if forward else 90.0
+                                 for left, forward in self.positions)
+
+        # Pseudoinverse (A^T A)^-1 A^T, where A maps [fwd, strafe, rcw] to every
+        # module's [left, forward] velocity
+        sum_left_rcw = sum(row[1] for row in self.inverse_rows)
+        sum_forward_rcw = sum(row[2] for row in self.inverse_rows)
+        sum_squares = sum(row[1] * row[1] + row[2] * row[2] for row in self.inverse_rows)
+        normal = _invert3((
+            (self.count, 0.0, sum_forward_rcw),
+            (0.0, self.count, sum_left_rcw),
+            (sum_forward_rcw, sum_left_rcw, sum_squares),
+        ))
+
+        # Per module: how its left and forward velocity contribute to fwd, strafe and rcw
+        self._forward_rows = tuple(
+            (left_rcw, forward_rcw,
+             normal[0][1] + normal[0][2] * left_rcw, normal[0][0] + normal[0][2] * forward_rcw,
+             normal[1][1] + normal[1][2] * left_rcw, normal[1][0] + normal[1][2] * forward_rcw,
+             normal[2][1] + normal[2][2] * left_rcw, normal[2][0] + normal[2][2] * forward_rcw)
+            for index, left_rcw, forward_rcw in self.inverse_rows)
+
+    def inverse(self, fwd, strafe, rcw, speeds, angles):
+        """
+        Calculate every module's speed and angle for a chassis motion, in place.
+        Speeds are not normalized.
+        :param speeds: list to receive the module speeds
+        :param angles: list to receive the module angles in degrees, 0 is forward and 90 is left
+        """
+        hypot = math.hypot
+        atan2 = math.atan2
+        degrees = math.degrees
+
+        for index, left_rcw, forward_rcw in self.inverse_rows:
+            left = strafe + rcw * left_rcw
+            forward = fwd + rcw * forward_rcw
+            speeds[index] = hypot(left, forward)
+            angles[index] = degrees(atan2(left, forward))
+
+    def forward(self, lefts, forwards):
+        """
+        Find the chassis motion that best explains the module velocities (least squares).
+        :param lefts: every module's velocity to the left
+        :param forwards: every module's velocity forward
+        :returns: (fwd, strafe, rcw, residual), where residual is the RMS per module of the
+                  velocity the rigid-body motion can't explain; a large residual means a wheel is slipping
+        """
+        fwd = strafe = rcw = 0.0
+        for row, left, forward in zip(self._forward_rows, lefts, forwards):
+            fwd += row[2] * left + row[3] * forward
+            strafe += row[4] * left + row[5] * forward
+            rcw += row[6] * left + row[7] * forward
+
+        squares = 0.0
+        for row, left, forward in zip(self._forward_rows, lefts, forwards):
+            left -= strafe + rcw * row[0]
+            forward -= fwd + rcw * row[1]
+            squares += left * left + forward * forward
+
+        return fwd, strafe, rcw, math.sqrt(squares / self.count)
@@ -0,0 +1,94 @@
+import logging
+import logging.handlers
+import queue
+
+# Each place in the code logs at most once per this many seconds.
+# ERROR and above are never limited.
+RATE_LIMIT = 1.0
+
+FORMAT = '%(relativeCreated)10.0f %(levelname)-7s %(name)s: %(message)s'
+
+# Messages waiting for the background thread
+_queue = queue.SimpleQueue()
+_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drops a record if the same line of code already logged one less than
+    `interval` seconds ago, so a print in a 50 Hz loop becomes one line a second.
+    """
+
+    def __init__(self, interval=RATE_LIMIT):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+
+        site = (record.pathname, record.lineno)
+        last = self._last.get(site)
+        if last is not None and record.created - last < self.interval:
+            return False
+
+        self._last[site] = record.created
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records without formatting them, so the message is built on the
+    background thread instead of in the robot loop.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def get_logger(name):
+    """
+    :param name: the subsystem name, e.g. 'robot' or 'feeder'
+    :returns: a logger that goes through the background sink once start() is called
+    """
+    return logging.getLogger('robot.' + name)
+
+
+def start(level=logging.INFO, interval=RATE_LIMIT, stream=None):
+    """
+    Route every robot logger through a rate limit and a queue drained by a
+    background thread, which is the only place console I/O happens.
+    :param level: the lowest level logged
+    :param interval: see RateLimitFilter
+    :param stream: where to write, stderr by default
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter(FORMAT))
+
+    handler = DeferredQueueHandler(_queue)
+    handler.addFilter(RateLimitFilter(interval))
+
+    root = logging.getLogger('robot')
+    root.setLevel(level)
+    root.propagate = False
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(_queue, output)
+    _listener.start()
+
+
+def stop():
+    """
+    Write out everything still queued and stop the background thread.
+    """
+    global _listener
+    if _listener is None:
+        return
+
+    _listener.stop()
+    _listener = None
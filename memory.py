@@ -0,0 +1,197 @@
+"""
+Garbage collector and allocation control for match play.
+
+CPython frees almost everything by reference counting the moment it is
+dropped. The cyclic garbage collector is only there for reference cycles,
+but it runs whenever enough container objects have been allocated,
+wherever that happens to be, and a full (generation 2) collection walks
+every object the robot owns. That is a pause of milliseconds at an
+arbitrary point in a loop.
+
+MemoryControl keeps those pauses out of the match:
+
+ - after robotInit, freeze() collects once and moves the whole object graph
+   it built into the permanent generation (gc.freeze), so no collection
+   walks it again
+ - while enabled, automatic generation 2 collections are off; generations 0
+   and 1 only see young objects and stay cheap
+ - while disabled, idle() runs a full collection every COLLECT_PERIOD seconds
+
+AllocationAudit measures how much teleopPeriodic allocates with
+tracemalloc, to drive the hot path toward zero garbage. Tracing slows
+every allocation down, so it is for the practice field and the simulation,
+never for a match.
+"""
+import gc
+import tracemalloc
+
+# Generation 2 threshold while enabled: never reached
+NO_FULL_COLLECTIONS = 1 << 30
+
+# Stack frames kept per traced allocation
+AUDIT_FRAMES = 1
+# Source lines shown in the audit report
+AUDIT_LINES = 10
+
+
+class AllocationAudit:
+    """
+    Use it as a context manager around the code to audit:
+
+        with self.teleopAudit:
+            ...
+
+    Each run records the bytes allocated above what was live at the start
+    (the peak, including temporaries freed before the end) and the bytes
+    still held at the end. Does nothing until start().
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.active = False
+        self.overhead = 0
+        self._baseline = None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.allocated = 0
+        self.max_allocated = 0
+        self.retained = 0
+        self.clean = 0  # runs that allocated nothing
+        self._start = 0
+
+    def start(self):
+        """
+        Start tracing allocations.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(AUDIT_FRAMES)
+        self.active = True
+
+        # What measuring an empty block costs, so it isn't blamed on the code
+        self.__enter__()
+        self.__exit__(None, None, None)
+        self.overhead = self.max_allocated
+        self.reset()
+
+        self._baseline = tracemalloc.take_snapshot()
+
+    def stop(self):
+        self.active = False
+        self._baseline = None
+        tracemalloc.stop()
+
+    def __enter__(self):
+        if self.active:
+            tracemalloc.reset_peak()
+            self._start = tracemalloc.get_traced_memory()[0]
+
+    def __exit__(self, *exc_info):
+        if self.active:
+            current, peak = tracemalloc.get_traced_memory()
+            allocated = max(0, peak - self._start - self.overhead)
+            self.count += 1
+            self.allocated += allocated
+            self.retained += current - self._start
+            if allocated > self.max_allocated:
+                self.max_allocated = allocated
+            if not allocated:
+                self.clean += 1
+
+    def report(self):
+        """
+        :returns: the per-run allocation figures, and the source lines holding the most memory since start()
+        """
+        if not self.count:
+            return '%s: no runs audited' % self.name
+
+        lines = ['%s: %d runs, %d without allocations' % (self.name, self.count, self.clean),
+                 'allocated per run: mean %.0f B, max %d B' % (self.allocated / self.count, self.max_allocated),
+                 'retained per run: mean %.1f B' % (self.retained / self.count)]
+
+        if self._baseline is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+            growth = [stat for stat in snapshot.compare_to(self._baseline, 'lineno') if stat.size_diff > 0]
+            if growth:
+                lines.append('held since the audit started:')
+                lines.extend('  %s' % stat for stat in growth[:AUDIT_LINES])
+
+        return '\n'.join(lines)
+
+
+class MemoryControl:
+    """
+    Switches the garbage collector between match and idle behavior.
+    Does nothing until configure().
+    """
+
+    def __init__(self):
+        self.freeze_graph = False
+        self.match_gc = False
+        self.collect_period = None
+        self.thresholds = gc.get_threshold()
+        self.last_collection = None
+        self.frozen = 0
+
+    def configure(self, freeze_graph, match_gc, collect_period):
+        """
+        :param freeze_graph: gc.freeze() the objects robotInit built
+        :param match_gc: no automatic full collections while enabled
+        :param collect_period: seconds between full collections while disabled; None for none
+        """
+        self.freeze_graph = freeze_graph
+        self.match_gc = match_gc
+        self.collect_period = collect_period
+
+    def freeze(self):
+        """
+        Collect, then move every live object into the permanent generation.
+        Call once everything robotInit builds exists.
+        """
+        if self.freeze_graph:
+            gc.collect()
+            gc.freeze()
+            self.frozen = gc.get_freeze_count()
+
+    def enter_match(self):
+        """
+        Call when the robot is enabled.
+        """
+        if self.freeze_graph:
+            # Whatever was built while disabled won't be walked either.
+            # Collect first, or its garbage would be frozen for good
+            gc.collect()
+            gc.freeze()
+            self.frozen = gc.get_freeze_count()
+        if self.match_gc:
+            threshold0, threshold1, threshold2 = self.thresholds
+            gc.set_threshold(threshold0, threshold1, NO_FULL_COLLECTIONS)
+
+    def leave_match(self):
+        """
+        Call when the robot is disabled.
+        """
+        if self.match_gc:
+            gc.set_threshold(*self.thresholds)
+        self.last_collection = None
+
+    def idle(self, now):
+        """
+        Call every loop while disabled: runs the full collections the match skipped.
+        :param now: the time in seconds
+        """
+        if self.collect_period is None:
+            return
+        if self.last_collection is not None and now - self.last_collection < self.collect_period:
+            return
+        self.last_collection = now
+        if self.freeze_graph:
+            # Let the collector see the frozen objects too; enter_match freezes them again
+            gc.unfreeze()
+        gc.collect()
+
+
+memory = MemoryControl()
@@ -0,0 +1,229 @@
+"""
+Swerve odometry: where the robot is on the field.
+
+Every loop, right after the sensors are sampled, the module angles and
+drive encoder velocities are turned into a chassis velocity (the
+drivetrain's forward kinematics), rotated by the navX heading and
+integrated into a field pose. Each pose is stored with its timestamp in a
+fixed-size ring buffer, so code that has a measurement from the past (a
+vision target, say) can ask where the robot was at that moment.
+
+Field coordinates follow WPILib: x forward, y left, heading counterclockwise
+in radians, with the origin wherever the robot was at the last reset().
+"""
+import math
+from array import array
+
+from telemetry import telemetry, MEDIUM
+
+# Five seconds of poses at 50 Hz
+HISTORY = 256
+
+
+class PoseHistory:
+    """
+    Fixed-capacity ring buffer of (timestamp, x, y, heading).
+    The storage is preallocated arrays; appending never allocates and
+    overwrites the oldest pose once the buffer is full.
+    """
+
+    def __init__(self, capacity=HISTORY):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.xs = array('d', bytes(8 * capacity))
+        self.ys = array('d', bytes(8 * capacity))
+        self.headings = array('d', bytes(8 * capacity))
+
+        self._head = 0  # where the next pose goes
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    def append(self, timestamp, x, y, heading):
+        """
+        Store a pose. Timestamps must not go backwards.
+        """
+        head = self._head
+        self.timestamps[head] = timestamp
+        self.xs[head] = x
+        self.ys[head] = y
+        self.headings[head] = heading
+
+        head += 1
+        self._head = 0 if head == self.capacity else head
+        if self._count < self.capacity:
+            self._count += 1
+
+    def _slot(self, index):
+        """
+        :returns: the array slot of the index-th oldest pose
+        """
+        return (self._head - self._count + index) % self.capacity
+
+    def latest(self):
+        """
+        :returns: the newest (timestamp, x, y, heading), or None if empty
+        """
+        if not self._count:
+            return None
+        slot = self._slot(self._count - 1)
+        return self.timestamps[slot], self.xs[slot], self.ys[slot], self.headings[slot]
+
+    def sample(self, timestamp):
+        """
+        Look up the pose at a time by binary search, interpolating between the
+        two poses around it. Times outside the history return the oldest or newest pose.
+        :param timestamp: FPGA time in seconds
+        :returns: (x, y, heading), or None if empty
+        """
+        count = self._count
+        if not count:
+            return None
+
+        timestamps = self.timestamps
+        slot = self._slot
+
+        # Find the first pose at or after timestamp
+        low = 0
+        high = count
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[slot(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == 0 or low == count:
+            after = slot(min(low, count - 1))
+            return self.xs[after], self.ys[after], self.headings[after]
+
+        before = slot(low - 1)
+        after = slot(low)
+        span = timestamps[after] - timestamps[before]
+        fraction = (timestamp - timestamps[before]) / span if span > 0 else 1.0
+
+        # Interpolate the heading the short way around
+        turn = math.remainder(self.headings[after] - self.headings[before], math.tau)
+
+        return (self.xs[before] + (self.xs[after] - self.xs[before]) * fraction,
+                self.ys[before] + (self.ys[after] - self.ys[before]) * fraction,
+                self.headings[before] + turn * fraction)
+
+
+class SwerveOdometry:
+    """
+    Integrates the drivetrain's sensor snapshot into a field pose.
+    """
+
+    def __init__(self, drivetrain, wheel_diameter, gear_ratio, capacity=HISTORY):
+        """
+        :param drivetrain: the SwerveDrive whose sensors and modules are read
+        :param wheel_diameter: drive wheel diameter in meters
+        :param gear_ratio: drive motor rotations per wheel rotation
+        :param capacity: how many poses to keep
+        """
+        self.drivetrain = drivetrain
+
+        # Motor RPM to wheel surface speed in meters per second
+        self.velocity_factor = math.pi * wheel_diameter / gear_ratio / 60
+
+        self.history = PoseHistory(capacity)
+
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0
+        self.timestamp = None
+
+        # The last chassis velocity: forward and left in meters per second, counterclockwise in radians per second
+        self.vx = 0.0
+        self.vy = 0.0
+        self.omega = 0.0
+        # How much of the wheel velocities the chassis motion can't explain, meters per second
+        self.slip = 0.0
+
+        # Every module's measured velocity to the left and forward, filled in place each loop
+        self._lefts = [0.0] * len(drivetrain._indexed_modules)
+        self._forwards = [0.0] * len(drivetrain._indexed_modules)
+
+        self.setup_telemetry()
+
+    def _gyro_heading(self):
+        """
+        :returns: the navX heading in radians, counterclockwise, not wrapped
+        """
+        drivetrain = self.drivetrain
+        return -math.radians(drivetrain.sensors.gyro_angle - drivetrain.gyro_zero)
+
+    def reset(self, x=0.0, y=0.0):
+        """
+        Put the robot at (x, y) on the field and forget the history.
+        The heading keeps following the navX.
+        """
+        self.x = x
+        self.y = y
+        self.heading = self._gyro_heading()
+        self.timestamp = None
+        self.history.clear()
+
+    def update(self):
+        """
+        Integrate one loop. Call after the drivetrain sampled its sensors.
+        """
+        drivetrain = self.drivetrain
+        factor = self.velocity_factor
+        lefts = self._lefts
+        forwards = self._forwards
+
+        for index, module in drivetrain._indexed_modules:
+            angle = math.radians(module.get_current_angle())
+            speed = module.get_drive_velocity() * factor
+            lefts[index] = speed * math.sin(angle)
+            forwards[index] = speed * math.cos(angle)
+
+        kinematics = drivetrain.kinematics
+        fwd, strafe, rcw, self.slip = kinematics.forward(lefts, forwards)
+        self.vx = fwd
+        self.vy = strafe
+        # rcw is the clockwise speed of the farthest module
+        self.omega = -rcw / kinematics.radius
+
+        # The navX is far better at heading than the wheels, so rotation comes from it
+        timestamp = drivetrain.sensors.timestamp
+        heading = self._gyro_heading()
+
+        if self.timestamp is not None:
+            dt = timestamp - self.timestamp
+            # Rotate by the heading halfway through the loop so driving while turning doesn't drift
+            middle = (self.heading + heading) * 0.5
+            cos_heading = math.cos(middle)
+            sin_heading = math.sin(middle)
+            self.x += (self.vx * cos_heading - self.vy * sin_heading) * dt
+            self.y += (self.vx * sin_heading + self.vy * cos_heading) * dt
+
+        self.heading = heading
+        self.timestamp = timestamp
+        self.history.append(timestamp, self.x, self.y, heading)
+
+    def get_pose(self):
+        """
+        :returns: the current (x, y, heading)
+        """
+        return self.x, self.y, self.heading
+
+    def get_pose_at(self, timestamp):
+        """
+        :param timestamp: FPGA time in seconds
+        :returns: the interpolated (x, y, heading) at that time, or None before the first update
+        """
+        return self.history.sample(timestamp)
+
+    def setup_telemetry(self):
+        telemetry.add_number('Odometry/x', lambda: self.x, rate=MEDIUM, deadband=0.01)
+        telemetry.add_number('Odometry/y', lambda: self.y, rate=MEDIUM, deadband=0.01)
+        telemetry.add_number('Odometry/heading', lambda: math.degrees(self.heading), rate=MEDIUM, deadband=0.5)
+        telemetry.add_number('Odometry/slip', lambda: self.slip, rate=MEDIUM, deadband=0.01)
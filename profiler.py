@@ -0,0 +1,161 @@
+import time
+from array import array
+
+from telemetry import telemetry, SLOW
+
+# Histogram layout: 4 buckets per power of two of microseconds, up to about a minute
+SUB_BUCKETS = 4
+SUB_BITS = 2
+BUCKETS = 25 * SUB_BUCKETS
+
+
+def _bucket(us):
+    """
+    :param us: a duration in whole microseconds
+    :returns: the histogram bucket for it
+    """
+    bits = us.bit_length()
+    if bits <= SUB_BITS:
+        return us
+    index = (bits - SUB_BITS) * SUB_BUCKETS + ((us >> (bits - SUB_BITS - 1)) & (SUB_BUCKETS - 1))
+    if index >= BUCKETS:
+        return BUCKETS - 1
+    return index
+
+
+def _bucket_limit(index):
+    """
+    :returns: the largest duration in microseconds that falls in the bucket
+    """
+    if index < SUB_BUCKETS:
+        return index
+    octave, sub = divmod(index, SUB_BUCKETS)
+    base = 1 << (octave + SUB_BITS - 1)
+    step = base >> SUB_BITS
+    return base + (sub + 1) * step - 1
+
+
+class Phase:
+    """
+    Timing of one part of the robot loop. Use it as a context manager
+    around the code to measure:
+
+        with self._execute_phase:
+            ...
+
+    Each run is added to a fixed-size histogram, so recording costs a couple
+    of microseconds and no memory is allocated.
+    """
+
+    __slots__ = ('name', 'budget', 'histogram', 'count', 'total', 'max', 'overruns', '_start')
+
+    def __init__(self, name, budget=None):
+        """
+        :param name: shown in the report and used as the dashboard key
+        :param budget: optional time in seconds; runs longer than this count as overruns
+        """
+        self.name = name
+        self.budget = None if budget is None else int(budget * 1e6)
+        self.histogram = array('L', bytes(BUCKETS * array('L').itemsize))
+        self.reset()
+
+    def reset(self):
+        histogram = self.histogram
+        for index in range(BUCKETS):
+            histogram[index] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.overruns = 0
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record((time.perf_counter_ns() - self._start) // 1000)
+        return False
+
+    def record(self, us):
+        """
+        Add one run.
+        :param us: how long it took, in microseconds
+        """
+        self.histogram[_bucket(us)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+        if self.budget is not None and us > self.budget:
+            self.overruns += 1
+
+    def percentile(self, fraction):
+        """
+        :param fraction: e.g. 0.5 for the median, 0.99 for p99
+        :returns: the duration in microseconds, rounded up to its histogram bucket
+        """
+        if self.count == 0:
+            return 0
+
+        target = fraction * self.count
+        seen = 0
+        histogram = self.histogram
+        for index in range(BUCKETS):
+            seen += histogram[index]
+            if seen >= target:
+                return min(_bucket_limit(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class LoopProfiler:
+    """
+    The phases of the robot loop. Each phase is published to the
+    dashboard at a slow rate and report() gives the whole picture.
+    """
+
+    def __init__(self, table='Profiler'):
+        self.table = table
+        self.phases = {}
+
+    def phase(self, name, budget=None):
+        """
+        Get the phase with this name, creating it the first time.
+        :param name: e.g. 'SwerveDrive.execute'
+        :param budget: see Phase
+        :returns: the Phase
+        """
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = Phase(name, budget)
+            self.phases[name] = phase
+
+            prefix = '%s/%s/' % (self.table, name)
+            telemetry.add_number(prefix + 'p50', lambda: phase.percentile(0.5), rate=SLOW)
+            telemetry.add_number(prefix + 'p99', lambda: phase.percentile(0.99), rate=SLOW)
+            telemetry.add_number(prefix + 'max', lambda: phase.max, rate=SLOW)
+            if budget is not None:
+                telemetry.add_number(prefix + 'overruns', lambda: phase.overruns, rate=SLOW)
+        return phase
+
+    def reset(self):
+        for phase in self.phases.values():
+            phase.reset()
+
+    def report(self):
+        """
+        :returns: a table of every phase, times in microseconds
+        """
+        lines = ['%-32s %8s %8s %8s %8s %8s %8s' % ('phase', 'count', 'mean', 'p50', 'p99', 'max', 'overrun')]
+        for phase in self.phases.values():
+            lines.append('%-32s %8d %8.0f %8d %8d %8d %8s' % (
+                phase.name, phase.count, phase.mean(), phase.percentile(0.5), phase.percentile(0.99),
+                phase.max, '-' if phase.budget is None else phase.overruns))
+        return '\n'.join(lines)
+
+
+# Shared by every subsystem
+profiler = LoopProfiler()
@@ -0,0 +1,230 @@
+"""
+Flight recorder: one fixed-width binary record per robot loop.
+
+Every enabled loop appends the controller inputs, the sensor snapshot, what
+each swerve module was asked to do, the steering PID output and the loop
+time to a preallocated memory-mapped file. Writing a record is a single
+struct.pack_into, with no allocation of file space and no text formatting.
+
+Load a match on a laptop with:
+
+    from recorder import load_match
+    match = load_match('match-20220312-101500.rec')
+    match['gyro_angle'], match['steer_output'][:, 0], ...
+
+load_match needs NumPy; iter_records does not.
+"""
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b'WAPURREC'
+VERSION = 4
+
+# Values of the mode field
+MODE_AUTONOMOUS = 1
+MODE_TELEOP = 2
+
+# Enough for ten minutes of enabled time at 50 Hz
+CAPACITY = 30000
+
+MODULES = 4
+
+# Axis order of the controller inputs, as wpilib.XboxController raw axis numbers
+AXES = (0, 1, 2, 3, 4, 5)  # left x, left y, left trigger, right trigger, right x, right y
+
+# (name, count, struct code) for every field of a record, in file order
+FIELDS = (
+    ('timestamp', 1, 'd'),         # FPGA time the sensors were sampled, seconds
+    ('loop_time', 1, 'f'),         # from sampling the sensors to recording, seconds
+    ('mode', 1, 'B'),              # MODE_AUTONOMOUS or MODE_TELEOP
+    ('driver_axes', len(AXES), 'd'),
+    ('driver_buttons', 1, 'I'),    # bit n is button n + 1
+    ('operator_axes', len(AXES), 'd'),
+    ('operator_buttons', 1, 'I'),
+    ('gyro_angle', 1, 'd'),        # raw navX angle, degrees
+    ('gyro_rate', 1, 'd'),         # navX rate, degrees per second
+    ('encoder_positions', MODULES, 'd'),  # raw CANCoder absolute positions, degrees
+    ('drive_velocities', MODULES, 'd'),   # raw drive encoder velocities, motor RPM
+    ('requested_speed', MODULES, 'd'),    # drive motor output per module
+    ('requested_angle', MODULES, 'd'),    # steering setpoint per module, degrees
+    ('steer_output', MODULES, 'd'),       # steering PID output per module
+)
+
+RECORD = struct.Struct('<' + ''.join('%d%s' % (count, code) for name, count, code in FIELDS))
+
+# magic, version, record size, capacity, record count
+HEADER = struct.Struct('<8sHHII')
+COUNT_OFFSET = HEADER.size - 4
+
+
+def _read_controller(controller):
+    """
+    :returns: the raw axes and the button bitmask of a controller
+    """
+    axes = [controller.getRawAxis(axis) for axis in AXES]
+
+    if hasattr(controller, 'getButtons'):
+        buttons = controller.getButtons()
+    else:
+        import wpilib
+        buttons = wpilib.DriverStation.getStickButtons(controller.getPort())
+
+    return axes, buttons
+
+
+class MatchRecorder:
+    """
+    Appends one record per loop to a memory-mapped file.
+    When the file is full, recording stops.
+    """
+
+    def __init__(self, path, capacity=CAPACITY):
+        """
+        :param path: the file to create (overwritten if it exists)
+        :param capacity: how many records to preallocate
+        """
+        self.path = path
+        self.capacity = capacity
+        self.count = 0
+
+        size = HEADER.size + RECORD.size * capacity
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, capacity, 0)
+
+        self._pack = RECORD.pack_into
+        self._values = [0.0] * sum(count for name, count, code in FIELDS)
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def write(self, values):
+        """
+        Append one record.
+        :param values: a flat sequence with every field of FIELDS in order
+        :returns: False when the file is full and nothing was written
+        """
+        if self.count >= self.capacity:
+            return False
+
+        self._pack(self._map, HEADER.size + self.count * RECORD.size, *values)
+        self.count += 1
+        struct.pack_into('<I', self._map, COUNT_OFFSET, self.count)
+        return True
+
+    def record(self, robot, now):
+        """
+        Gather one loop's record from the robot and append it.
+        :param robot: MyRobot, after its periodic method ran this loop
+        :param now: the current FPGA time
+        :returns: False when the file is full and nothing was written
+        """
+        values = self._values
+        drivetrain = robot.drivetrain
+        sensors = drivetrain.sensors
+
+        values[0] = sensors.timestamp
+        values[1] = now - sensors.timestamp
+        values[2] = MODE_AUTONOMOUS if robot.isAutonomous() else MODE_TELEOP
+        index = 3
+
+        for controller in (robot.driver, robot.operator):
+            axes, buttons = _read_controller(controller.xboxController)
+            values[index:index + len(AXES)] = axes
+            index += len(AXES)
+            values[index] = buttons
+            index += 1
+
+        values[index] = sensors.gyro_angle
+        values[index + 1] = sensors.gyro_rate
+        index += 2
+        values[index:index + MODULES] = sensors.encoder_positions
+        index += MODULES
+        values[index:index + MODULES] = sensors.drive_velocities
+        index += MODULES
+
+        for offset, module in drivetrain._indexed_modules:
+            values[index + offset] = module._requested_speed
+            values[index + MODULES + offset] = module._requested_angle
+            values[index + 2 * MODULES + offset] = module._output
+
+        return self.write(values)
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+
+def default_path(directory):
+    """
+    :returns: a file name in directory for a recording started now
+    """
+    return os.path.join(directory, time.strftime('match-%Y%m%d-%H%M%S.rec'))
+
+
+def read_header(data):
+    """
+    :param data: the bytes (or mmap) of a recording
+    :returns: (record size, capacity, record count)
+    """
+    magic, version, record_size, capacity, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a match recording")
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError("Recording version %d is not supported" % version)
+    return record_size, capacity, count
+
+
+def iter_records(path):
+    """
+    Read a recording without NumPy.
+    :returns: an iterator of dicts, one per loop, keyed by field name
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    record_size, capacity, count = read_header(data)
+
+    for values in RECORD.iter_unpack(data[HEADER.size:HEADER.size + count * record_size]):
+        record = {}
+        index = 0
+        for name, size, code in FIELDS:
+            record[name] = values[index] if size == 1 else values[index:index + size]
+            index += size
+        yield record
+
+
+def numpy_dtype():
+    """
+    :returns: the NumPy structured dtype matching one record
+    """
+    import numpy
+
+    codes = {'d': '<f8', 'f': '<f4', 'I': '<u4', 'B': 'u1'}
+    return numpy.dtype([(name, codes[code]) if count == 1 else (name, codes[code], (count,))
+                        for name, count, code in FIELDS])
+
+
+def load_match(path):
+    """
+    Load a whole recording.
+    :returns: a NumPy structured array with one row per loop
+    """
+    import numpy
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    record_size, capacity, count = read_header(data)
+    return numpy.frombuffer(data, dtype=numpy_dtype(), count=count, offset=HEADER.size).copy()
@@ -0,0 +1,216 @@
+"""
+Deterministic replay of a match recording.
+
+Rebuilds the robot with stand-ins for the Xbox controllers, CANCoders,
+drive encoders and navX that return exactly what was recorded, runs teleopPeriodic or
+autonomousPeriodic for every recorded loop as fast as the CPU allows, and
+diffs the module commands the code produces against the ones recorded.
+
+    $ python replay.py match-20220312-101500.rec
+
+A clean replay of a recording made by the same code is bit-for-bit
+identical, so replaying hours of real driving checks that a refactor of
+swervedrive.py or swervemodule.py did not change behavior.
+
+Dashboard tunables are not recorded; the replay uses their defaults, so
+record with the default values when a recording is meant for regression checks.
+
+When the config schedules the steering loop faster than the main loop, the
+encoder readings between main loops are not recorded either, and with
+onboard steering the SparkMax runs the loop. In both cases the replay only
+compares the drive speeds and angles.
+"""
+import argparse
+import sys
+
+from recorder import iter_records, MODE_AUTONOMOUS
+from simulation import SimCANCoder, SimClock, SimRobot, SimXboxController
+
+# The module commands compared against the recording
+COMPARED = ('requested_speed', 'requested_angle', 'steer_output')
+
+
+class ReplayXboxController(SimXboxController):
+    """
+    Xbox controller that replays recorded raw axes and button bitmasks.
+    Pressed/Released edges come from changes between records, like the real controller.
+    """
+
+    def load(self, axes, buttons):
+        for axis, value in zip(self.RAW_AXES, axes):
+            self.axes[axis] = value
+        for bit, button in enumerate(self.BUTTONS):
+            self.setButton(button, bool(buttons & (1 << bit)))
+
+
+class ReplayCANCoder(SimCANCoder):
+    """
+    Returns the recorded absolute position; nothing moves it in between.
+    """
+
+
+class ReplayAHRS:
+    """
+    Returns the recorded raw angle and rate. reset() does nothing: the recorded
+    angles already include the effect of any reset.
+    """
+
+    def __init__(self):
+        self.angle = 0.0
+        self.rate = 0.0
+
+    def getAngle(self):
+        return self.angle
+
+    def getRate(self):
+        return self.rate
+
+    def reset(self):
+        pass
+
+
+class ReplayRobot(SimRobot):
+
+    def createCANCoder(self, canId):
+        return ReplayCANCoder(canId)
+
+    def createGyro(self):
+        return ReplayAHRS()
+
+    def createXboxController(self, controllerId):
+        return ReplayXboxController(controllerId)
+
+
+class ReplayResult:
+    """
+    How far the replayed module commands were from the recording.
+    """
+
+    def __init__(self, compared=COMPARED):
+        self.compared = compared
+        self.cycles = 0
+        self.mismatches = 0
+        self.first_mismatch = None
+        self.max_difference = dict.fromkeys(compared, 0.0)
+
+    @property
+    def identical(self):
+        return self.mismatches == 0
+
+    def __str__(self):
+        lines = ['replayed %d loops, %d with differences' % (self.cycles, self.mismatches)]
+        if self.first_mismatch is not None:
+            lines.append('first difference at loop %d' % self.first_mismatch)
+        for name in self.compared:
+            lines.append('  max %-16s difference: %g' % (name, self.max_difference[name]))
+        return '\n'.join(lines)
+
+
+class Replay:
+    """
+    Re-drives a fresh robot from a recording.
+    """
+
+    def __init__(self, path, robot_class=ReplayRobot):
+        self.records = list(iter_records(path))
+
+        self.clock = SimClock()
+        self.robot = robot_class()
+        self.robot.robotInit()
+        # Don't record the replay itself
+        self.robot.recorderConfig = None
+
+        drivetrain = self.robot.drivetrain
+        self.modules = [module for index, module in drivetrain._indexed_modules]
+        self.encoders = [module.encoder for module in self.modules]
+        self.drive_encoders = [module.driveEncoder for module in self.modules]
+
+        self.compared = COMPARED
+        if drivetrain.steering_scheduled:
+            # Nothing runs the scheduled tasks here; steer in the loop instead
+            drivetrain.steering_scheduled = False
+            drivetrain.set_steering_period(self.robot.getPeriod())
+            self.robot.scheduler = None
+            self.compared = COMPARED[:2]
+        elif drivetrain.onboard_steering:
+            self.compared = COMPARED[:2]
+
+    def _load(self, record):
+        robot = self.robot
+
+        robot.driver.xboxController.load(record['driver_axes'], record['driver_buttons'])
+        robot.operator.xboxController.load(record['operator_axes'], record['operator_buttons'])
+
+        gyro = robot.drivetrain.gyro
+        gyro.angle = record['gyro_angle']
+        gyro.rate = record['gyro_rate']
+        for encoder, position in zip(self.encoders, record['encoder_positions']):
+            encoder.position = position
+        # The odometry integrates these, and the autonomous paths steer by the odometry
+        for encoder, velocity in zip(self.drive_encoders, record['drive_velocities']):
+            encoder.rpm = velocity / encoder.velocityConversionFactor
+
+        # Move the clock to when the sensors were sampled, so timers see the recorded time
+        delta = record['timestamp'] - self.clock.now
+        if delta > 0:
+            self.clock.step(delta)
+
+    def _compare(self, record, result, tolerance):
+        mismatch = False
+        for offset, module in enumerate(self.modules):
+            replayed = (module._requested_speed, module._requested_angle, module._output)
+            for name, value in zip(self.compared, replayed):
+                difference = abs(value - record[name][offset])
+                if difference > result.max_difference[name]:
+                    result.max_difference[name] = difference
+                if difference > tolerance:
+                    mismatch = True
+        return mismatch
+
+    def run(self, tolerance=0.0):
+        """
+        Replay every recorded loop.
+        :param tolerance: the largest difference still counted as identical; 0 means bit-for-bit
+        :returns: a ReplayResult
+        """
+        robot = self.robot
+        result = ReplayResult(self.compared)
+        mode = None
+
+        for record in self.records:
+            self._load(record)
+
+            if record['mode'] != mode:
+                mode = record['mode']
+                if mode == MODE_AUTONOMOUS:
+                    robot.autonomousInit()
+                else:
+                    robot.teleopInit()
+
+            if mode == MODE_AUTONOMOUS:
+                robot.autonomousPeriodic()
+            else:
+                robot.teleopPeriodic()
+
+            if self._compare(record, result, tolerance):
+                if result.first_mismatch is None:
+                    result.first_mismatch = result.cycles
+                result.mismatches += 1
+            result.cycles += 1
+
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a match recording and diff the module commands")
+    parser.add_argument('recording')
+    parser.add_argument('--tolerance', type=float, default=0.0, help='largest difference still counted as identical')
+    args = parser.parse_args(argv)
+
+    result = Replay(args.recording).run(args.tolerance)
+    print(result)
+    return 0 if result.identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,41 @@
 import math
+import os
 import time
 import sys
 
+# Everything a subsystem needs is imported when robotInit builds it; see startup.py
+_importStart = time.perf_counter()
+
 import wpilib
-import wpilib.drive
-import wpimath.controller
-from wpilib import interfaces
-import rev
-import ctre
-from navx import AHRS
 
 from robotconfig import robotconfig
-from controller import Controller
-from swervedrive import SwerveDrive
-from swervemodule import SwerveModule
-from swervemodule import ModuleConfig
-from feeder import Feeder
-from tester import Tester
 from networktables import NetworkTables
-from hooks import Hooks
+from tunables import tunables
+from telemetry import telemetry, MEDIUM
+import logger
+from profiler import profiler
+from canbus import canbus
+from memory import memory, AllocationAudit
+from startup import SUBSYSTEMS, startup_timer, import_modules, open_devices
+
+startup_timer.record('import robot', time.perf_counter() - _importStart)
+
+log = logger.get_logger('robot')
 
 # Drive Types
 ARCADE = 1
 TANK = 2
 SWERVE = 3
 
+# Steering modes
+STEER_PYTHON = 1
+STEER_ONBOARD = 2
+STEER_PROFILED = 3
+
+# Drive modes
+DRIVE_OPEN_LOOP = 1
+DRIVE_VELOCITY = 2
+
 # Test Mode
 TEST_MODE = False
 
@@ -32,6 +43,11 @@ class MyRobot(wpilib.TimedRobot):
 
     def robotInit(self):
 
+        # Console output and dashboard writes happen on background threads from here on
+        logger.start()
+        telemetry.start()
+
+        self.controllers = None
         self.drivetrain = None
         self.driver = None
         self.operator = None
@@ -39,47 +55,137 @@ class MyRobot(wpilib.TimedRobot):
         self.tester = None
         self.auton = None
         self.hooks = None
+        self.recorderConfig = None
+        self.recorder = None
+        self.scheduler = None
+        self.characterization = None
 
         # Even if no drivetrain, defaults to drive phase
         self.phase = "DRIVE_PHASE"
 
         if TEST_MODE:
+            from tester import Tester
             self.config = Tester.getTestConfig()
         else:
             self.config = robotconfig
 
-        print(self.config)
+        log.debug("config: %s", self.config)
+
+        # Status frame profiles, needed before any device is created
+        self.statusFrames = self.config.get('STATUS_FRAMES', {})
+
         for key, config in self.config.items():
-            if key == 'CONTROLLERS':
-                controllers = self.initControllers(config)
-                self.driver = controllers[0]
-                self.operator = controllers[1]
-            if key == 'DRIVETRAIN':
-                self.drivetrain = self.initDrivetrain(config)
-                print(self.drivetrain)
-            if key == 'FEEDER':
-                self.feeder = self.initFeeder(config)
-            if key == 'AUTON':
-                self.auton = self.initAuton(config)
-            if key == 'HOOKS':
-                self.hooks = self.initHooks(config)
+            subsystem = SUBSYSTEMS.get(key)
+            if subsystem is None:
+                continue
+            with startup_timer.stage('import ' + key):
+                import_modules(subsystem.modules)
+            with startup_timer.stage('init ' + key):
+                value = getattr(self, subsystem.init)(config) if subsystem.init else config
+            setattr(self, subsystem.attribute, value)
+
+        if self.controllers:
+            self.driver = self.controllers[0]
+            self.operator = self.controllers[1]
+        log.debug("drivetrain: %s", self.drivetrain)
+
+        # Every device exists now; check they all took their status frame periods
+        if self.statusFrames:
+            with startup_timer.stage('verify status frames'):
+                self.verifyStatusFrames()
+
+        # Every subsystem exists now, so the scheduled tasks can be set up
+        if 'SCHEDULER' in self.config:
+            with startup_timer.stage('init SCHEDULER'):
+                self.scheduler = self.initScheduler(self.config['SCHEDULER'])
 
         self.dashboard = NetworkTables.getTable('SmartDashboard')
         self.periods = 0
 
+        # Loop-phase timing, published to the dashboard and reported when the robot is disabled
+        self.teleopPhase = profiler.phase('teleopPeriodic', budget=self.getPeriod())
+        self.teleopDrivetrainPhase = profiler.phase('teleopDrivetrain')
+        self.teleopHooksPhase = profiler.phase('teleopHooks')
+        self.telemetryPhase = profiler.phase('telemetry.publish')
+        self.teleopAudit = AllocationAudit('teleopPeriodic')
+
+        if self.driver:
+            driver = self.driver.xboxController
+            telemetry.add_number('ctrl right x', driver.getRightX, rate=MEDIUM, deadband=0.01)
+            telemetry.add_number('ctrl right y', driver.getRightY, rate=MEDIUM, deadband=0.01)
+
         if TEST_MODE:
+            from tester import Tester
             self.tester = Tester(self)
             self.tester.initTestTeleop()
             self.tester.testCodePaths()
-            
+
+        # Last, so everything robotInit built is frozen
+        if 'MEMORY' in self.config:
+            with startup_timer.stage('freeze'):
+                self.initMemory(self.config['MEMORY'])
+
+        log.info("startup (ms):\n%s", startup_timer.report())
+
+
+    # Device factories. Every piece of hardware is created through these so the
+    # simulation harness can swap in simulated devices.
+    def createSparkMax(self, canId, motorType):
+        import rev
+        return rev.CANSparkMax(canId, motorType)
+
+    def createMotor(self, canId, motorType, role=None):
+        """
+        A SparkMax behind the CAN write deduplication; see canbus.py.
+        :param role: its profile in the STATUS_FRAMES config, if it has one
+        """
+        motor = canbus.wrap(self.createSparkMax(canId, motorType), 'SparkMax %d' % canId)
+        if role in self.statusFrames:
+            canbus.set_status_frames(motor, motor.name, self.statusFrames[role])
+        return motor
+
+    def createEncoder(self, canId, role=None):
+        """
+        A CANCoder with its status frame periods set.
+        :param role: its profile in the STATUS_FRAMES config, if it has one
+        """
+        encoder = self.createCANCoder(canId)
+        if role in self.statusFrames:
+            canbus.set_status_frames(encoder, 'CANCoder %d' % canId, self.statusFrames[role])
+        return encoder
+
+    def createCANCoder(self, canId):
+        import ctre
+        return ctre.CANCoder(canId)
+
+    def createGyro(self):
+        from navx import AHRS
+        return AHRS.create_spi()
+
+    def createDigitalInput(self, port):
+        return wpilib.DigitalInput(port)
+
+    def createXboxController(self, controllerId):
+        return wpilib.XboxController(controllerId)
+
+    def verifyStatusFrames(self):
+        """
+        :returns: True if every device took the status frame periods of its profile
+        """
+        failures = canbus.verify_status_frames()
+        if failures:
+            log.warning("status frames not set:\n%s", '\n'.join(failures))
+        log.info("status frames on %d devices: %.1f%% of the bus, %.1f%% at factory rates",
+                 len(canbus.status_frames), canbus.status_frame_load() * 100, canbus.status_frame_load(factory=True) * 100)
+        return not failures
 
     def initControllers(self, config):
+        from controller import Controller
         ctrls = {}
-        print(config)
+        log.debug("controllers: %s", config)
         for ctrlConfig in config.values():
-            print(ctrlConfig)
             controller_id = ctrlConfig['ID']
-            ctrl = wpilib.XboxController(controller_id)
+            ctrl = self.createXboxController(controller_id)
             dz = ctrlConfig['DEADZONE']
             lta = ctrlConfig['LEFT_TRIGGER_AXIS']
             rta = ctrlConfig['RIGHT_TRIGGER_AXIS']
@@ -88,20 +194,23 @@ class MyRobot(wpilib.TimedRobot):
 
 
     def initAuton(self, config):
-        self.autonHookUpTime = config['HOOK_UP_TIME']
-        self.autonDriveForwardTime = config['DRIVE_FORWARD_TIME']
-        self.autonHookDownTime = config['HOOK_DOWN_TIME']
-        self.autonDriveBackwardTime = config['DRIVE_BACKWARD_TIME']
-        self.autonForwardSpeed = config['AUTON_SPEED_FORWARD']
-        self.autonBackwardSpeed = config['AUTON_SPEED_BACKWARD']
-        return True
+        from auton import Autonomous
+        import trajectory
+
+        # Only maps the generated files; nothing is solved here unless a file is missing
+        trajectories = None
+        if 'TRAJECTORIES' in self.config and 'DRIVETRAIN' in self.config:
+            trajectories = trajectory.load_all(self.config['TRAJECTORIES'], self.config['DRIVETRAIN'])
+        return Autonomous(config, trajectories)
 
 
     def initDrivetrain(self, config):
-        
-        self.drive_type = config['DRIVETYPE']  # side effect!
+        import rev
+        from swervedrive import SwerveDrive
+        from swervemodule import SwerveModule, ModuleConfig
+        from odometry import SwerveOdometry
 
-        self.rotationCorrection = config['ROTATION_CORRECTION']
+        self.drive_type = config['DRIVETYPE']  # side effect!
 
         flModule_cfg = ModuleConfig(sd_prefix='FrontLeft_Module', zero=190.0, inverted=True, allow_reverse=True)
         frModule_cfg = ModuleConfig(sd_prefix='FrontRight_Module', zero=152.0, inverted=False, allow_reverse=True)
@@ -115,11 +224,28 @@ class MyRobot(wpilib.TimedRobot):
 
         motor_type = rev.CANSparkMaxLowLevel.MotorType.kBrushless
 
-        # Drive motors
-        flModule_driveMotor = rev.CANSparkMax(config['FRONTLEFT_DRIVEMOTOR'], motor_type)
-        frModule_driveMotor = rev.CANSparkMax(config['FRONTRIGHT_DRIVEMOTOR'], motor_type)
-        rlModule_driveMotor = rev.CANSparkMax(config['REARLEFT_DRIVEMOTOR'], motor_type)
-        rrModule_driveMotor = rev.CANSparkMax(config['REARRIGHT_DRIVEMOTOR'], motor_type)
+        # Every device waits on its own handshake, so bring them all up at once
+        (flModule_driveMotor, frModule_driveMotor, rlModule_driveMotor, rrModule_driveMotor,
+         flModule_rotateMotor, frModule_rotateMotor, rlModule_rotateMotor, rrModule_rotateMotor,
+         flModule_encoder, frModule_encoder, rlModule_encoder, rrModule_encoder,
+         gyro) = open_devices(
+            # Drive motors
+            (self.createMotor, config['FRONTLEFT_DRIVEMOTOR'], motor_type, 'DRIVE_MOTOR'),
+            (self.createMotor, config['FRONTRIGHT_DRIVEMOTOR'], motor_type, 'DRIVE_MOTOR'),
+            (self.createMotor, config['REARLEFT_DRIVEMOTOR'], motor_type, 'DRIVE_MOTOR'),
+            (self.createMotor, config['REARRIGHT_DRIVEMOTOR'], motor_type, 'DRIVE_MOTOR'),
+            # Rotate motors
+            (self.createMotor, config['FRONTLEFT_ROTATEMOTOR'], motor_type, 'STEER_MOTOR'),
+            (self.createMotor, config['FRONTRIGHT_ROTATEMOTOR'], motor_type, 'STEER_MOTOR'),
+            (self.createMotor, config['REARLEFT_ROTATEMOTOR'], motor_type, 'STEER_MOTOR'),
+            (self.createMotor, config['REARRIGHT_ROTATEMOTOR'], motor_type, 'STEER_MOTOR'),
+            # Steering encoders
+            (self.createEncoder, config['FRONTLEFT_ENCODER'], 'STEER_ENCODER'),
+            (self.createEncoder, config['FRONTRIGHT_ENCODER'], 'STEER_ENCODER'),
+            (self.createEncoder, config['REARLEFT_ENCODER'], 'STEER_ENCODER'),
+            (self.createEncoder, config['REARRIGHT_ENCODER'], 'STEER_ENCODER'),
+            (self.createGyro,),
+        )
 
         # Set ramp rates of drive motors
         #flModule_driveMotor.setClosedLoopRampRate(0.5)
@@ -127,50 +253,191 @@ class MyRobot(wpilib.TimedRobot):
         #rlModule_driveMotor.setClosedLoopRampRate(0.5)
         #rrModule_driveMotor.setClosedLoopRampRate(0.5)
 
-        # Rotate motors
-        flModule_rotateMotor = rev.CANSparkMax(config['FRONTLEFT_ROTATEMOTOR'], motor_type)
-        frModule_rotateMotor = rev.CANSparkMax(config['FRONTRIGHT_ROTATEMOTOR'], motor_type)
-        rlModule_rotateMotor = rev.CANSparkMax(config['REARLEFT_ROTATEMOTOR'], motor_type)
-        rrModule_rotateMotor = rev.CANSparkMax(config['REARRIGHT_ROTATEMOTOR'], motor_type)
-
-        flModule_encoder = ctre.CANCoder(config['FRONTLEFT_ENCODER'])
-        frModule_encoder = ctre.CANCoder(config['FRONTRIGHT_ENCODER'])
-        rlModule_encoder = ctre.CANCoder(config['REARLEFT_ENCODER'])
-        rrModule_encoder = ctre.CANCoder(config['REARRIGHT_ENCODER'])
-
         frontLeftModule = SwerveModule(flModule_driveMotor, flModule_rotateMotor, flModule_encoder, flModule_cfg)
         frontRightModule = SwerveModule(frModule_driveMotor, frModule_rotateMotor, frModule_encoder, frModule_cfg)
         rearLeftModule = SwerveModule(rlModule_driveMotor, rlModule_rotateMotor, rlModule_encoder, rlModule_cfg)
         rearRightModule = SwerveModule(rrModule_driveMotor, rrModule_rotateMotor, rrModule_encoder, rrModule_cfg)
 
-        gyro = AHRS.create_spi()
+        swerve = SwerveDrive(rearLeftModule, frontLeftModule, rearRightModule, frontRightModule, gyro,
+                             config.get('MODULE_POSITIONS'))
+
+        if config.get('STEER_MODE') == STEER_ONBOARD:
+            swerve.enable_onboard_steering(config['STEER_GEAR_RATIO'], *config['STEER_PID'], config['STEER_KS'])
+        elif config.get('STEER_MODE') == STEER_PROFILED:
+            swerve.enable_profiled_steering(*config['STEER_PROFILE'], *config['STEER_PROFILED_PID'], *config['STEER_FEEDFORWARD'])
 
-        swerve = SwerveDrive(rearLeftModule, frontLeftModule, rearRightModule, frontRightModule, gyro)
+        if config.get('DRIVE_MODE') == DRIVE_VELOCITY:
+            swerve.enable_velocity_control(config['DRIVE_MAX_SPEED'], config['WHEEL_DIAMETER'], config['DRIVE_GEAR_RATIO'],
+                                           *config['DRIVE_FEEDFORWARD'], config['DRIVE_KP'])
+
+        if config.get('MAX_STEER_RATE'):
+            swerve.enable_setpoint_generator(config['MAX_STEER_RATE'])
+
+        if config.get('COSINE_SCALING'):
+            swerve.enable_cosine_scaling()
+
+        if config.get('ROTATION_CORRECTION'):
+            swerve.enable_heading_prediction(config['ROTATION_CORRECTION'], config.get('ROTATION_CORRECTION_SECOND_ORDER', False))
+
+        if 'WHEEL_DIAMETER' in config:
+            swerve.odometry = SwerveOdometry(swerve, config['WHEEL_DIAMETER'], config['DRIVE_GEAR_RATIO'])
 
         return swerve
 
         #self.testingModule = frontLeftModule
 
+    def initScheduler(self, config):
+        """
+        Move the work that doesn't need the main loop's rate into periodic tasks:
+        steering faster, the dashboard slower, each on its own offset.
+        """
+        from scheduler import Scheduler
+        scheduler = Scheduler(self.getPeriod())
+
+        if self.drivetrain and not self.drivetrain.onboard_steering:
+            self.drivetrain.steering_scheduled = True
+            # The PID's I and D terms are per second; they need the rate the loop really runs at
+            self.drivetrain.set_steering_period(1 / config['STEERING_RATE'])
+            # The characterization steers the modules itself
+            steering = lambda: self.isEnabled() and not self.characterization
+            scheduler.add('steering', self.drivetrain.steer, config['STEERING_RATE'], enabled=steering)
+
+        if self.hooks and self.operator:
+            scheduler.add('hooks', self.teleopHooks, config['HOOKS_RATE'], enabled=self.isTeleopEnabled)
+
+        telemetry.set_loop_rate(config['TELEMETRY_RATE'])
+        scheduler.add('telemetry', self.publishTelemetry, config['TELEMETRY_RATE'])
+        scheduler.add('tunables', tunables.update, config['TUNABLES_RATE'])
+
+        scheduler.install(self)
+        log.info("scheduled tasks:\n%s", scheduler.report())
+        return scheduler
+
+    def initMemory(self, config):
+        memory.configure(config['FREEZE'], config['MATCH_GC'], config['COLLECT_PERIOD'])
+        memory.freeze()
+        if memory.frozen:
+            log.info("froze %d objects", memory.frozen)
+        if config['ALLOCATION_AUDIT']:
+            self.teleopAudit.start()
+            log.warning("allocation audit on: every allocation is traced")
+
     #EXAMPLE
     def initFeeder(self, config):
+        import rev
+        from feeder import Feeder
         # assuming this is a Neo; otherwise it may not be brushless
         motor_type = rev.CANSparkMaxLowLevel.MotorType.kBrushless
-        feeder = rev.CANSparkMax(config['FEEDER_ID'], motor_type)
+        feeder = self.createMotor(config['FEEDER_ID'], motor_type, 'FEEDER_MOTOR')
         return Feeder(feeder, config['FEEDER_SPEED'])
 
 
     def robotPeriodic(self):
+        if not self.scheduler:
+            # Push any values changed on the dashboard into the subsystems
+            tunables.update()
+            self.publishTelemetry()
+        if self.recorderConfig and self.isEnabled():
+            self.recordLoop()
         return True
 
+    def publishTelemetry(self):
+        with self.telemetryPhase:
+            telemetry.publish()
+
+    def recordLoop(self):
+        """
+        Append this loop to the match recording. The file is created
+        the first time the robot is enabled.
+        """
+        if not (self.drivetrain and self.driver and self.operator):
+            return
+
+        if self.recorder is None:
+            from recorder import MatchRecorder, default_path
+            config = self.recorderConfig
+            directory = config['DIRECTORY'] if self.isReal() else config['SIM_DIRECTORY']
+            os.makedirs(directory, exist_ok=True)
+            self.recorder = MatchRecorder(default_path(directory), config['CAPACITY'])
+            log.info("recording to %s", self.recorder.path)
+
+        if not self.recorder.record(self, wpilib.Timer.getFPGATimestamp()):
+            log.warning("match recording is full: %s", self.recorder.path)
+
+
+    def disabledInit(self):
+        log.info("loop profile (us):\n%s", profiler.report())
+        profiler.reset()
+        log.info("CAN frames:\n%s", canbus.report())
+        canbus.reset()
+        if self.teleopAudit.active:
+            log.info("allocation audit:\n%s", self.teleopAudit.report())
+            self.teleopAudit.reset()
+        memory.leave_match()
+        if self.recorder:
+            self.recorder.flush()
+        if self.characterization:
+            self.saveCharacterization()
+
+    def disabledPeriodic(self):
+        memory.idle(wpilib.Timer.getFPGATimestamp())
+
+
+    def testInit(self):
+        """
+        Test mode runs the drive characterization; see characterize.py.
+        """
+        memory.enter_match()
+        canbus.resend()
+        if not (self.drivetrain and self.drivetrain.odometry):
+            return
+        import characterize
+        self.characterization = characterize.Characterization(self.drivetrain, self.drivetrain.odometry.velocity_factor)
+        log.info("characterizing the drive motors")
+
+    def testPeriodic(self):
+        if not self.characterization:
+            return
+        self.sampleSensors()
+        if not self.characterization.update(self.drivetrain.sensors.timestamp):
+            self.saveCharacterization()
+
+    def saveCharacterization(self):
+        import characterize
+        config = self.recorderConfig or {}
+        directory = config.get('DIRECTORY' if self.isReal() else 'SIM_DIRECTORY', '.')
+        os.makedirs(directory, exist_ok=True)
+        path = characterize.default_path(directory)
+        self.characterization.save(path)
+        log.info("drive characterization data saved to %s", path)
+        self.characterization = None
+
 
     def teleopInit(self):
-        print("teleopInit ran")
+        log.info("teleopInit ran")
+        memory.enter_match()
+        canbus.resend()
+        if self.drivetrain:
+            self.drivetrain.seed_steering()
         return True
 
 
+    def sampleSensors(self):
+        """
+        Read every sensor once at the top of the loop so the whole
+        cycle works from the same values.
+        """
+        if self.drivetrain:
+            self.drivetrain.sample_sensors()
+
     def teleopPeriodic(self):
-        self.teleopDrivetrain()
-        self.teleopHooks()
+        with self.teleopPhase, self.teleopAudit:
+            self.sampleSensors()
+            with self.teleopDrivetrainPhase:
+                self.teleopDrivetrain()
+            if not self.scheduler:
+                with self.teleopHooksPhase:
+                    self.teleopHooks()
         return True
 
     def move(self, x, y, rcw):
@@ -205,9 +472,6 @@ class MyRobot(wpilib.TimedRobot):
 
         speedMulti = 1.0
 
-        self.dashboard.putNumber('ctrl right x', driver.getRightX())
-        self.dashboard.putNumber('ctrl right y', driver.getRightY())
-        
 
         if (driver.getLeftTriggerAxis() > 0.7 and driver.getRightTriggerAxis() > 0.7):
             self.drivetrain.resetGyro()
@@ -234,21 +498,22 @@ class MyRobot(wpilib.TimedRobot):
         return
 
     def initHooks(self, config):
+        import rev
+        from hooks import Hooks
         motor_type = rev.CANSparkMaxLowLevel.MotorType.kBrushed
 
-        #Front
-        hook1 = rev.CANSparkMax(config['FRONT_HOOK_ID'], motor_type)
-
-        #Back
-        hook2 = rev.CANSparkMax(config['BACK_HOOK_ID'], motor_type)
-
-        #Left
-        hook3 = rev.CANSparkMax(config['LEFT_HOOK_ID'], motor_type)
-
-        #Right
-        hook4 = rev.CANSparkMax(config['RIGHT_HOOK_ID'], motor_type)
-
-        return Hooks([hook1, hook2, hook3, hook4])
+        hook1, hook2, hook3, hook4 = open_devices(
+            #Front
+            (self.createMotor, config['FRONT_HOOK_ID'], motor_type, 'HOOK_MOTOR'),
+            #Back
+            (self.createMotor, config['BACK_HOOK_ID'], motor_type, 'HOOK_MOTOR'),
+            #Left
+            (self.createMotor, config['LEFT_HOOK_ID'], motor_type, 'HOOK_MOTOR'),
+            #Right
+            (self.createMotor, config['RIGHT_HOOK_ID'], motor_type, 'HOOK_MOTOR'),
+        )
+
+        return Hooks([hook1, hook2, hook3, hook4], self.createDigitalInput)
     
     def teleopHooks(self):
         operator = self.operator.xboxController
@@ -269,48 +534,35 @@ class MyRobot(wpilib.TimedRobot):
 
 
     def autonomousInit(self):
+        memory.enter_match()
+        canbus.resend()
         if not self.auton:
             return
         if not self.drivetrain:
             return
         self.drivetrain.resetGyro()
-        self.autonTimer = wpilib.Timer()
-        self.autonTimer.start()
-        self.autonHookUp = False
-        self.autonHookDown = False
+        self.drivetrain.seed_steering()
+        if self.drivetrain.odometry:
+            self.drivetrain.odometry.reset()
+        self.auton.start(self.move, self.hooks, self.createFollower())
+
+    def createFollower(self):
+        """
+        :returns: the HolonomicFollower for the autonomous paths, or None without odometry
+        """
+        if not (self.drivetrain.odometry and 'TRAJECTORIES' in self.config):
+            return None
+        from trajectory import HolonomicFollower
+        translation_gain, rotation_gain = self.config['TRAJECTORIES']['FOLLOWER_GAINS']
+        return HolonomicFollower(self.drivetrain, self.config['DRIVETRAIN']['DRIVE_MAX_SPEED'],
+                                 translation_gain, rotation_gain)
 
     def autonomousPeriodic(self):
-        if not self.auton:
-            print("failed self.auton")
-            return
-        if not self.drivetrain:
-            print("failed self.drivetrain")
+        if not (self.auton and self.drivetrain):
             return
-        
-        print("autonomousPeriodic")
-        #return
-        driver = self.driver.xboxController
-        #if driver.getLeftBumper() and driver.getRightBumper():
-        
-        if self.autonTimer.get() < self.autonHookUpTime:
-            print("hook up")
-            #if self.autonHookUp == False:
-                #self.hooks.change_right()
-                #self.autonHookUp == True
-            #self.hooks.update()
-        elif self.autonHookUpTime <= self.autonTimer.get() < self.autonDriveForwardTime:
-            print("move forwards")
-            #self.move(0, -self.autonForwardSpeed, 0)
-        elif self.autonDriveForwardTime <= self.autonTimer.get() < self.autonHookDownTime:
-            print("hook down")
-            #if self.autonHookDown == False:
-                #self.hooks.change_right()
-                #self.autonHookDown = True
-            #self.hooks.update()
-        elif self.autonHookDownTime <= self.autonTimer.get() < self.autonDriveBackwardTime:
-            print("move backwards")
-            #self.move(0, self.autonBackwardSpeed, 0)
-        #self.hooks.update()
+        self.sampleSensors()
+        # The sensor timestamp is the loop's one clock read
+        self.auton.update(self.drivetrain.sensors.timestamp)
 
     def deadzoneCorrection(self, val, deadzone):
         """
@@ -5,6 +5,15 @@ ARCADE = 1
 TANK = 2
 SWERVE = 3
 
+# Steering modes
+STEER_PYTHON = 1 # WPILib PIDController in the robot loop
+STEER_ONBOARD = 2 # SparkMax position control, seeded from the CANCoders
+STEER_PROFILED = 3 # trapezoidal motion profile with feedforward in the robot loop
+
+# Drive modes
+DRIVE_OPEN_LOOP = 1 # duty cycle; speed drops with the battery
+DRIVE_VELOCITY = 2 # SparkMax velocity control with feedforward
+
 ##########################
 ###  ROBOT COMPONENTS  ###
 ##########################
@@ -37,7 +46,34 @@ drivetrainConfig = {
     'REARRIGHT_ENCODER': 23,
     'REARLEFT_ENCODER': 24,
     'DRIVETYPE': SWERVE,
+    # Seconds from the gyro sample until the wheels follow a field-oriented command: half a loop
+    # plus the steering response; 0 to use the sampled heading. The simulation's best is about 0.09
+    # with STEER_PYTHON and about 0 with STEER_PROFILED (scenarios.py spin_drift). Measure on the robot first
     'ROTATION_CORRECTION': 0.0,
+    'ROTATION_CORRECTION_SECOND_ORDER': False, # also extrapolate the change of the gyro rate
+    'WHEEL_DIAMETER': 0.1016, # meters (4 in)
+    'DRIVE_GEAR_RATIO': 6.75, # motor rotations per wheel rotation
+    # (left, forward) of each module from the center in meters: front_left, front_right, rear_left, rear_right
+    'MODULE_POSITIONS': ((0.381, 0.381), (-0.381, 0.381), (0.381, -0.381), (-0.381, -0.381)),
+    'STEER_MODE': STEER_PYTHON,
+    'STEER_GEAR_RATIO': 12.8, # rotate motor rotations per module rotation
+    'STEER_PID': (0.005, 0.0, 0.0), # onboard kP, kI, kD; duty cycle per degree
+    'STEER_KS': 0.0, # volts
+    # STEER_PROFILED: max velocity (degrees/s) and acceleration (degrees/s^2), well inside what the NEO can do
+    'STEER_PROFILE': (1500.0, 20000.0),
+    'STEER_PROFILED_PID': (0.02, 0.0008), # kP (duty cycle per degree), kD (duty cycle per degree/s)
+    # kS (V), kV (V per degree/s), kA (V per degree/s^2). From the NEO's free speed through
+    # STEER_GEAR_RATIO; measure on the robot before switching to STEER_PROFILED
+    'STEER_FEEDFORWARD': (0.0, 0.00451, 0.00018),
+    'DRIVE_MODE': DRIVE_OPEN_LOOP,
+    'DRIVE_MAX_SPEED': 4.0, # meters per second at full stick
+    # kS (V), kV (V per m/s), kA (V per m/s^2). Measured in simulation;
+    # run characterize.py on the robot before switching to DRIVE_VELOCITY
+    'DRIVE_FEEDFORWARD': (0.006, 2.682, 0.395),
+    'DRIVE_KP': 0.0001, # duty cycle per RPM of velocity error
+    # Off until they beat the plain setpoints in scenarios.py direction_changes or on the carpet:
+    'MAX_STEER_RATE': None, # degrees per second a module turns (1080 for a NEO); None to send every setpoint as requested
+    'COSINE_SCALING': False, # drive slower while a wheel still points the wrong way
 }
 
 shooterConfig = {
@@ -81,12 +117,51 @@ visionConfig = {
 }
 
 autonConfig = {
-    'HOOK_UP_TIME': 0.5,
-    'DRIVE_FORWARD_TIME': 0.75,
-    'HOOK_DOWN_TIME': 2.0,
-    'DRIVE_BACKWARD_TIME': 2.5,
-    'AUTON_SPEED_FORWARD': 0.8,
-    'AUTON_SPEED_BACKWARD': 0.5,
+    'ROUTINE': 'NOTHING', # runs unless another is picked on the dashboard (Auton/routine)
+    # Steps run one after another; see auton.py. DRIVE takes MyRobot.move's (x, y, rcw): forward is -y
+    'ROUTINES': {
+        'HOOK_AND_BACK_UP': (
+            ('HOOK', 'RIGHT', 0.5),
+            ('DRIVE', (0.0, -0.8, 0.0), 0.25),
+            ('HOOK', 'RIGHT', 1.25),
+            ('DRIVE', (0.0, 0.5, 0.0), 0.5),
+        ),
+        # Same, with the hook going up while the robot drives
+        'HOOK_WHILE_DRIVING': (
+            ('PARALLEL', (
+                ('HOOK', 'RIGHT', 0.0),
+                ('DRIVE', (0.0, -0.8, 0.0), 0.25),
+            )),
+            ('HOOK', 'RIGHT', 1.25),
+            ('DRIVE', (0.0, 0.5, 0.0), 0.5),
+        ),
+        # Follow the SWEEP trajectory, raising the hook on the way
+        'SWEEP_AND_HOOK': (
+            ('PARALLEL', (
+                ('PATH', 'SWEEP'),
+                ('SEQUENCE', (
+                    ('WAIT', 0.5),
+                    ('HOOK', 'RIGHT', 0.0),
+                )),
+            )),
+            ('HOOK', 'RIGHT', 0.0),
+        ),
+        'NOTHING': (),
+    },
+}
+
+trajectoryConfig = {
+    'DIRECTORY': 'trajectories', # generated by trajectory.py and deployed with the code
+    'SPEED_SCALE': 0.8, # share of DRIVE_MAX_SPEED a path may plan on; the rest is for corrections
+    'MAX_ACCELERATION': 2.5, # m/s^2, along the path and sideways
+    'MAX_ANGULAR_VELOCITY': 3.0, # rad/s
+    'MAX_VOLTAGE': 10.0, # of the battery, for the feedforward's acceleration limit
+    'FOLLOWER_GAINS': (2.0, 3.0), # (m/s per meter, rad/s per radian) of error
+    # (x, y, heading) waypoints in the odometry frame, from where autonomous starts:
+    # meters, and radians counterclockwise
+    'PATHS': {
+        'SWEEP': ((0.0, 0.0, 0.0), (1.0, 0.5, 0.0), (2.0, 0.0, 1.5708)),
+    },
 }
 
 climberConfig = {
@@ -121,6 +196,63 @@ hooksConfig = {
     'RIGHT_BOTTOM_PORT': 7
 }
 
+recorderConfig = {
+    'DIRECTORY': '/home/lvuser/logs', # on the RoboRIO
+    'SIM_DIRECTORY': '.', # in simulation
+    'CAPACITY': 30000, # records; ten minutes of enabled time at 50 Hz
+}
+
+schedulerConfig = {
+    # Rates in Hz of the work that runs outside the 50 Hz main loop.
+    # The steering PID gains were tuned at 50 Hz. To steer faster (e.g. 200), retune the steering PID
+    # at that rate on the robot first: it means up to that many rotate motor writes and CANCoder reads a second
+    'STEERING_RATE': 50,
+    'HOOKS_RATE': 50,
+    'TELEMETRY_RATE': 10,
+    'TUNABLES_RATE': 10,
+}
+
+memoryConfig = {
+    # Off until measured on the robot; turn on together to keep full collections out of the match loop
+    'FREEZE': False, # gc.freeze() the object graph robotInit built
+    'MATCH_GC': False, # no automatic full garbage collections while enabled
+    'COLLECT_PERIOD': 1.0, # seconds between full collections while disabled
+    'ALLOCATION_AUDIT': False, # trace teleopPeriodic's allocations; slows every loop, never for a match
+}
+
+# CAN status frame periods in milliseconds, by device role; roles without a profile keep the factory rates.
+# SparkMax frames: STATUS_0 applied output and faults (factory 10), STATUS_1 velocity, current and
+# temperature (20), STATUS_2 position (20), STATUS_3 analog sensor (50).
+# CANCoder frames: SENSOR_DATA absolute position and velocity (10), VBAT_AND_FAULTS (100).
+statusFrameConfig = {
+    'DRIVE_MOTOR': {
+        'STATUS_1': 20, # velocity, for odometry and velocity control
+        'STATUS_2': 500,
+        'STATUS_3': 500,
+    },
+    'STEER_MOTOR': {
+        'STATUS_1': 500,
+        'STATUS_2': 20, # position, for onboard steering
+        'STATUS_3': 500,
+    },
+    'STEER_ENCODER': {
+        # read by the steering task: keep the factory 10 ms unless it steers faster than 100 Hz
+        'SENSOR_DATA': min(10, 1000 // schedulerConfig['STEERING_RATE']),
+        'VBAT_AND_FAULTS': 255,
+    },
+    'HOOK_MOTOR': { # brushed, nothing read back
+        'STATUS_0': 100,
+        'STATUS_1': 500,
+        'STATUS_2': 500,
+        'STATUS_3': 500,
+    },
+    'FEEDER_MOTOR': {
+        'STATUS_1': 500,
+        'STATUS_2': 20, # position, for hasFired
+        'STATUS_3': 500,
+    },
+}
+
 #######################
 ###  ROBOT CONFIGS  ###
 #######################
@@ -135,7 +267,9 @@ testbot = { # Always used for unit tests ($ python robot.py sim)
     'VISION': visionConfig,
     'AUTON': autonConfig,
     'CLIMBER': climberConfig,
-    'HOOKS': hooksConfig
+    'HOOKS': hooksConfig,
+    'RECORDER': recorderConfig,
+    'STATUS_FRAMES': statusFrameConfig
 }
 
 gull_lake = {
@@ -164,7 +298,12 @@ testBot = {
     'CONTROLLERS': controllerConfig,
     'DRIVETRAIN': drivetrainConfig,
     'HOOKS': hooksConfig,
-    'AUTON': autonConfig
+    'AUTON': autonConfig,
+    'TRAJECTORIES': trajectoryConfig,
+    'RECORDER': recorderConfig,
+    'SCHEDULER': schedulerConfig,
+    'STATUS_FRAMES': statusFrameConfig,
+    'MEMORY': memoryConfig
 }
 
 showbot['SHOOTER']['SHOOTER_ID'] = 10 # how to override just one thing
@@ -0,0 +1,350 @@
+"""
+Drivetrain behavior scenarios in the simulation.
+
+benchmark.py measures how long the code takes; these measure what the
+robot does. Each scenario drives the simulated robot through the same
+maneuvers once per variant of the drivetrain setup and reports how each
+variant handled them, so a change to the steering or the setpoints can be
+judged by its effect on the robot before it is tried on the carpet.
+
+    $ python scenarios.py                       # every scenario
+    $ python scenarios.py direction_changes     # just one
+
+direction_changes
+    Drives a leg in one direction, then switches straight to another: 90,
+    135 and 180 degrees away. For every leg it reports the response time,
+    until the chassis velocity is within RESPONSE_TOLERANCE of where it
+    ends up, and the scrub, the distance the wheels slid sideways against
+    each other. The scrub is the part of the module velocities that no
+    rigid-body motion explains.
+
+steering_steps
+    Points every module at a sequence of random angles, STEP_TIME apart,
+    with the robot standing still, and reports how long each step took to
+    settle within SETTLE_TOLERANCE and how far it overshot, on average and
+    at worst, for the plain PID steering and the motion-profiled steering.
+
+spin_drift
+    Drives in a straight line, then keeps driving in the same direction
+    while spinning, first slowly, then fast, then fast the other way. For
+    every leg it reports the drift, how far the robot moved sideways off
+    its line, and the mean error between the direction it moved and the one
+    it was asked to, with the field-oriented commands rotated by the sampled
+    gyro angle and by the heading predicted from the gyro rate.
+"""
+import argparse
+import math
+import random
+import sys
+from collections import namedtuple
+
+from robotconfig import drivetrainConfig, schedulerConfig
+from simulation import Simulation, PERIOD
+
+# Response time ends when the velocity error is this share of the final velocity
+RESPONSE_TOLERANCE = 0.1
+# or this many meters per second, for legs that end at rest
+MIN_TOLERANCE = 0.05
+
+# Settle time before the first leg, so the modules start lined up
+SETTLE_TIME = 0.5
+
+# Steering rate for the limited variants when drivetrainConfig has none, degrees per second
+DEFAULT_STEER_RATE = 1080.0
+
+# (name, right stick x, right stick y, left stick x, seconds) of every leg, as the driver would push the sticks
+LEGS = (
+    ('forward', 0.0, -1.0, 0.0, 1.5),
+    ('left', -1.0, 0.0, 0.0, 1.5),
+    ('back right', 0.7, 0.7, 0.0, 1.5),
+    ('forward left', -0.7, -0.7, 0.0, 1.5),
+    ('spin forward', 0.0, -1.0, 1.0, 1.5),
+    ('spin left', -1.0, 0.0, 1.0, 1.5),
+    ('spin back', 0.0, 1.0, -1.0, 1.5),
+    ('stop', 0.0, 0.0, 0.0, 1.0),
+)
+
+# Random angle steps: how many, how long each is held, and the seed, so every variant gets the same ones
+STEPS = 40
+STEP_TIME = 0.5
+STEPS_SEED = 1076
+# A module has settled when it stays this close to its target, degrees
+SETTLE_TOLERANCE = 2.0
+# Loop period for steering_steps: the steering task's rate, so every steering update is seen
+STEERING_PERIOD = 1 / schedulerConfig['STEERING_RATE']
+
+# (name, left stick x, seconds) of every spin_drift leg, translating with the right stick at SPIN_DRIVE
+SPIN_LEGS = (
+    ('slow spin', 0.5, 1.5),
+    ('fast spin', 1.0, 1.5),
+    ('reverse spin', -1.0, 1.5),
+)
+SPIN_DRIVE = (0.0, -1.0)
+# Seconds of driving straight first; the direction at the end is the line the legs are measured from
+LINE_TIME = 1.0
+# Heading lookahead for the predicted variants when drivetrainConfig has none, seconds
+DEFAULT_LOOKAHEAD = 0.09
+
+# run: function(sim) returning rows of (label, {metric: value})
+# variants: {name: function(drivetrain)} setting the drivetrain up before the run
+# metrics: (name, format) of every metric, in report order
+# period: the simulation's loop period
+# totals: add a row with the sum of every metric
+Scenario = namedtuple('Scenario', ['run', 'variants', 'metrics', 'period', 'totals'])
+
+
+def requested_setpoints(drivetrain):
+    """
+    Send every setpoint as requested, at full drive speed.
+    """
+    drivetrain.setpoint_generator = None
+    for index, module in drivetrain._indexed_modules:
+        module.cosine_scaling = False
+
+
+def limited_setpoints(drivetrain):
+    """
+    The setpoint generator and cosine scaling.
+    """
+    if not drivetrain.setpoint_generator:
+        drivetrain.enable_setpoint_generator(DEFAULT_STEER_RATE)
+    drivetrain.enable_cosine_scaling()
+
+
+def plain_steering(drivetrain):
+    """
+    The PID on the angle error.
+    """
+    for index, module in drivetrain._indexed_modules:
+        module.profiled_steering = None
+
+
+def profiled_steering(drivetrain):
+    """
+    The trapezoidal profile with feedforward, with drivetrainConfig's settings.
+    """
+    drivetrain.enable_profiled_steering(*drivetrainConfig['STEER_PROFILE'], *drivetrainConfig['STEER_PROFILED_PID'],
+                                        *drivetrainConfig['STEER_FEEDFORWARD'])
+
+
+def gyro_heading(drivetrain):
+    """
+    Rotate the commands by the gyro angle as it was sampled.
+    """
+    drivetrain.heading_lookahead = 0.0
+    drivetrain.heading_second_order = False
+
+
+def predicted_heading(drivetrain):
+    """
+    Rotate the commands by the heading extrapolated from the gyro rate.
+    """
+    drivetrain.enable_heading_prediction(drivetrainConfig.get('ROTATION_CORRECTION') or DEFAULT_LOOKAHEAD)
+
+
+def second_order_heading(drivetrain):
+    """
+    Also extrapolate the change of the gyro rate.
+    """
+    drivetrain.enable_heading_prediction(drivetrainConfig.get('ROTATION_CORRECTION') or DEFAULT_LOOKAHEAD, True)
+
+
+def _scrub(sim):
+    """
+    :returns: how fast the simulated wheels slide against each other, meters per second
+    """
+    lefts = []
+    forwards = []
+    for module in sim.modules:
+        left, forward = module.velocity()
+        lefts.append(left)
+        forwards.append(forward)
+    return sim.robot.drivetrain.kinematics.forward(lefts, forwards)[3]
+
+
+def direction_changes(sim):
+    driver = sim.driver
+    driver.reset()
+    sim.run(SETTLE_TIME)
+
+    rows = []
+    for name, x, y, rcw, seconds in LEGS:
+        driver.setAxis('RightX', x)
+        driver.setAxis('RightY', y)
+        driver.setAxis('LeftX', rcw)
+
+        # Field velocities, so a leg that spins has a steady velocity to settle on
+        chassis = sim.chassis
+        velocities = []
+        scrub = 0.0
+        for cycle in range(round(seconds / sim.period)):
+            x0, y0 = chassis.x, chassis.y
+            sim.step()
+            velocities.append(((chassis.x - x0) / sim.period, (chassis.y - y0) / sim.period))
+            scrub += _scrub(sim) * sim.period
+
+        final_x, final_y = velocities[-1]
+        tolerance = max(RESPONSE_TOLERANCE * math.hypot(final_x, final_y), MIN_TOLERANCE)
+        # The last time the velocity was still outside the tolerance
+        response = 0.0
+        for cycle, (vx, vy) in enumerate(velocities):
+            if math.hypot(vx - final_x, vy - final_y) > tolerance:
+                response = (cycle + 1) * sim.period
+
+        rows.append((name, {'response': response, 'scrub': scrub}))
+
+    return rows
+
+
+def steering_steps(sim):
+    robot = sim.robot
+    drivetrain = robot.drivetrain
+    rng = random.Random(STEPS_SEED)
+    target = [0.0]
+
+    def periodic():
+        # Only steer; the sticks aren't read
+        robot.sampleSensors()
+        for index, module in drivetrain._indexed_modules:
+            module.move(0.0, target[0])
+            if not drivetrain.steering_scheduled:
+                module.execute()
+    sim._periodic = periodic
+
+    sim.run(SETTLE_TIME)
+
+    settle_times = []
+    overshoots = []
+    for step in range(STEPS):
+        target[0] = rng.uniform(0.0, 360.0)
+        settled = [0.0] * len(sim.modules)
+        overshoot = [0.0] * len(sim.modules)
+        directions = []
+
+        for cycle in range(round(STEP_TIME / sim.period)):
+            sim.step()
+            for index, physics in enumerate(sim.modules):
+                module = physics.module
+                goal = module._requested_angle - 180 if module.moduleFlipped else module._requested_angle
+                error = math.remainder(goal - physics.azimuth, 360)
+                if not cycle:
+                    # Which way the module turns; the first loop picked the target or its opposite
+                    directions.append(math.copysign(1.0, error))
+                overshoot[index] = max(overshoot[index], -error * directions[index])
+                if abs(error) > SETTLE_TOLERANCE:
+                    settled[index] = (cycle + 1) * sim.period
+
+        settle_times.extend(settled)
+        overshoots.extend(overshoot)
+
+    return [
+        ('mean', {'settle': sum(settle_times) / len(settle_times), 'overshoot': sum(overshoots) / len(overshoots)}),
+        ('worst', {'settle': max(settle_times), 'overshoot': max(overshoots)}),
+    ]
+
+
+def spin_drift(sim):
+    driver = sim.driver
+    driver.reset()
+    sim.run(SETTLE_TIME)
+
+    chassis = sim.chassis
+    driver.setAxis('RightX', SPIN_DRIVE[0])
+    driver.setAxis('RightY', SPIN_DRIVE[1])
+    x0, y0 = chassis.x, chassis.y
+    sim.run(LINE_TIME - sim.period)
+    x1, y1 = chassis.x, chassis.y
+    sim.step()
+    line = math.atan2(chassis.y - y1, chassis.x - x1)
+    cos_line = math.cos(line)
+    sin_line = math.sin(line)
+
+    rows = []
+    for name, rcw, seconds in SPIN_LEGS:
+        driver.setAxis('LeftX', rcw)
+
+        # Sideways is to the left of the line
+        start = -(chassis.x - x0) * sin_line + (chassis.y - y0) * cos_line
+        error = 0.0
+        cycles = round(seconds / sim.period)
+        for cycle in range(cycles):
+            x1, y1 = chassis.x, chassis.y
+            sim.step()
+            direction = math.atan2(chassis.y - y1, chassis.x - x1)
+            error += abs(math.degrees(math.remainder(direction - line, math.tau)))
+        end = -(chassis.x - x0) * sin_line + (chassis.y - y0) * cos_line
+
+        rows.append((name, {'drift': abs(end - start), 'error': error / cycles}))
+
+    return rows
+
+
+SCENARIOS = {
+    'direction_changes': Scenario(direction_changes,
+                                  {'requested': requested_setpoints, 'limited': limited_setpoints},
+                                  (('response', '%8.2f s'), ('scrub', '%8.3f m')),
+                                  PERIOD, True),
+    'steering_steps': Scenario(steering_steps,
+                               {'pid': plain_steering, 'profiled': profiled_steering},
+                               (('settle', '%8.3f s'), ('overshoot', '%6.1f deg')),
+                               STEERING_PERIOD, False),
+    'spin_drift': Scenario(spin_drift,
+                           {'gyro': gyro_heading, 'predicted': predicted_heading, 'second order': second_order_heading},
+                           (('drift', '%8.3f m'), ('error', '%6.1f deg')),
+                           PERIOD, False),
+}
+
+
+def run(name):
+    """
+    :param name: a key of SCENARIOS
+    :returns: {variant: rows}
+    """
+    scenario = SCENARIOS[name]
+    results = {}
+    for variant, setup in scenario.variants.items():
+        sim = Simulation(scenario.period)
+        setup(sim.robot.drivetrain)
+        sim.enable('teleop')
+        results[variant] = scenario.run(sim)
+        sim.enable('disabled')
+    return results
+
+
+def report(name, results):
+    """
+    :returns: a table with a row per step of the scenario and a column per variant and metric, with the totals
+    """
+    scenario = SCENARIOS[name]
+    variants = list(results)
+    columns = [(variant, metric, form) for metric, form in scenario.metrics for variant in variants]
+
+    lines = [name,
+             '%-16s' % '' + ''.join(' %12s' % metric for variant, metric, form in columns),
+             '%-16s' % '' + ''.join(' %12s' % variant for variant, metric, form in columns)]
+    for index, (label, metrics) in enumerate(results[variants[0]]):
+        lines.append('%-16s' % label + ''.join(
+            ' %12s' % (form % results[variant][index][1][metric]) for variant, metric, form in columns))
+    if scenario.totals:
+        lines.append('%-16s' % 'total' + ''.join(
+            ' %12s' % (form % sum(metrics[metric] for label, metrics in results[variant])) for variant, metric, form in columns))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help='the scenarios to run; all by default')
+    args = parser.parse_args(argv)
+
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario %s; choose from %s" % (name, ', '.join(SCENARIOS)))
+
+    for name in args.scenarios or SCENARIOS:
+        print(report(name, run(name)))
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
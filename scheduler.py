@@ -0,0 +1,134 @@
+"""
+Multi-rate periodic tasks on top of TimedRobot.
+
+Each task declares its rate and, optionally, a phase offset within its
+period. install() hands every task to TimedRobot.addPeriodic, so they all
+run on the robot's main thread between iterations of the main loop and
+never race with it.
+
+Tasks without an offset are staggered automatically: the main loop's period
+is divided into SLOTS slots, the main loop itself occupies slot 0, and each
+task is put on the offset whose slots carry the least work so far. A 200 Hz
+steering loop, a 50 Hz hook update and a 10 Hz dashboard push end up on
+different milliseconds instead of all piling onto the main loop's tick.
+"""
+from profiler import profiler
+
+# Slots per main loop period; 1 ms each at 50 Hz
+SLOTS = 20
+
+
+class Task:
+    """
+    One periodic callback, timed by the profiler.
+    """
+
+    __slots__ = ('name', 'callback', 'period', 'offset', 'enabled', 'next_time', '_phase')
+
+    def __init__(self, name, callback, period, offset, enabled):
+        self.name = name
+        self.callback = callback
+        self.period = period
+        self.offset = offset
+        self.enabled = enabled
+        self.next_time = None
+        self._phase = profiler.phase('task/' + name, budget=period)
+
+    def __call__(self):
+        if self.enabled is None or self.enabled():
+            with self._phase:
+                self.callback()
+
+
+class Scheduler:
+
+    def __init__(self, period):
+        """
+        :param period: the robot's main loop period in seconds
+        """
+        self.period = period
+        self.tasks = []
+
+        # How much work lands in each slot of the main loop period
+        self._load = [0.0] * SLOTS
+        self._load[0] = 1.0
+
+    def add(self, name, callback, rate, offset=None, enabled=None):
+        """
+        Run a callback periodically.
+        :param name: shown in the profiler as task/<name>
+        :param callback: called with no arguments
+        :param rate: how many times per second to run
+        :param offset: seconds after the main loop to run; None to stagger automatically
+        :param enabled: optional function; the task is skipped while it returns False
+        :returns: the Task
+        """
+        period = 1.0 / rate
+        if offset is None:
+            offset = self._stagger(period)
+
+        task = Task(name, callback, period, offset, enabled)
+        self.tasks.append(task)
+        return task
+
+    def _stagger(self, period):
+        """
+        :returns: the offset for a task of this period that puts it on the least loaded slots
+        """
+        slot = self.period / SLOTS
+        load = self._load
+
+        if period < self.period:
+            # Runs several times per main loop: occupies every period_slots-th slot
+            period_slots = max(1, round(period / slot))
+            candidates = [(offset, range(offset, SLOTS, period_slots), 1.0) for offset in range(period_slots)]
+        else:
+            # Runs once every few main loops: occupies one slot, part of the time
+            candidates = [(offset, (offset,), self.period / period) for offset in range(SLOTS)]
+
+        best_offset, best_slots, weight = min(candidates, key=lambda candidate: max(load[index] for index in candidate[1]))
+        for index in best_slots:
+            load[index] += weight
+
+        return best_offset * slot
+
+    def install(self, robot):
+        """
+        Register every task with the robot. Call from robotInit.
+        :param robot: the TimedRobot
+        """
+        for task in self.tasks:
+            robot.addPeriodic(task, task.period, task.offset)
+
+    # The simulation has no TimedRobot loop; it runs the tasks itself with these
+
+    def start(self, now):
+        """
+        :param now: the time of the first main loop
+        """
+        for task in self.tasks:
+            task.next_time = now + task.offset
+
+    def next_due(self):
+        """
+        :returns: the time the next task is due, or None if there are no tasks
+        """
+        if not self.tasks:
+            return None
+        return min(task.next_time for task in self.tasks)
+
+    def run_due(self, now):
+        """
+        Run every task that is due at or before now, in the order they are added.
+        """
+        for task in self.tasks:
+            if task.next_time <= now + 1e-9:
+                task.next_time += task.period
+                task()
+
+    def report(self):
+        """
+        :returns: one line per task with its rate and offset
+        """
+        return '\n'.join('%-12s %6.1f Hz  +%4.1f ms' % (task.name, 1.0 / task.period, task.offset * 1000)
+                         for task in self.tasks)
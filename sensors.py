@@ -0,0 +1,61 @@
+import wpilib
+
+
+class SensorSnapshot:
+    """
+    The sensor values for one robot loop.
+
+    sample() reads the gyro, every CANCoder and every drive encoder exactly
+    once and stores the values with the time they were taken. The gyro is
+    read right after the timestamp, so timestamp is also when its angle and
+    rate were sampled. Everything
+    else in the loop reads from the snapshot instead of the devices, so each
+    computation in a cycle uses the same view of the robot and the CAN/SPI
+    bus is only hit once.
+    """
+
+    __slots__ = ('gyro', 'encoders', 'drive_encoders', 'timestamp', 'gyro_angle', 'gyro_rate', 'encoder_positions', 'drive_velocities')
+
+    def __init__(self, gyro, encoders, drive_encoders=()):
+        """
+        :param gyro: the AHRS to sample, or None if there is no gyro
+        :param encoders: the CANCoders to sample, in the order consumers index them
+        :param drive_encoders: the drive motors' SparkMax encoders, in the same order
+        """
+        self.gyro = gyro
+        self.encoders = tuple(encoders)
+        self.drive_encoders = tuple(drive_encoders)
+
+        self.timestamp = 0.0
+        self.gyro_angle = 0.0
+        self.gyro_rate = 0.0  # degrees per second, clockwise
+        self.encoder_positions = [0.0] * len(self.encoders)
+        self.drive_velocities = [0.0] * len(self.drive_encoders)  # motor RPM
+
+    def sample(self):
+        """
+        Read every sensor once. Call this at the top of the robot loop.
+        """
+        self.timestamp = wpilib.Timer.getFPGATimestamp()
+
+        if self.gyro is not None:
+            self.gyro_angle = self.gyro.getAngle()
+            self.gyro_rate = self.gyro.getRate()
+
+        self.sample_encoders()
+
+        velocities = self.drive_velocities
+        index = 0
+        for encoder in self.drive_encoders:
+            velocities[index] = encoder.getVelocity()
+            index += 1
+
+    def sample_encoders(self):
+        """
+        Read only the CANCoders, for a steering loop that runs between main loops.
+        """
+        positions = self.encoder_positions
+        index = 0
+        for encoder in self.encoders:
+            positions[index] = encoder.getAbsolutePosition()
+            index += 1
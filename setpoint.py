@@ -0,0 +1,161 @@
+"""
+Swerve setpoint generator: keeps the chassis setpoint within what the
+steering motors can follow.
+
+Without it, every loop hands the modules the angles for the requested
+chassis motion, however far they are from where the wheels point. A module
+asked to turn 90 degrees keeps driving at full speed while it turns, and
+the wheels fight each other until they line up.
+
+SetpointGenerator moves the chassis setpoint from the last one toward the
+requested one only as far as every module can turn in one loop at
+max_steer_rate. The interpolation is done on the chassis motion (fwd,
+strafe, rcw), not per module, so the modules always agree on one rigid-body
+motion. A module that can reverse its drive motor instead of turning past
+90 degrees does so, so reversing direction is never slowed down. A module
+that isn't moving can turn freely; SwerveModule's cosine scaling keeps it from
+driving until it points the right way.
+"""
+import math
+
+# Seconds assumed for the first loop, and the longest loop the steering limit is stretched over
+PERIOD = 0.02
+MAX_DT = 0.1
+
+# Module speeds below this (of full speed) have no direction: the wheel keeps its angle
+STOPPED = 1e-3
+
+# Bisection steps when a module can't reach the requested setpoint in one loop
+ITERATIONS = 8
+
+
+class SetpointGenerator:
+    """
+    Call generate() every loop instead of SwerveKinematics.inverse().
+    """
+
+    def __init__(self, max_steer_rate, count):
+        """
+        :param max_steer_rate: how fast a module can turn, degrees per second
+        :param count: the number of modules
+        """
+        self.max_steer_rate = max_steer_rate
+
+        # The last chassis setpoint, [fwd, strafe, rcw], and the module angles it produced
+        self.chassis = [0.0, 0.0, 0.0]
+        self.angles = [0.0] * count
+        self.timestamp = None
+
+        # How much of the requested change the last loop got, 0 to 1
+        self.fraction = 1.0
+
+    def reset(self, angles):
+        """
+        Start from rest, e.g. when the robot is enabled.
+        :param angles: every module's current angle in degrees
+        """
+        chassis = self.chassis
+        chassis[0] = chassis[1] = chassis[2] = 0.0
+        self.angles[:] = angles
+        self.timestamp = None
+
+    def stop(self):
+        """
+        The modules were stopped without generate(); they keep their angles.
+        """
+        chassis = self.chassis
+        chassis[0] = chassis[1] = chassis[2] = 0.0
+
+    def generate(self, kinematics, fwd, strafe, rcw, timestamp, speeds, angles):
+        """
+        Calculate every module's speed and angle for the next reachable chassis setpoint, in place.
+        :param kinematics: the drivetrain's SwerveKinematics
+        :param fwd: the requested forward motion, like SwerveKinematics.inverse
+        :param strafe: the requested motion to the left
+        :param rcw: the requested clockwise rotation
+        :param timestamp: this loop's sensor time in seconds
+        :param speeds: list to receive the module speeds, normalized to at most 1
+        :param angles: list to receive the module angles in degrees
+        """
+        if self.timestamp is None:
+            dt = PERIOD
+        else:
+            dt = min(max(timestamp - self.timestamp, 0.0), MAX_DT)
+        self.timestamp = timestamp
+
+        # Scale the request so no module is asked for more than full speed; every
+        # setpoint between it and the last one is then within reach too
+        kinematics.inverse(fwd, strafe, rcw, speeds, angles)
+        max_speed = max(speeds)
+        if max_speed > 1.0:
+            fwd /= max_speed
+            strafe /= max_speed
+            rcw /= max_speed
+
+        chassis = self.chassis
+        fwd0, strafe0, rcw0 = chassis
+        delta_fwd = fwd - fwd0
+        delta_strafe = strafe - strafe0
+        delta_rcw = rcw - rcw0
+
+        # A wheel may point up to step degrees away from its last direction, or the opposite way
+        step = math.radians(self.max_steer_rate * dt)
+        fraction = 1.0
+        if step < math.pi / 2:
+            # |sin| of the angle between two directions, compared without atan2
+            sin_squared = math.sin(step) ** 2
+            stopped_squared = STOPPED * STOPPED
+
+            for index, left_rcw, forward_rcw in kinematics.inverse_rows:
+                left0 = strafe0 + rcw0 * left_rcw
+                forward0 = fwd0 + rcw0 * forward_rcw
+                speed0_squared = left0 * left0 + forward0 * forward0
+                if speed0_squared < stopped_squared:
+                    continue
+                delta_left = delta_strafe + delta_rcw * left_rcw
+                delta_forward = delta_fwd + delta_rcw * forward_rcw
+
+                if not _turns_too_far(left0, forward0, speed0_squared, delta_left, delta_forward, 1.0,
+                                      sin_squared, stopped_squared):
+                    continue
+
+                # Find how much of the change this module can follow
+                low = 0.0
+                high = fraction
+                for iteration in range(ITERATIONS):
+                    middle = (low + high) * 0.5
+                    if _turns_too_far(left0, forward0, speed0_squared, delta_left, delta_forward, middle,
+                                      sin_squared, stopped_squared):
+                        high = middle
+                    else:
+                        low = middle
+                fraction = min(fraction, low)
+
+        self.fraction = fraction
+        fwd = chassis[0] = fwd0 + delta_fwd * fraction
+        strafe = chassis[1] = strafe0 + delta_strafe * fraction
+        rcw = chassis[2] = rcw0 + delta_rcw * fraction
+
+        kinematics.inverse(fwd, strafe, rcw, speeds, angles)
+
+        # A stopped wheel has no direction; leave it where it is
+        last_angles = self.angles
+        for index in range(len(speeds)):
+            if speeds[index] < STOPPED:
+                speeds[index] = 0.0
+                angles[index] = last_angles[index]
+            else:
+                last_angles[index] = angles[index]
+
+
+def _turns_too_far(left0, forward0, speed0_squared, delta_left, delta_forward, fraction, sin_squared, stopped_squared):
+    """
+    :returns: True if moving a module's velocity by fraction of the change turns its wheel more than the step allows
+    """
+    left = left0 + delta_left * fraction
+    forward = forward0 + delta_forward * fraction
+    speed_squared = left * left + forward * forward
+    if speed_squared < stopped_squared:
+        return False
+    cross = left0 * forward - forward0 * left
+    return cross * cross > sin_squared * speed0_squared * speed_squared
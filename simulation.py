@@ -0,0 +1,697 @@
+"""
+Headless, faster-than-real-time simulation of the robot.
+
+The robot code runs unchanged against simulated devices: SparkMaxes,
+CANCoders, the navX and the hook limit switches are replaced through the
+MyRobot device factories, and a simple physics model moves them every
+cycle. WPILib's clock is paused and only advances when the simulation
+steps, so thousands of 20 ms cycles run in seconds with no hardware.
+
+    $ python simulation.py
+"""
+import math
+import time
+
+import ctre
+import rev
+import wpilib
+import wpilib.simulation
+
+from util import clamp
+from robot import MyRobot
+
+PERIOD = 0.02
+
+# Steering: NEO free speed through the steering reduction, in degrees per second
+STEER_GEAR_RATIO = 12.8
+STEER_FREE_SPEED = 5676 / 60 * 360 / STEER_GEAR_RATIO
+STEER_TIME_CONSTANT = 0.04  # seconds, rotate motor plus module inertia
+
+# Driving: NEO free speed through the drive reduction, in meters per second
+DRIVE_GEAR_RATIO = 6.75
+WHEEL_DIAMETER = 0.1016  # meters
+DRIVE_FREE_SPEED = 5676 / 60 / DRIVE_GEAR_RATIO * math.pi * WHEEL_DIAMETER
+DRIVE_TIME_CONSTANT = 0.15  # seconds, drive motor plus robot mass
+
+# Distance of each module from the center of the robot (30" square chassis), in meters
+HALF_WIDTH = 0.381
+HALF_LENGTH = 0.381
+
+# Module positions as (left, forward), keyed like SwerveDrive.modules
+MODULE_POSITIONS = {
+    'front_left': (HALF_WIDTH, HALF_LENGTH),
+    'front_right': (-HALF_WIDTH, HALF_LENGTH),
+    'rear_left': (HALF_WIDTH, -HALF_LENGTH),
+    'rear_right': (-HALF_WIDTH, -HALF_LENGTH),
+}
+
+# The SparkMax runs its closed loops at 1 kHz
+SPARKMAX_LOOP_PERIOD = 0.001
+
+# Battery voltage, for feedforward given in volts
+NOMINAL_VOLTAGE = 12.0
+
+# Seconds for a hook to travel from one end to the other at its normal speed
+HOOK_TRAVEL_TIME = 0.5
+
+
+class SimClock:
+    """
+    Simulated time. Pauses the WPILib clock so wpilib.Timer and the FPGA
+    timestamp only move when step() is called.
+    """
+
+    def __init__(self):
+        wpilib.simulation.pauseTiming()
+        self.now = wpilib.Timer.getFPGATimestamp()
+
+    def step(self, dt):
+        wpilib.simulation.stepTiming(dt)
+        self.now += dt
+
+
+class SimRelativeEncoder:
+    """
+    Stands in for the SparkMax integrated encoder.
+    Position is in motor rotations and velocity in RPM, times the conversion factors.
+    """
+
+    def __init__(self):
+        self.rotations = 0.0
+        self.rpm = 0.0
+        self.positionConversionFactor = 1.0
+        self.velocityConversionFactor = 1.0
+
+    def getPosition(self):
+        return self.rotations * self.positionConversionFactor
+
+    def getVelocity(self):
+        return self.rpm * self.velocityConversionFactor
+
+    def setPosition(self, position):
+        self.rotations = position / self.positionConversionFactor
+
+    def setPositionConversionFactor(self, factor):
+        self.positionConversionFactor = factor
+
+    def setVelocityConversionFactor(self, factor):
+        self.velocityConversionFactor = factor
+
+
+class SimSparkMaxPIDController:
+    """
+    Stands in for the SparkMax's onboard PID controller, for position and velocity
+    control. The physics calls update() at the SparkMax's 1 kHz loop rate.
+    """
+
+    def __init__(self, motor):
+        self.motor = motor
+        self.p = self.i = self.d = self.ff = 0.0
+        self.min_output = -1.0
+        self.max_output = 1.0
+        self.reference = None
+        self.controlType = None
+        self.feedforward = 0.0
+        self._integral = 0.0
+        self._last_error = None
+
+    def setP(self, gain):
+        self.p = gain
+
+    def setI(self, gain):
+        self.i = gain
+
+    def setD(self, gain):
+        self.d = gain
+
+    def setFF(self, gain):
+        self.ff = gain
+
+    def getP(self):
+        return self.p
+
+    def getI(self):
+        return self.i
+
+    def getD(self):
+        return self.d
+
+    def setOutputRange(self, minimum, maximum):
+        self.min_output = minimum
+        self.max_output = maximum
+
+    def setReference(self, value, controlType, pidSlot=0, arbFeedforward=0.0, arbFFUnits=None):
+        self.reference = value
+        self.controlType = controlType
+        self.feedforward = arbFeedforward
+
+    def update(self, dt):
+        """
+        Run the loop once and set the motor's output.
+        """
+        if self.controlType == rev.CANSparkMax.ControlType.kVelocity:
+            measurement = self.motor.encoder.getVelocity()
+        else:
+            measurement = self.motor.encoder.getPosition()
+
+        error = self.reference - measurement
+        self._integral += error * dt
+        derivative = 0.0 if self._last_error is None else (error - self._last_error) / dt
+        self._last_error = error
+
+        output = self.ff * self.reference + self.p * error + self.i * self._integral + self.d * derivative
+        output = max(self.min_output, min(self.max_output, output))
+        self.motor.output = clamp(output + self.feedforward / NOMINAL_VOLTAGE)
+
+
+class SimSparkMax:
+    """
+    Stands in for rev.CANSparkMax. Keeps the last duty cycle it was set to,
+    or follows its PID controller after setReference.
+    """
+
+    def __init__(self, canId, motorType):
+        self.canId = canId
+        self.motorType = motorType
+        self.output = 0.0
+        self.inverted = False
+        self.encoder = SimRelativeEncoder()
+        self.pidController = SimSparkMaxPIDController(self)
+        self.statusFramePeriods = {}
+
+    @property
+    def closed_loop(self):
+        return self.pidController.reference is not None
+
+    def set(self, speed):
+        self.pidController.reference = None
+        self.output = clamp(speed)
+
+    def setVoltage(self, volts):
+        self.set(volts / NOMINAL_VOLTAGE)
+
+    def get(self):
+        return self.output
+
+    def getAppliedOutput(self):
+        return self.output
+
+    def getPIDController(self):
+        return self.pidController
+
+    def stopMotor(self):
+        self.output = 0.0
+
+    def setInverted(self, inverted):
+        self.inverted = inverted
+
+    def getInverted(self):
+        return self.inverted
+
+    def getEncoder(self):
+        return self.encoder
+
+    def setClosedLoopRampRate(self, rate):
+        pass
+
+    def setPeriodicFramePeriod(self, frame, periodMs):
+        self.statusFramePeriods[frame] = periodMs
+        return rev.REVLibError.kOk
+
+
+class SimCANCoder:
+    """
+    Stands in for ctre.CANCoder. The physics sets the absolute position.
+    """
+
+    def __init__(self, canId):
+        self.canId = canId
+        self.position = 0.0
+        self.velocity = 0.0
+        self.statusFramePeriods = {}
+
+    def getAbsolutePosition(self):
+        return self.position
+
+    def getVelocity(self):
+        return self.velocity
+
+    def setStatusFramePeriod(self, frame, periodMs, timeoutMs=0):
+        self.statusFramePeriods[frame] = periodMs
+        return ctre.ErrorCode.OK
+
+    def getStatusFramePeriod(self, frame, timeoutMs=0):
+        return self.statusFramePeriods.get(frame, 0)
+
+
+class SimAHRS:
+    """
+    Stands in for the navX. Angles are in degrees, clockwise positive.
+    """
+
+    def __init__(self):
+        self.heading = 0.0  # what the robot has actually turned, never reset
+        self.zero = 0.0
+        self.rate = 0.0
+
+    def getAngle(self):
+        return self.heading - self.zero
+
+    def getYaw(self):
+        return (self.getAngle() + 180) % 360 - 180
+
+    def getRate(self):
+        return self.rate
+
+    def reset(self):
+        self.zero = self.heading
+
+    def isConnected(self):
+        return True
+
+
+class SimDigitalInput:
+    """
+    Stands in for wpilib.DigitalInput.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.value = False
+
+    def get(self):
+        return self.value
+
+
+class SimXboxController:
+    """
+    Stands in for wpilib.XboxController. Set axes and buttons directly;
+    the ...Pressed/...Released methods report each edge once, like WPILib.
+    """
+
+    AXES = ('LeftX', 'LeftY', 'RightX', 'RightY', 'LeftTriggerAxis', 'RightTriggerAxis')
+    # In WPILib button number order, so bit n of getButtons() is button n + 1
+    BUTTONS = ('A', 'B', 'X', 'Y', 'LeftBumper', 'RightBumper', 'Back', 'Start', 'LeftStick', 'RightStick')
+    # Axes by WPILib raw axis number
+    RAW_AXES = ('LeftX', 'LeftY', 'LeftTriggerAxis', 'RightTriggerAxis', 'RightX', 'RightY')
+
+    def __init__(self, port):
+        self.port = port
+        self.axes = dict.fromkeys(self.AXES, 0.0)
+        self.buttons = dict.fromkeys(self.BUTTONS, False)
+        self._pressed = dict.fromkeys(self.BUTTONS, False)
+        self._released = dict.fromkeys(self.BUTTONS, False)
+
+    def setAxis(self, axis, value):
+        self.axes[axis] = value
+
+    def setButton(self, button, pressed):
+        if pressed and not self.buttons[button]:
+            self._pressed[button] = True
+        if not pressed and self.buttons[button]:
+            self._released[button] = True
+        self.buttons[button] = pressed
+
+    def reset(self):
+        for axis in self.AXES:
+            self.axes[axis] = 0.0
+        for button in self.BUTTONS:
+            self.setButton(button, False)
+
+    def getPort(self):
+        return self.port
+
+    def getRawAxis(self, axis):
+        return self.axes[self.RAW_AXES[axis]]
+
+    def getButtons(self):
+        buttons = 0
+        for bit, button in enumerate(self.BUTTONS):
+            if self.buttons[button]:
+                buttons |= 1 << bit
+        return buttons
+
+    def _edge(self, edges, button):
+        edge = edges[button]
+        edges[button] = False
+        return edge
+
+    def getPOV(self, pov=0):
+        return -1
+
+
+def _axis_getter(axis):
+    return lambda self: self.axes[axis]
+
+
+def _button_getters(button):
+    suffix = button if button.endswith(('Bumper', 'Stick')) else button + 'Button'
+    return {
+        'get' + suffix: lambda self: self.buttons[button],
+        'get' + suffix + 'Pressed': lambda self: self._edge(self._pressed, button),
+        'get' + suffix + 'Released': lambda self: self._edge(self._released, button),
+    }
+
+
+for _axis in SimXboxController.AXES:
+    setattr(SimXboxController, 'get' + _axis, _axis_getter(_axis))
+
+for _button in SimXboxController.BUTTONS:
+    for _name, _getter in _button_getters(_button).items():
+        setattr(SimXboxController, _name, _getter)
+
+
+class SwerveModulePhysics:
+    """
+    One swerve module: the rotate motor turns the module with a first-order
+    lag, the CANCoder follows it (plus the module's zero offset), and the
+    wheel speed follows the drive motor.
+    """
+
+    def __init__(self, module, position):
+        """
+        :param module: the SwerveModule, built with simulated devices
+        :param position: (left, forward) from the center of the robot, in meters
+        """
+        self.module = module
+        self.left, self.forward = position
+
+        self.azimuth = 0.0  # degrees, after the zero offset
+        self.steer_rate = 0.0  # degrees per second
+        self.wheel_speed = 0.0  # meters per second
+
+        self._write_sensors()
+
+    def step(self, dt):
+        module = self.module
+        rotateMotor = module.rotateMotor
+
+        if rotateMotor.closed_loop:
+            # The SparkMax updates its output at 1 kHz, much faster than the robot loop
+            steps = max(1, round(dt / SPARKMAX_LOOP_PERIOD))
+            for step in range(steps):
+                rotateMotor.pidController.update(dt / steps)
+                self._steer(dt / steps)
+        else:
+            self._steer(dt)
+
+        driveMotor = module.driveMotor
+
+        if driveMotor.closed_loop:
+            steps = max(1, round(dt / SPARKMAX_LOOP_PERIOD))
+            for step in range(steps):
+                driveMotor.pidController.update(dt / steps)
+                self._drive(dt / steps)
+        else:
+            self._drive(dt)
+
+        self._write_sensors()
+
+    def _drive(self, dt):
+        """
+        Accelerate the wheel for dt at the drive motor's current output.
+        """
+        target_speed = self.module.driveMotor.get() * DRIVE_FREE_SPEED
+        self.wheel_speed += (target_speed - self.wheel_speed) * min(1.0, dt / DRIVE_TIME_CONSTANT)
+
+        drive_encoder = self.module.driveMotor.getEncoder()
+        drive_encoder.rotations += self.wheel_speed * dt / (math.pi * WHEEL_DIAMETER) * DRIVE_GEAR_RATIO
+        drive_encoder.rpm = self.wheel_speed / (math.pi * WHEEL_DIAMETER) * DRIVE_GEAR_RATIO * 60
+
+    def _steer(self, dt):
+        """
+        Turn the module for dt at the rotate motor's current output.
+        """
+        target_rate = self.module.rotateMotor.get() * STEER_FREE_SPEED
+        self.steer_rate += (target_rate - self.steer_rate) * min(1.0, dt / STEER_TIME_CONSTANT)
+        self.azimuth = (self.azimuth + self.steer_rate * dt) % 360
+
+        # The NEO's encoder keeps counting turns, unlike the CANCoder
+        rotate_encoder = self.module.rotateMotor.getEncoder()
+        rotate_encoder.rotations += self.steer_rate * dt / 360 * STEER_GEAR_RATIO
+        rotate_encoder.rpm = self.steer_rate / 360 * STEER_GEAR_RATIO * 60
+
+    def _write_sensors(self):
+        module = self.module
+
+        module.encoder.position = (self.azimuth + module.encoder_zero) % 360
+        module.encoder.velocity = self.steer_rate
+
+        drive_encoder = module.driveMotor.getEncoder()
+        drive_encoder.rpm = self.wheel_speed / (math.pi * WHEEL_DIAMETER) * DRIVE_GEAR_RATIO * 60
+
+    def velocity(self):
+        """
+        :returns: the wheel's (left, forward) velocity in meters per second
+        """
+        azimuth = math.radians(self.azimuth)
+        return self.wheel_speed * math.sin(azimuth), self.wheel_speed * math.cos(azimuth)
+
+
+class ChassisPhysics:
+    """
+    Moves the robot from the module velocities (least-squares rigid-body fit)
+    and drives the simulated gyro.
+
+    The field pose uses WPILib conventions: x forward, y left (as the robot
+    started), heading counter-clockwise in radians.
+    """
+
+    def __init__(self, modules, gyro):
+        self.modules = modules
+        self.gyro = gyro
+
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0
+
+        self.radius_squared = sum(m.left * m.left + m.forward * m.forward for m in modules)
+
+    def step(self, dt):
+        left = forward = spin = 0.0
+        for module in self.modules:
+            v_left, v_forward = module.velocity()
+            left += v_left
+            forward += v_forward
+            # The wheel velocity from a clockwise spin at (left, forward) is spin * (-forward, left)
+            spin += module.left * v_forward - module.forward * v_left
+
+        count = len(self.modules)
+        left /= count
+        forward /= count
+        spin /= self.radius_squared  # clockwise, radians per second
+
+        self.heading -= spin * dt
+        cos_heading = math.cos(self.heading)
+        sin_heading = math.sin(self.heading)
+        self.x += (forward * cos_heading - left * sin_heading) * dt
+        self.y += (forward * sin_heading + left * cos_heading) * dt
+
+        self.gyro.heading += math.degrees(spin * dt)
+        self.gyro.rate = math.degrees(spin)
+
+    def speed(self):
+        """
+        :returns: the robot's speed over the field in meters per second
+        """
+        left = forward = 0.0
+        for module in self.modules:
+            v_left, v_forward = module.velocity()
+            left += v_left
+            forward += v_forward
+        return math.hypot(left, forward) / len(self.modules)
+
+
+class HookPhysics:
+    """
+    One hook: 0 is fully lowered and 1 fully raised. A negative motor output
+    raises it. As wired on the robot, the raised end trips the bottom switch
+    and the lowered end trips the top switch.
+    """
+
+    def __init__(self, hook):
+        self.hook = hook
+        self.position = 0.0
+        self._write_switches()
+
+    def step(self, dt):
+        output = self.hook.motor.get()
+        travel = dt / HOOK_TRAVEL_TIME / self.hook.hookSpeed
+        self.position = clamp(self.position - output * travel, 0.0, 1.0)
+        self._write_switches()
+
+    def _write_switches(self):
+        self.hook.bottom_switch.value = self.position >= 1.0
+        self.hook.top_switch.value = self.position <= 0.0
+
+
+class SimRobot(MyRobot):
+    """
+    MyRobot with every device factory returning a simulated device.
+    """
+
+    def createSparkMax(self, canId, motorType):
+        return SimSparkMax(canId, motorType)
+
+    def createCANCoder(self, canId):
+        return SimCANCoder(canId)
+
+    def createGyro(self):
+        return SimAHRS()
+
+    def createDigitalInput(self, port):
+        return SimDigitalInput(port)
+
+    def createXboxController(self, controllerId):
+        return SimXboxController(controllerId)
+
+
+class Simulation:
+    """
+    Builds a SimRobot, attaches physics to its devices and steps it with a
+    controllable clock, as fast as the CPU allows.
+
+        sim = Simulation()
+        sim.enable('teleop')
+        sim.driver.setAxis('RightY', -0.8)
+        sim.run(2.0)
+        print(sim.chassis.x)
+    """
+
+    def __init__(self, period=PERIOD, robot_class=SimRobot, record=False):
+        """
+        :param period: the loop period in seconds
+        :param robot_class: the robot to build, SimRobot or a subclass
+        :param record: write a match recording like the real robot does
+        """
+        self.period = period
+        self.clock = SimClock()
+        self.cycles = 0
+
+        self.robot = robot_class()
+        self.robot.robotInit()
+        if not record:
+            self.robot.recorderConfig = None
+
+        self.driver = self.robot.driver.xboxController if self.robot.driver else None
+        self.operator = self.robot.operator.xboxController if self.robot.operator else None
+
+        self.modules = []
+        self.chassis = None
+        if self.robot.drivetrain:
+            drivetrain = self.robot.drivetrain
+            self.modules = [SwerveModulePhysics(drivetrain.modules[key], position)
+                            for key, position in MODULE_POSITIONS.items()]
+            self.chassis = ChassisPhysics(self.modules, drivetrain.gyro)
+
+        self.hooks = []
+        if self.robot.hooks:
+            self.hooks = [HookPhysics(hook) for hook in self.robot.hooks.modules]
+
+        # Tasks scheduled with addPeriodic run between main loops, as on the robot
+        self.scheduler = self.robot.scheduler
+        if self.scheduler:
+            self.scheduler.start(self.clock.now)
+
+        self._periodic = self.robot.disabledPeriodic
+
+    def enable(self, mode='teleop'):
+        """
+        :param mode: 'teleop', 'autonomous', 'test' or 'disabled'
+        """
+        robot = self.robot
+        driverStation = wpilib.simulation.DriverStationSim
+        driverStation.setEnabled(mode != 'disabled')
+        driverStation.setAutonomous(mode == 'autonomous')
+        driverStation.setTest(mode == 'test')
+        driverStation.notifyNewData()
+
+        if mode == 'teleop':
+            robot.teleopInit()
+            self._periodic = robot.teleopPeriodic
+        elif mode == 'autonomous':
+            robot.autonomousInit()
+            self._periodic = robot.autonomousPeriodic
+        elif mode == 'test':
+            robot.testInit()
+            self._periodic = robot.testPeriodic
+        elif mode == 'disabled':
+            robot.disabledInit()
+            self._periodic = robot.disabledPeriodic
+        else:
+            raise ValueError("Unknown mode: %s" % mode)
+
+    def step(self):
+        """
+        Run one robot loop, then advance the physics and the clock by one period,
+        stopping to run every scheduled task when it is due.
+        """
+        self._periodic()
+        self.robot.robotPeriodic()
+
+        end = self.clock.now + self.period
+        if self.scheduler:
+            while True:
+                due = self.scheduler.next_due()
+                if due is None or due >= end - 1e-9:
+                    break
+                self._advance(due - self.clock.now)
+                self.scheduler.run_due(due)
+        self._advance(end - self.clock.now)
+
+        self.cycles += 1
+
+    def _advance(self, dt):
+        """
+        Advance the physics and the clock.
+        """
+        if dt <= 0:
+            return
+
+        for module in self.modules:
+            module.step(dt)
+        if self.chassis:
+            self.chassis.step(dt)
+        for hook in self.hooks:
+            hook.step(dt)
+
+        self.clock.step(dt)
+
+    def run(self, seconds, inputs=None):
+        """
+        Run for a stretch of simulated time.
+        :param seconds: how much simulated time to run
+        :param inputs: optional function called with the simulation before every loop, to move the sticks
+        """
+        for cycle in range(round(seconds / self.period)):
+            if inputs:
+                inputs(self)
+            self.step()
+
+
+if __name__ == "__main__":
+    sim = Simulation()
+    sim.enable('teleop')
+
+    start = time.perf_counter()
+
+    # Drive forward, then strafe while spinning, then stop
+    sim.driver.setAxis('RightY', -0.9)
+    sim.run(2.0)
+    sim.driver.setAxis('RightY', 0.0)
+    sim.driver.setAxis('RightX', 0.9)
+    sim.driver.setAxis('LeftX', 0.6)
+    sim.run(2.0)
+    sim.driver.reset()
+    sim.run(1.0)
+
+    # Raise the front hook
+    sim.operator.setButton('Y', True)
+    sim.run(0.1)
+    sim.operator.setButton('Y', False)
+    sim.run(1.0)
+
+    elapsed = time.perf_counter() - start
+    print("Simulated %d cycles (%.1f s) in %.2f s" % (sim.cycles, sim.cycles * sim.period, elapsed))
+    print("Pose: x=%.2f m, y=%.2f m, heading=%.1f deg" % (sim.chassis.x, sim.chassis.y, math.degrees(sim.chassis.heading)))
+    print("Front hook state: %d" % sim.robot.hooks.get_front())
@@ -0,0 +1,108 @@
+"""
+Robot code startup: which subsystems to build, how long it took.
+
+SUBSYSTEMS maps each config key to the robot attribute it fills, the
+MyRobot method that builds it and the modules it needs. robotInit walks
+the active robotconfig and only imports the modules of the keys that are
+present, so a robot without a feeder never loads feeder.py, and one
+without a drivetrain never loads the vendor libraries for it.
+
+open_devices() brings several devices up at once. Every vendor constructor
+blocks on its own CAN handshake (the navX on its SPI setup), so doing
+them in parallel makes startup as slow as the slowest device instead of the
+sum of them all. That is what matters when the code restarts after a
+brownout in the middle of a match.
+
+The time spent importing and building each subsystem is collected in
+startup_timer and logged at the end of robotInit. For the import of every
+single module, run with python -X importtime.
+"""
+import importlib
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads bringing devices up; a swerve drivetrain has 13 devices
+DEVICE_WORKERS = 8
+
+# attribute: what the robot stores the result of init as
+# init: the MyRobot method that builds it from its config; None to store the config itself
+# modules: imported before init runs, so their cost shows up separately
+Subsystem = namedtuple('Subsystem', ['attribute', 'init', 'modules'])
+
+# By config key, in no particular order: robotInit follows the order of the active robotconfig
+SUBSYSTEMS = {
+    'CONTROLLERS': Subsystem('controllers', 'initControllers', ('controller',)),
+    'DRIVETRAIN': Subsystem('drivetrain', 'initDrivetrain', ('rev', 'ctre', 'navx', 'swervedrive', 'swervemodule', 'odometry')),
+    'FEEDER': Subsystem('feeder', 'initFeeder', ('rev', 'feeder')),
+    'AUTON': Subsystem('auton', 'initAuton', ('auton', 'trajectory')),
+    'HOOKS': Subsystem('hooks', 'initHooks', ('rev', 'hooks')),
+    'RECORDER': Subsystem('recorderConfig', None, ('recorder',)),
+}
+
+
+class StartupTimer:
+    """
+    Wall time of each startup stage, in the order they ran.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def record(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def stage(self, name):
+        """
+        Time a block:
+
+            with startup_timer.stage('init DRIVETRAIN'):
+                ...
+        """
+        return _Stage(self, name)
+
+    def total(self):
+        return sum(seconds for name, seconds in self.stages)
+
+    def report(self):
+        """
+        :returns: one line per stage in milliseconds, and the total
+        """
+        lines = ['%-24s %8.1f' % (name, seconds * 1000) for name, seconds in self.stages]
+        lines.append('%-24s %8.1f' % ('total', self.total() * 1000))
+        return '\n'.join(lines)
+
+
+class _Stage:
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+
+
+def import_modules(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+
+def open_devices(*requests):
+    """
+    Create several devices in parallel.
+    :param requests: (factory, args...) tuples, e.g. (robot.createMotor, canId, motorType, role)
+    :returns: the devices, in the order requested
+    """
+    if len(requests) < 2:
+        return [factory(*args) for factory, *args in requests]
+
+    with ThreadPoolExecutor(min(DEVICE_WORKERS, len(requests))) as pool:
+        futures = [pool.submit(factory, *args) for factory, *args in requests]
+        return [future.result() for future in futures]
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,190 @@
+"""
+Motion-profiled steering for a swerve module.
+
+The plain steering loop is a PID on the angle error: a 90 degree setpoint
+jump saturates the rotate motor, the module arrives at full speed and
+overshoots. ProfiledSteering instead moves a setpoint from where the module
+is to the target along a trapezoidal profile (accelerate at
+max_acceleration, cruise at max_velocity, decelerate to a stop on the
+target) and drives the motor with a feedforward from the profile's velocity
+and acceleration. The PID only corrects what the feedforward misses, so the
+gains can stay gentle without the module being slow.
+
+Angles are continuous: the profile works on an unwrapped setpoint, and
+the target is taken as the nearest equivalent angle, so crossing 0/360 is
+no different from any other move. A new target in the middle of a move
+starts from the current setpoint and velocity, so the motion stays smooth.
+
+While the robot spins, every module's target moves a little every loop. A
+profile that stops on each new target would always trail behind it, so when
+the last two targets moved the same way at a similar speed the target's
+speed is estimated and the profile arrives moving with the target instead.
+"""
+import math
+
+import wpilib
+
+from util import clamp
+
+# Volts for a duty cycle of 1; the feedforward gains are in volts
+NOMINAL_VOLTAGE = 12.0
+
+# When the module is this far from the setpoint (degrees), e.g. after it was
+# disabled or pushed, the profile starts over from where the module is
+RESYNC_ERROR = 45.0
+
+# A gap between updates longer than this (seconds) also starts over
+MAX_DT = 0.1
+
+
+class ProfiledSteering:
+    """
+    Call calculate() every steering loop.
+    """
+
+    def __init__(self, max_velocity, max_acceleration, kP, kD, kS, kV, kA):
+        """
+        :param max_velocity: degrees per second
+        :param max_acceleration: degrees per second squared
+        :param kP: duty cycle per degree of error from the profile's setpoint
+        :param kD: duty cycle per degree per second of the error's rate of change
+        :param kS: volts to overcome static friction
+        :param kV: volts per degree per second
+        :param kA: volts per degree per second squared
+        """
+        self.max_velocity = max_velocity
+        self.max_acceleration = max_acceleration
+        self.kP = kP
+        self.kD = kD
+        self.kS = kS
+        self.kV = kV
+        self.kA = kA
+
+        # The profile's setpoint: unwrapped degrees and degrees per second
+        self.position = 0.0
+        self.velocity = 0.0
+        self.acceleration = 0.0
+        self.goal = 0.0
+        self.goal_velocity = 0.0
+
+        # The last target: when it came, how fast it moved from the one before, and how long after it
+        self._target = None
+        self._target_time = None
+        self._target_rate = 0.0
+        self._target_interval = None
+
+        self.error = 0.0
+        self.timestamp = None
+
+    def reset(self, angle):
+        """
+        Start over from rest at angle.
+        """
+        self.position = angle
+        self.velocity = 0.0
+        self.acceleration = 0.0
+        self.goal = angle
+        self.goal_velocity = 0.0
+        self._target = None
+        self.error = 0.0
+
+    def _track(self, target, now):
+        """
+        Estimate how fast the target moves.
+        """
+        if self._target is not None and target == self._target:
+            # No new target; after a loop without one the target has stopped
+            if self._target_interval and now - self._target_time > 1.5 * self._target_interval:
+                self.goal_velocity = 0.0
+                self._target_rate = 0.0
+            return
+
+        rate = 0.0
+        interval = None
+        if self._target is not None and 0.0 < now - self._target_time <= MAX_DT:
+            interval = now - self._target_time
+            rate = math.remainder(target - self._target, 360) / interval
+
+        # Only a target moving steadily is followed at its speed; a jump is a new goal to stop on
+        previous = self._target_rate
+        steady = rate * previous > 0.0 and 0.5 <= rate / previous <= 2.0 and abs(rate) <= self.max_velocity
+        self.goal_velocity = rate if steady else 0.0
+
+        self._target = target
+        self._target_time = now
+        self._target_rate = rate
+        self._target_interval = interval
+
+    def _step(self, goal, goal_velocity, dt):
+        """
+        Move the setpoint dt seconds along the profile toward a goal moving at goal_velocity.
+        """
+        position = self.position
+        velocity = self.velocity
+        max_acceleration = self.max_acceleration
+
+        # Plan as seen from the goal, where it stands still
+        distance = goal - position
+        relative = velocity - goal_velocity
+        direction = math.copysign(1.0, distance)
+        change = max_acceleration * dt
+
+        # The fastest speed to end this step at that still stops on the goal, braking at
+        # max_acceleration from the end of the step: v^2 / 2a = distance left after the step
+        left = abs(distance) - relative * direction * dt * 0.5
+        cruise = (math.sqrt(change * change + 8.0 * max_acceleration * max(left, 0.0)) - change) * 0.5
+        cruise = direction * min(self.max_velocity, cruise)
+
+        max_velocity = self.max_velocity
+        target_velocity = clamp(goal_velocity + clamp(cruise, relative - change, relative + change),
+                                -max_velocity, max_velocity)
+
+        position += (velocity + target_velocity) * 0.5 * dt
+        goal += goal_velocity * dt
+        if (goal - position) * distance <= 0.0 and abs(target_velocity - goal_velocity) <= change:
+            # Reached or passed the goal slowly enough to stay on it
+            position = goal
+            target_velocity = goal_velocity
+
+        # Stopping on the goal can take more than max_acceleration for one step; the feedforward doesn't follow that
+        self.acceleration = clamp((target_velocity - velocity) / dt, -max_acceleration, max_acceleration)
+        self.position = position
+        self.velocity = target_velocity
+
+    def calculate(self, angle, target):
+        """
+        :param angle: where the module points, degrees
+        :param target: where it should point, degrees
+        :returns: the rotate motor's duty cycle
+        """
+        now = wpilib.Timer.getFPGATimestamp()
+        dt = None if self.timestamp is None else now - self.timestamp
+        if dt is None or not 0.0 <= dt <= MAX_DT:
+            self.reset(angle)
+            dt = None
+        self.timestamp = now
+
+        # Keep the setpoint in the same turn as the module, then take the nearest equivalent target
+        self.position = angle + math.remainder(self.position - angle, 360)
+        if abs(self.position - angle) > RESYNC_ERROR:
+            self.reset(angle)
+        self._track(target, now)
+        goal = self.position + math.remainder(target - self.position, 360)
+        if self.goal_velocity:
+            # Where the target has got to since it was given
+            goal += self.goal_velocity * (now - self._target_time)
+        self.goal = goal
+
+        if dt:
+            self._step(goal, self.goal_velocity, dt)
+
+        error = self.position - angle
+        derivative = (error - self.error) / dt if dt else 0.0
+        self.error = error
+
+        velocity = self.velocity
+        volts = self.kV * velocity + self.kA * self.acceleration
+        if velocity:
+            volts += math.copysign(self.kS, velocity)
+
+        return clamp(volts / NOMINAL_VOLTAGE + self.kP * error + self.kD * derivative)
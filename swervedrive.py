@@ -1,22 +1,42 @@
 import math
-from util import clamp
 
 #from magicbot import magiccomponent
 import swervemodule
+from sensors import SensorSnapshot
+from kinematics import SwerveKinematics, rectangle, FEET_TO_METERS
+from setpoint import SetpointGenerator
 
 from networktables import NetworkTables
-from networktables.util import ntproperty
+from tunables import tunables
+from telemetry import telemetry, MEDIUM
+from profiler import profiler
+
+# Order of the modules in the preallocated speed/angle arrays
+MODULE_KEYS = ('front_left', 'front_right', 'rear_left', 'rear_right')
+
+# Index of each component in the requested vector array
+FWD = 0
+STRAFE = 1
+RCW = 2
+
+# Gyro samples further apart than this (seconds) don't give an angular acceleration
+MAX_GYRO_DT = 0.1
 
 class SwerveDrive:
 
-    # Get some config options from the dashboard.
-    lower_input_thresh = ntproperty('/SmartDashboard/drive/drive/lower_input_thresh', 0.1)
-    rotation_multiplier = ntproperty('/SmartDashboard/drive/drive/rotation_multiplier', 0.5)
-    xy_multiplier = ntproperty('/SmartDashboard/drive/drive/xy_multiplier', 0.65)
-    debugging = ntproperty('/SmartDashboard/drive/drive/debugging', True) # Turn to true to run it in verbose mode.
+    def __init__(self, _frontLeftModule, _frontRightModule, _rearLeftModule, _rearRightModule, _gyro, module_positions=None):
+        """
+        :param module_positions: (left, forward) of each module in meters, in MODULE_KEYS order.
+                                 Defaults to a rectangle of self.width by self.length.
+        """
+
+        # Get some config options from the dashboard. They are kept in plain attributes
+        # and only updated when they change on the dashboard.
+        tunables.bind(self, 'lower_input_thresh', '/SmartDashboard/drive/drive/lower_input_thresh', 0.1)
+        tunables.bind(self, 'rotation_multiplier', '/SmartDashboard/drive/drive/rotation_multiplier', 0.5)
+        tunables.bind(self, 'xy_multiplier', '/SmartDashboard/drive/drive/xy_multiplier', 0.65)
+        tunables.bind(self, 'debugging', '/SmartDashboard/drive/drive/debugging', True) # Turn to true to run it in verbose mode.
 
-    def __init__(self, _frontLeftModule, _frontRightModule, _rearLeftModule, _rearRightModule, _gyro):
-        
         self.frontLeftModule = _frontLeftModule
         self.frontRightModule = _frontRightModule
         self.rearLeftModule = _rearLeftModule
@@ -36,26 +56,23 @@ class SwerveDrive:
         # Get Smart Dashboard
         self.sd = NetworkTables.getTable('SmartDashboard')
 
-        # Set all inputs to zero
-        self._requested_vectors = {
-            'fwd': 0,
-            'strafe': 0,
-            'rcw': 0
-        }
+        # Modules paired with their index in the arrays below, in MODULE_KEYS order.
+        # Built once so the loop never allocates while walking the modules.
+        self._indexed_modules = tuple(enumerate(self.modules[key] for key in MODULE_KEYS))
 
-        self._requested_angles = {
-            'front_left': 0,
-            'front_right': 0,
-            'rear_left': 0,
-            'rear_right': 0
-        }
+        # Sample the gyro and every module's encoders once per loop into one snapshot
+        self.sensors = SensorSnapshot(self.gyro,
+                                      [module.encoder for index, module in self._indexed_modules],
+                                      [module.driveEncoder for index, module in self._indexed_modules])
+        for index, module in self._indexed_modules:
+            module.attach_sensors(self.sensors, index)
+        self.sensors.sample()
 
-        self._requested_speeds = {
-            'front_left': 0,
-            'front_right': 0,
-            'rear_left': 0,
-            'rear_right': 0
-        }
+        # Set all inputs to zero. These arrays are preallocated and only ever
+        # written in place: [fwd, strafe, rcw] and one slot per module.
+        self._requested_vectors = [0.0, 0.0, 0.0]
+        self._requested_angles = [0.0] * len(self._indexed_modules)
+        self._requested_speeds = [0.0] * len(self._indexed_modules)
 
         # Variables that allow enabling and disabling of features in code
         self.squared_inputs = False
@@ -63,9 +80,36 @@ class SwerveDrive:
 
         self.width = (30 / 12) / 2 # (Inch / 12 = Foot) / 2
         self.length = (30 / 12) / 2 # (Inch / 12 = Foot) / 2
+        if module_positions:
+            self.set_module_positions(module_positions)
+        else:
+            self._update_geometry()
 
         self.request_wheel_lock = False
 
+        # When True, execute() only hands the modules their setpoints and the
+        # steering loop runs from steer(), scheduled at its own rate
+        self.steering_scheduled = False
+        # True when every module steers on its SparkMax; see enable_onboard_steering
+        self.onboard_steering = False
+
+        # Set by the robot when the drivetrain config has the wheel and gear sizes
+        self.odometry = None
+
+        # Limits how fast the setpoint turns the wheels; see enable_setpoint_generator
+        self.setpoint_generator = None
+
+        # Seconds past the gyro sample the field-oriented commands are rotated for; see enable_heading_prediction
+        self.heading_lookahead = 0.0
+        self.heading_second_order = False
+        self.gyro_acceleration = 0.0  # degrees per second squared, clockwise
+        self._last_gyro_rate = 0.0
+        self._last_gyro_timestamp = None
+
+        self._execute_phase = profiler.phase('SwerveDrive.execute')
+
+        self.setup_telemetry()
+
     @property
     def chassis_dimension(self):
         return (self.width, self.length)
@@ -74,6 +118,23 @@ class SwerveDrive:
     def chassis_dimension(self, dimension):
         self.width = dimension[0]
         self.length = dimension[1]
+        self._update_geometry()
+
+    def _update_geometry(self):
+        """
+        Rebuild the kinematics for a rectangular chassis of self.width by self.length.
+        """
+        self.set_module_positions(rectangle(self.width * FEET_TO_METERS, self.length * FEET_TO_METERS))
+
+    def set_module_positions(self, positions):
+        """
+        Rebuild the kinematics for new module positions. The kinematics matrix and
+        its pseudoinverse are computed here, once, instead of every loop.
+        :param positions: (left, forward) of each module in meters, in MODULE_KEYS order
+        """
+        if len(positions) != len(self._indexed_modules):
+            raise ValueError("Expected %d module positions, got %d" % (len(self._indexed_modules), len(positions)))
+        self.kinematics = SwerveKinematics(positions)
 
     @staticmethod
     def square_input(input):
@@ -111,40 +172,66 @@ class SwerveDrive:
         
         return data
 
+    def sample_sensors(self):
+        """
+        Read the gyro and every module's encoders once. Call this at the top of the robot loop;
+        everything else in the loop reads the values from self.sensors.
+        The odometry is updated from the new values right away.
+        """
+        self.sensors.sample()
+
+        if self.heading_second_order:
+            self._update_gyro_acceleration()
+
+        if self.odometry is not None:
+            self.odometry.update()
+
+    def _update_gyro_acceleration(self):
+        """
+        Differentiate the gyro rate between the last two samples.
+        """
+        sensors = self.sensors
+        acceleration = 0.0
+        if self._last_gyro_timestamp is not None:
+            dt = sensors.timestamp - self._last_gyro_timestamp
+            if 0.0 < dt <= MAX_GYRO_DT:
+                acceleration = (sensors.gyro_rate - self._last_gyro_rate) / dt
+        self.gyro_acceleration = acceleration
+        self._last_gyro_rate = sensors.gyro_rate
+        self._last_gyro_timestamp = sensors.timestamp
+
     def getGyroAngle(self):
-        angle = (self.gyro.getAngle() - self.gyro_zero) % 360
+        angle = (self.sensors.gyro_angle - self.gyro_zero) % 360
 
         return angle
 
+    def get_predicted_heading(self):
+        """
+        :returns: where the gyro angle will be heading_lookahead seconds after it was sampled, degrees
+        """
+        lookahead = self.heading_lookahead
+        angle = self.getGyroAngle() + self.sensors.gyro_rate * lookahead
+        if self.heading_second_order:
+            angle += 0.5 * self.gyro_acceleration * lookahead * lookahead
+        return angle
+
     def resetGyro(self):
         self.gyro.reset()
+        self.sensors.gyro_angle = 0.0
 
     def flush(self):
         """
         This method should be called to reset all requested values of the drive system.
         It will also flush each module individually.
         """
-        self._requested_vectors = {
-            'fwd': 0,
-            'strafe': 0,
-            'rcw': 0
-        }
-
-        self._requested_angles = {
-            'front_left': 0,
-            'front_right': 0,
-            'rear_left': 0,
-            'rear_right': 0
-        }
-
-        self._requested_speeds = {
-            'front_left': 0,
-            'front_right': 0,
-            'rear_left': 0,
-            'rear_right': 0
-        }
-
-        for module in self.modules.values():
+        vectors = self._requested_vectors
+        vectors[FWD] = vectors[STRAFE] = vectors[RCW] = 0.0
+
+        speeds = self._requested_speeds
+        angles = self._requested_angles
+        for index, module in self._indexed_modules:
+            speeds[index] = 0.0
+            angles[index] = 0.0
             module.flush()
 
     def set_raw_fwd(self, fwd):
@@ -152,21 +239,21 @@ class SwerveDrive:
         Sets the raw fwd value to prevent it from being passed through any filters
         :param fwd: A value from -1 to 1
         """
-        self._requested_vectors['fwd'] = fwd
+        self._requested_vectors[FWD] = fwd
 
     def set_raw_strafe(self, strafe):
         """
         Sets the raw strafe value to prevent it from being passed through any filters
         :param strafe: A value from -1 to 1
         """
-        self._requested_vectors['strafe'] = strafe
+        self._requested_vectors[STRAFE] = strafe
     
     def set_raw_rcw(self, rcw):
         """
         Sets the raw rcw value to prevent it from being passed through any filters
         :param rcw: A value from -1 to 1
         """
-        self._requested_vectors['rcw'] = rcw
+        self._requested_vectors[RCW] = rcw
 
     def set_fwd(self, fwd):
         """
@@ -178,7 +265,7 @@ class SwerveDrive:
 
         fwd *= self.xy_multiplier
 
-        self._requested_vectors['fwd'] = fwd
+        self._requested_vectors[FWD] = fwd
 
     def set_strafe(self, strafe):
         """
@@ -190,7 +277,7 @@ class SwerveDrive:
 
         strafe *= self.xy_multiplier
 
-        self._requested_vectors['strafe'] = strafe
+        self._requested_vectors[STRAFE] = strafe
 
     def set_rcw(self, rcw):
         """
@@ -202,7 +289,7 @@ class SwerveDrive:
 
         rcw *= self.rotation_multiplier
 
-        self._requested_vectors['rcw'] = rcw
+        self._requested_vectors[RCW] = rcw
 
     def move(self, fwd, strafe, rcw):
         """
@@ -216,97 +303,103 @@ class SwerveDrive:
         :param rcw: the requestest magnatude of the rotational vector of a 2D plane
         """
 
-        #Convert field-oriented translate to chassis-oriented translate
-        current_angle = self.getGyroAngle() % 360
-        desired_angle = ((math.atan2(fwd, strafe) / math.pi) * 180) % 360
-        chassis_angle = (desired_angle - current_angle) % 360
-        magnitude = clamp(math.hypot(fwd, strafe), 0, 1)
+        # Convert field-oriented translate to chassis-oriented translate by rotating
+        # the (strafe, fwd) vector by the negative gyro heading. The magnitude is
+        # clamped to 1 before rotating, so one sin/cos pair does all the work.
+        # While the robot spins, the heading is predicted for when the wheels act on the command.
+        gyro_angle = self.get_predicted_heading() if self.heading_lookahead else self.getGyroAngle()
+        heading = math.radians(gyro_angle)
+        cos_heading = math.cos(heading)
+        sin_heading = math.sin(heading)
 
-        chassis_strafe = magnitude * math.cos(math.radians(chassis_angle))
-        chassis_fwd = magnitude * math.sin(math.radians(chassis_angle))
+        magnitude = math.hypot(fwd, strafe)
+        if magnitude > 1.0:
+            fwd /= magnitude
+            strafe /= magnitude
 
-        #print("modified strafe: " + str(chassis_strafe) + ", modified fwd: " + str(chassis_fwd))
-        self.sd.putNumber("Current Gyro Angle", self.getGyroAngle())
+        chassis_strafe = strafe * cos_heading + fwd * sin_heading
+        chassis_fwd = fwd * cos_heading - strafe * sin_heading
 
-        self.set_fwd(chassis_fwd)
-        self.set_strafe(chassis_strafe)
+        #print("modified strafe: " + str(chassis_strafe) + ", modified fwd: " + str(chassis_fwd))
 
-        # self.set_fwd(fwd)
-        # self.set_strafe(strafe)
+        # Same filters as set_fwd/set_strafe/set_rcw, inlined so each multiplier is read once
+        if self.squared_inputs:
+            chassis_fwd = self.square_input(chassis_fwd)
+            chassis_strafe = self.square_input(chassis_strafe)
+            rcw = self.square_input(rcw)
 
-        self.set_rcw(rcw)
+        xy_multiplier = self.xy_multiplier
+        vectors = self._requested_vectors
+        vectors[FWD] = chassis_fwd * xy_multiplier
+        vectors[STRAFE] = chassis_strafe * xy_multiplier
+        vectors[RCW] = rcw * self.rotation_multiplier
 
     def _calculate_vectors(self):
         """
         Calculate the requested speed and angle of each modules from self._requested_vectors and store them in
-        self._requested_speeds and self._requested_angles dictionaries.
+        the self._requested_speeds and self._requested_angles arrays (indexed in MODULE_KEYS order).
         """
-        self._requested_vectors['fwd'], self._requested_vectors['strafe'], self._requested_vectors['rcw'] = self.normalize([self._requested_vectors['fwd'], self._requested_vectors['strafe'], self._requested_vectors['rcw']])
+        vectors = self._requested_vectors
+        speeds = self._requested_speeds
+        angles = self._requested_angles
+
+        fwd = vectors[FWD]
+        strafe = vectors[STRAFE]
+        rcw = vectors[RCW]
+
+        # Normalize the requested vectors
+        max_magnitude = max(abs(fwd), abs(strafe), abs(rcw))
+        if max_magnitude > 1.0:
+            fwd /= max_magnitude
+            strafe /= max_magnitude
+            rcw /= max_magnitude
 
         # Does nothing if the values are lower than the input thresh
         if self.threshold_input_vectors:
-            if abs(self._requested_vectors['fwd']) < self.lower_input_thresh:
-                self._requested_vectors['fwd'] = 0
+            lower_input_thresh = self.lower_input_thresh
 
-            if abs(self._requested_vectors['strafe']) < self.lower_input_thresh:
-                self._requested_vectors['strafe'] = 0
+            if abs(fwd) < lower_input_thresh:
+                fwd = 0
 
-            if abs(self._requested_vectors['rcw']) < self.lower_input_thresh:
-                self._requested_vectors['rcw'] = 0
+            if abs(strafe) < lower_input_thresh:
+                strafe = 0
 
-            if self._requested_vectors['rcw'] == 0 and self._requested_vectors['strafe'] == 0 and self._requested_vectors['fwd'] == 0:  # Prevents a useless loop.
-                self._requested_speeds = dict.fromkeys(self._requested_speeds, 0) # Do NOT reset the wheel angles.
+            if abs(rcw) < lower_input_thresh:
+                rcw = 0
+
+            if rcw == 0 and strafe == 0 and fwd == 0:  # Prevents a useless loop.
+                vectors[FWD] = vectors[STRAFE] = vectors[RCW] = 0
+                for index in range(len(speeds)):
+                    speeds[index] = 0 # Do NOT reset the wheel angles.
+                if self.setpoint_generator:
+                    self.setpoint_generator.stop()
 
                 if self.request_wheel_lock:
                     # This is intended to set the wheels in such a way that it
                     # difficult to push the robot (intended for defence)
-
-                    self._requested_angles['front_left'] = 45
-                    self._requested_angles['front_right'] = -45
-                    self._requested_angles['rear_left'] = -45
-                    self._requested_angles['rear_right'] = 45
+                    angles[:] = self.kinematics.lock_angles
 
                     self.request_wheel_lock = False
 
                 return
-        
-        ratio = math.hypot(self.length, self.width)
-
-        # Velocities per quadrant
-        frontX = self._requested_vectors['strafe'] - (self._requested_vectors['rcw'] * (self.length / ratio))
-        rearX = self._requested_vectors['strafe'] + (self._requested_vectors['rcw'] * (self.length / ratio))
-        leftY = self._requested_vectors['fwd'] - (self._requested_vectors['rcw'] * (self.width / ratio))
-        rightY = self._requested_vectors['fwd'] + (self._requested_vectors['rcw'] * (self.width / ratio))
-
-        # Calculate the speed and angle for each wheel given the combination of the corresponding quadrant vectors
-        frontLeft_speed = math.hypot(frontX, rightY)
-        frontLeft_angle = math.degrees(math.atan2(frontX, rightY))
-
-        frontRight_speed = math.hypot(frontX, leftY)
-        frontRight_angle = math.degrees(math.atan2(frontX, leftY))
-
-        rearLeft_speed = math.hypot(rearX, rightY)
-        rearLeft_angle = math.degrees(math.atan2(rearX, rightY))
-
-        rearRight_speed = math.hypot(rearX, leftY)
-        rearRight_angle = math.degrees(math.atan2(rearX, leftY))
 
-        self._requested_speeds['front_left'] = frontLeft_speed
-        self._requested_speeds['front_right'] = frontRight_speed
-        self._requested_speeds['rear_left'] = rearLeft_speed
-        self._requested_speeds['rear_right'] = rearRight_speed
+        # Calculate the speed and angle for each wheel
+        if self.setpoint_generator:
+            # Already normalized, and only as far from the last setpoint as the wheels can turn
+            self.setpoint_generator.generate(self.kinematics, fwd, strafe, rcw, self.sensors.timestamp, speeds, angles)
+        else:
+            self.kinematics.inverse(fwd, strafe, rcw, speeds, angles)
 
-        self._requested_angles['front_left'] = frontLeft_angle
-        self._requested_angles['front_right'] = frontRight_angle
-        self._requested_angles['rear_left'] = rearLeft_angle
-        self._requested_angles['rear_right'] = rearRight_angle
-
-        self._requested_speeds = self.normalizeDictionary(self._requested_speeds)
+            # Normalize the speeds in place
+            max_speed = max(speeds)
+            if max_speed > 1.0:
+                for index in range(len(speeds)):
+                    speeds[index] /= max_speed
 
         # Zero request vectors for saftey reasons
-        self._requested_vectors['fwd'] = 0.0
-        self._requested_vectors['strafe'] = 0.0
-        self._requested_vectors['rcw'] = 0.0
+        vectors[FWD] = 0.0
+        vectors[STRAFE] = 0.0
+        vectors[RCW] = 0.0
 
     def debug(self, debug_modules=False):
         """
@@ -325,28 +418,117 @@ class SwerveDrive:
         Sends the speeds and angles to each corresponding wheel module.
         Executes the doit in each wheel module.
         """
-        self.update_smartdash()
+        with self._execute_phase:
+            # Calculate each vector
+            self._calculate_vectors()
 
-        # Calculate each vector
-        self._calculate_vectors()
+            speeds = self._requested_speeds
+            angles = self._requested_angles
 
-        # Set the speed and angle for each module
-        for key in self.modules:
-            self.modules[key].move(self._requested_speeds[key], self._requested_angles[key])
+            # Set the speed and angle for each module, then reset the speed back to zero
+            for index, module in self._indexed_modules:
+                module.move(speeds[index], angles[index])
+                speeds[index] = 0.0
 
-        # Reset the speed back to zero
-        self._requested_speeds = dict.fromkeys(self._requested_speeds, 0)
+            # Execute each module
+            if not self.steering_scheduled:
+                for index, module in self._indexed_modules:
+                    module.execute()
 
-        # Execute each module
-        for key in self.modules:
-            self.modules[key].execute()
-        
-    def update_smartdash(self):
+    def set_steering_period(self, period):
+        """
+        Tell every module's steering PID how often it runs, in seconds.
+        """
+        for index, module in self._indexed_modules:
+            module.set_steering_period(period)
+
+    def enable_onboard_steering(self, gear_ratio, kP, kI, kD, kS=0.0):
+        """
+        Move every module's steering loop onto its SparkMax.
+        See SwerveModule.enable_onboard_steering for the parameters.
+        """
+        for index, module in self._indexed_modules:
+            module.enable_onboard_steering(gear_ratio, kP, kI, kD, kS)
+        self.onboard_steering = True
+
+    def enable_profiled_steering(self, max_velocity, max_acceleration, kP, kD, kS, kV, kA):
+        """
+        Steer every module along a trapezoidal motion profile.
+        See steering.ProfiledSteering for the parameters.
+        """
+        for index, module in self._indexed_modules:
+            module.enable_profiled_steering(max_velocity, max_acceleration, kP, kD, kS, kV, kA)
+
+    def enable_velocity_control(self, max_speed, wheel_diameter, gear_ratio, kS, kV, kA, kP=0.0):
+        """
+        Drive every module at a closed-loop wheel speed instead of a duty cycle.
+        See SwerveModule.enable_velocity_control for the parameters.
+        """
+        for index, module in self._indexed_modules:
+            module.enable_velocity_control(max_speed, wheel_diameter, gear_ratio, kS, kV, kA, kP)
+
+    def enable_setpoint_generator(self, max_steer_rate):
+        """
+        Only move the chassis setpoint as fast as the wheels can turn; see setpoint.py.
+        :param max_steer_rate: how fast a module can turn, degrees per second
+        """
+        self.setpoint_generator = SetpointGenerator(max_steer_rate, len(self._indexed_modules))
+        self.setpoint_generator.reset([module.get_current_angle() for index, module in self._indexed_modules])
+
+    def enable_heading_prediction(self, lookahead, second_order=False):
+        """
+        Rotate field-oriented commands by the heading the robot will have when the
+        wheels act on them, extrapolated from the gyro rate, instead of the heading
+        when the gyro was sampled. Without it the robot drifts sideways while it
+        translates and spins: every command is rotated for a heading the robot
+        has already turned past.
+        :param lookahead: seconds from the gyro sample until the wheels act on the command
+        :param second_order: also extrapolate the change of the gyro rate
+        """
+        self.heading_lookahead = lookahead
+        self.heading_second_order = second_order
+        self._last_gyro_timestamp = None
+
+    def enable_cosine_scaling(self):
+        """
+        Scale every module's drive speed by the cosine of its steering error.
+        """
+        for index, module in self._indexed_modules:
+            module.enable_cosine_scaling()
+
+    def seed_steering(self):
+        """
+        Re-seed every module's onboard steering encoder from its CANCoder, and
+        start the setpoint generator from rest. Called when the robot is enabled.
+        """
+        for index, module in self._indexed_modules:
+            module.seed_steering_encoder()
+
+        if self.setpoint_generator:
+            # Nothing samples the encoders while disabled
+            self.sensors.sample_encoders()
+            self.setpoint_generator.reset([module.get_current_angle() for index, module in self._indexed_modules])
+
+    def steer(self):
+        """
+        Read the steering encoders and run every module's steering loop.
+        Scheduled faster than the main loop when steering_scheduled is set.
+        """
+        self.sensors.sample_encoders()
+
+        for index, module in self._indexed_modules:
+            module.execute()
+
+    def setup_telemetry(self):
         """
-        Pushes some internal variables for debugging.
+        Register the internal variables published to the dashboard for debugging.
         """
-        if self.debugging:
-            for key in self._requested_angles:
-                self.sd.putNumber('drive/drive/%s_angle' % key, self._requested_angles[key])
-                self.sd.putNumber('drive/drive/%s_speed' % key, self._requested_speeds[key])
-                
\ No newline at end of file
+        telemetry.add_number('Current Gyro Angle', self.getGyroAngle, rate=MEDIUM, deadband=0.1)
+
+        debugging = lambda: self.debugging
+        for index, module in self._indexed_modules:
+            key = MODULE_KEYS[index]
+            telemetry.add_number('drive/drive/%s_angle' % key, lambda index=index: self._requested_angles[index],
+                                 rate=MEDIUM, deadband=0.5, enabled=debugging)
+            telemetry.add_number('drive/drive/%s_speed' % key, lambda module=module: module._requested_speed,
+                                 rate=MEDIUM, deadband=0.01, enabled=debugging)
@@ -10,12 +10,20 @@ import rev
 from networktables import NetworkTables
 from wpimath.controller import PIDController
 from collections import namedtuple
+from sensors import SensorSnapshot
+from steering import ProfiledSteering
+from tunables import tunables
+from telemetry import telemetry, MEDIUM, SLOW
+from profiler import profiler
 
 # Create the structure of the config: SmartDashboard prefix, Encoder's zero point, Drive motor inverted, Allow reverse
 ModuleConfig = namedtuple('ModuleConfig', ['sd_prefix', 'zero', 'inverted', 'allow_reverse'])
 
 MAX_VOLTAGE = 5 # Absolute encoder measures from 0V to 5V
 
+# Below this steering error (degrees) the onboard loop gets no static friction feedforward
+STEER_KS_DEADBAND = 0.5
+
 class SwerveModule:
 
     def __init__(self, _driveMotor, _rotateMotor, _encoder, _config):
@@ -25,6 +33,12 @@ class SwerveModule:
         self.cfg = _config
 
         self.encoder = _encoder
+        self.driveEncoder = self.driveMotor.getEncoder()
+
+        # Until a drivetrain attaches a shared snapshot, the module samples its own encoders
+        self.sensors = SensorSnapshot(None, [self.encoder], [self.driveEncoder])
+        self.sensor_index = 0
+        self.sensors.sample()
         # Config -- change this to reflect how our config is formatted. We will upon testing of the entire drivetrain figure out which need to be inverted.
         self.sd_prefix = self.cfg.sd_prefix or 'Module'
         self.encoder_zero = self.cfg.zero or 0 #idk the point of this, maybe useful for other encoder type
@@ -35,7 +49,7 @@ class SwerveModule:
 
         # SmartDashboard
         self.sd = NetworkTables.getTable('SmartDashboard')
-        self.debugging = self.sd.getEntry('drive/drive/debugging')
+        tunables.bind(self, 'debugging', '/SmartDashboard/drive/drive/debugging', True)
 
         # Motor
         self.driveMotor.setInverted(self.inverted)
@@ -43,23 +57,188 @@ class SwerveModule:
 
         self._requested_angle = 0 # change this to something like 'requested angle' or 'requested encoder value', whatever makes more sense
         self._requested_speed = 0 #class variable which execute() passes to the drive motor at the end of the robot loop
+        self._output = 0 # the last output execute() sent to the rotate motor
 
         # PID Controller
         # kP = 1.5, kI = 0.0, kD = 0.0
-        self._pid_controller = PIDController(0.005, 0.00001, 0.00001) #swap this stuff for CANSparkMax pid controller -- see example from last year shooter
-        self._pid_controller.enableContinuousInput(0, 360)
-        self._pid_controller.setTolerance(0.5, 0.5) # may need to tweak this with PID testing
+        # Runs once per robot loop until set_steering_period says otherwise
+        self._pid_controller = self._create_pid_controller(0.005, 0.00001, 0.00001, 0.02) #swap this stuff for CANSparkMax pid controller -- see example from last year shooter
+
+        # The gains are shared by every module and only pushed into the controller when they change.
+        # set_steering_period replaces the controller, so these look it up every time.
+        tunables.register('/SmartDashboard/kP', self._pid_controller.getP(), lambda value: self._pid_controller.setP(value))
+        tunables.register('/SmartDashboard/kI', self._pid_controller.getI(), lambda value: self._pid_controller.setI(value))
+        tunables.register('/SmartDashboard/kD', self._pid_controller.getD(), lambda value: self._pid_controller.setD(value))
+
+        # Steering on the SparkMax instead of self._pid_controller; see enable_onboard_steering
+        self.onboard_steering = False
+        self.steerEncoder = None
+        self._steer_pid = None
+        self._steer_target = 0.0
+        self.steer_kS = 0.0
+
+        # Steering along a trapezoidal profile instead of self._pid_controller; see enable_profiled_steering
+        self.profiled_steering = None
+
+        # Drive velocity control on the SparkMax; see enable_velocity_control
+        self.velocity_control = False
+        self._drive_pid = None
+        self.max_speed = 0.0
+        self.velocity_factor = 1.0
+        self.drive_kS = self.drive_kV = self.drive_kA = 0.0
+        self._velocity_setpoint = 0.0
+        self._acceleration_setpoint = 0.0
+        self._setpoint_time = None
+
+        # Scale the drive speed by the cosine of the steering error; see enable_cosine_scaling
+        self.cosine_scaling = False
+
+        self._execute_phase = profiler.phase('SwerveModule.execute/%s' % self.sd_prefix)
+
+        self.setup_telemetry()
 
-        self.sd.putNumber('kP', self._pid_controller.getP())
-        self.sd.putNumber('kI', self._pid_controller.getI())
-        self.sd.putNumber('kD', self._pid_controller.getD())
-        
+
+    @staticmethod
+    def _create_pid_controller(kP, kI, kD, period):
+        """
+        :param period: seconds between calls to calculate(); the I and D terms are scaled by it
+        """
+        pid = PIDController(kP, kI, kD, period)
+        pid.enableContinuousInput(0, 360)
+        pid.setTolerance(0.5, 0.5) # degrees, degrees per second; may need to tweak this with PID testing
+        return pid
+
+    def set_steering_period(self, period):
+        """
+        Rebuild the steering PID for a loop that runs every period seconds, e.g. when the
+        steering is scheduled faster than the robot loop. Keeps the current gains.
+        """
+        pid = self._pid_controller
+        self._pid_controller = self._create_pid_controller(pid.getP(), pid.getI(), pid.getD(), period)
+
+    def attach_sensors(self, sensors, index):
+        """
+        Read the encoder from a shared snapshot instead of the device.
+        :param sensors: the SensorSnapshot sampled once per loop
+        :param index: the slot of this module's encoders in the snapshot
+        """
+        self.sensors = sensors
+        self.sensor_index = index
+
+    def enable_onboard_steering(self, gear_ratio, kP, kI, kD, kS=0.0):
+        """
+        Run the steering loop on the rotate motor's SparkMax (1 kHz) instead of in Python.
+        The NEO's integrated encoder is scaled to module degrees and seeded from the CANCoder,
+        and execute() only sends the position setpoint.
+        :param gear_ratio: rotate motor rotations per module rotation
+        :param kP: proportional gain, duty cycle per degree
+        :param kI: integral gain
+        :param kD: derivative gain
+        :param kS: static friction feedforward in volts, applied toward the setpoint
+        """
+        self.steerEncoder = self.rotateMotor.getEncoder()
+        self.steerEncoder.setPositionConversionFactor(360 / gear_ratio)
+        self.steerEncoder.setVelocityConversionFactor(360 / gear_ratio / 60)
+
+        self._steer_pid = self.rotateMotor.getPIDController()
+        self._steer_pid.setOutputRange(-1, 1)
+        self.steer_kS = kS
+
+        # Shared by every module, like the Python PID gains
+        tunables.register('/SmartDashboard/steer/kP', kP, self._steer_pid.setP)
+        tunables.register('/SmartDashboard/steer/kI', kI, self._steer_pid.setI)
+        tunables.register('/SmartDashboard/steer/kD', kD, self._steer_pid.setD)
+
+        self.onboard_steering = True
+        self.seed_steering_encoder()
+
+    def enable_profiled_steering(self, max_velocity, max_acceleration, kP, kD, kS, kV, kA):
+        """
+        Steer along a trapezoidal motion profile with a feedforward, in the robot loop,
+        instead of the plain PID. See steering.ProfiledSteering for the parameters.
+        """
+        self.profiled_steering = ProfiledSteering(max_velocity, max_acceleration, kP, kD, kS, kV, kA)
+
+    def seed_steering_encoder(self):
+        """
+        Set the NEO's encoder to the module angle read from the CANCoder, so the
+        onboard loop and the absolute encoder agree. Called when the robot is enabled.
+        """
+        if not self.onboard_steering:
+            return
+
+        angle = (self.encoder.getAbsolutePosition() - self.encoder_zero) % 360
+        self.steerEncoder.setPosition(angle)
+        self._steer_target = angle
+
+    def enable_velocity_control(self, max_speed, wheel_diameter, gear_ratio, kS, kV, kA, kP=0.0):
+        """
+        Drive at a wheel speed instead of a duty cycle, so the speed doesn't sag with the battery.
+        A requested speed of 1 becomes max_speed; the SparkMax's velocity loop tracks it with
+        a kS/kV/kA feedforward (volts) and a proportional correction.
+        :param max_speed: wheel speed in meters per second for a requested speed of 1
+        :param wheel_diameter: meters
+        :param gear_ratio: drive motor rotations per wheel rotation
+        :param kS: volts to overcome static friction
+        :param kV: volts per meter per second
+        :param kA: volts per meter per second squared
+        :param kP: duty cycle per RPM of velocity error
+        """
+        self.max_speed = max_speed
+        # Motor RPM to wheel meters per second; the encoder stays in RPM for the sensor snapshot
+        self.velocity_factor = math.pi * wheel_diameter / gear_ratio / 60
+        self.drive_kS = kS
+        self.drive_kV = kV
+        self.drive_kA = kA
+
+        self._drive_pid = self.driveMotor.getPIDController()
+        self._drive_pid.setP(kP)
+        self._drive_pid.setI(0.0)
+        self._drive_pid.setD(0.0)
+        self._drive_pid.setFF(0.0)
+
+        self.velocity_control = True
+
+    def enable_cosine_scaling(self):
+        """
+        Drive at the requested speed times the cosine of the steering error, so a wheel
+        that still points the wrong way doesn't scrub: full speed when it is lined up,
+        nothing at 90 degrees off.
+        """
+        self.cosine_scaling = True
+
+    def _scale(self, error):
+        """
+        :param error: the steering error in degrees
+        :returns: how much of the requested speed to drive at
+        """
+        if not self.cosine_scaling:
+            return 1.0
+        return max(0.0, math.cos(math.radians(error)))
+
+    def get_absolute_position(self):
+        """
+        :returns: the encoder's absolute position from this loop's sensor snapshot
+        """
+        return self.sensors.encoder_positions[self.sensor_index]
+
+    def get_drive_velocity(self):
+        """
+        :returns: the drive motor's velocity in RPM from this loop's sensor snapshot,
+                  positive in the direction of get_current_angle()
+        """
+        velocity = self.sensors.drive_velocities[self.sensor_index]
+
+        if self.moduleFlipped:
+            velocity = -velocity
+
+        return velocity
 
     def get_current_angle(self):
         """
         :returns: the voltage position after the zero
         """
-        angle = (self.encoder.getAbsolutePosition() - self.encoder_zero) % 360
+        angle = (self.get_absolute_position() - self.encoder_zero) % 360
 
         if self.moduleFlipped:
             angle = (angle + 180) % 360
@@ -157,54 +336,130 @@ class SwerveModule:
         Called every robot iteration/loop.
         """
 
-        self._pid_controller.setP(self.sd.getNumber('kP', 0))
-        self._pid_controller.setI(self.sd.getNumber('kI', 0))
-        self._pid_controller.setD(self.sd.getNumber('kD', 0))
+        with self._execute_phase:
+            if self.onboard_steering:
+                self._execute_onboard()
+                return
+
+            if self.profiled_steering:
+                self._execute_profiled()
+                return
+
+            # Calculate the error using the current voltage and the requested voltage.
+            # DO NOT use the #self.get_voltage function here. It has to be the raw voltage.
+            current_angle = self.get_current_angle()
+            error = self._pid_controller.calculate(current_angle, self._requested_angle) #Make this an error in ticks instead of voltage
+
+            # Set the output 0 as the default value
+            output = 0
+            # If the error is not tolerable, set the output to the error.
+
+            # Else, the output will stay at zero.
+            if not self._pid_controller.atSetpoint():
+                # Use max-min to clamped the output between -1 and 1. The CANSparkMax PID controller does this automatically, so idk if this is necessary
+                output = clamp(error)
+
+            # print('ERROR = ' + str(error) + ', OUTPUT = ' + str(output))
+
+            # Keep the output for the dashboard
+            self._output = output
+            # Set the output as the rotateMotor's voltage
+            self.rotateMotor.set(output) # will replace this with a set SETPOINT rather than actually setting the speed
+            #SparkMax PID controller will take care of actually running the motors with PID values you instantiate it with
+
+            # Set the requested speed as the driveMotor's voltage
+            self._drive(self._scale(math.remainder(self._requested_angle - current_angle, 360)))
+
+    def _execute_profiled(self):
+        """
+        Steer along the motion profile, then send the speed to the drive motor.
+        """
+        # The profile follows the wheel itself, so a flip is just a new target, not a jump
+        angle = (self.get_absolute_position() - self.encoder_zero) % 360
+        target = self._requested_angle
+        if self.moduleFlipped:
+            target -= 180
+
+        output = self.profiled_steering.calculate(angle, target)
+        self._output = output
+        self.rotateMotor.set(output)
+
+        self._drive(self._scale(math.remainder(target - angle, 360)))
+
+    def _execute_onboard(self):
+        """
+        Send the steering setpoint to the SparkMax's position loop and the speed to the drive motor.
+        """
+        # The NEO's encoder counts whole turns, so there is no continuous-input wrapping
+        # on the SparkMax: pick the target closest to the last one instead.
+        # A flipped module points the other way around.
+        angle = self._requested_angle
+        if self.moduleFlipped:
+            angle -= 180
+        target = self._steer_target
+        target += math.remainder(angle - target, 360)
+        self._steer_target = target
+
+        feedforward = 0.0
+        error = 0.0
+        if self.steer_kS or self.cosine_scaling:
+            error = target - self.steerEncoder.getPosition()
+        if self.steer_kS and abs(error) > STEER_KS_DEADBAND:
+            feedforward = math.copysign(self.steer_kS, error)
+
+        self._steer_pid.setReference(target, rev.CANSparkMax.ControlType.kPosition, 0, feedforward)
+        self._output = self.rotateMotor.getAppliedOutput()
 
-        # Calculate the error using the current voltage and the requested voltage.
-        # DO NOT use the #self.get_voltage function here. It has to be the raw voltage.
-        error = self._pid_controller.calculate(self.get_current_angle(), self._requested_angle) #Make this an error in ticks instead of voltage
+        self._drive(self._scale(error))
 
-        # Set the output 0 as the default value
-        output = 0
-        # If the error is not tolerable, set the output to the error.
+    def _drive(self, scale=1.0):
+        """
+        Send the requested speed to the drive motor, as a duty cycle or a velocity setpoint.
+        :param scale: share of the requested speed to send, from the cosine scaling
+        """
+        speed = self._requested_speed * scale
 
-        # Else, the output will stay at zero.
-        if not self._pid_controller.atSetpoint():
-            # Use max-min to clamped the output between -1 and 1. The CANSparkMax PID controller does this automatically, so idk if this is necessary
-            output = clamp(error)
+        if not self.velocity_control:
+            self.driveMotor.set(speed)
+            return
 
-        # print('ERROR = ' + str(error) + ', OUTPUT = ' + str(output))
+        velocity = speed * self.max_speed
 
-        # Put the output to the dashboard
-        self.sd.putNumber('drive/%s/output' % self.sd_prefix, output)
-        # Set the output as the rotateMotor's voltage
-        self.rotateMotor.set(output) # will replace this with a set SETPOINT rather than actually setting the speed
-        #SparkMax PID controller will take care of actually running the motors with PID values you instantiate it with
+        # The setpoint only changes once per main loop, even when execute() runs faster
+        timestamp = self.sensors.timestamp
+        if timestamp != self._setpoint_time:
+            if self._setpoint_time is not None and timestamp > self._setpoint_time:
+                self._acceleration_setpoint = (velocity - self._velocity_setpoint) / (timestamp - self._setpoint_time)
+            self._velocity_setpoint = velocity
+            self._setpoint_time = timestamp
 
-        # Set the requested speed as the driveMotor's voltage
-        self.driveMotor.set(self._requested_speed)
+        feedforward = self.drive_kV * velocity + self.drive_kA * self._acceleration_setpoint
+        if velocity:
+            feedforward += math.copysign(self.drive_kS, velocity)
 
-        self.update_smartdash()
+        self._drive_pid.setReference(velocity / self.velocity_factor, rev.CANSparkMax.ControlType.kVelocity, 0, feedforward)
 
     def testMove(self, driveInput, rotateInput):
         self.driveMotor.set(clamp(driveInput))
         self.rotateMotor.set(clamp(rotateInput))
 
-    def update_smartdash(self):
+    def setup_telemetry(self):
         """
-        Output a bunch on internal variables for debugging purposes.
+        Register a bunch on internal variables published to the dashboard for debugging purposes.
         """
-        self.sd.putNumber('drive/%s/degrees' % self.sd_prefix, self.get_current_angle())
+        prefix = 'drive/%s/' % self.sd_prefix
+        debugging = lambda: self.debugging
 
-        if self.debugging.getBoolean(False):
+        telemetry.add_number(prefix + 'degrees', self.get_current_angle, rate=MEDIUM, deadband=0.5)
+        telemetry.add_number(prefix + 'output', lambda: self._output, rate=MEDIUM, deadband=0.01)
 
-            self.sd.putNumber('drive/%s/requested_speed' % self.sd_prefix, self._requested_speed)
-            self.sd.putNumber('drive/%s/encoder position' % self.sd_prefix, self.encoder.getAbsolutePosition())
-            self.sd.putNumber('drive/%s/encoder_zero' % self.sd_prefix, self.encoder_zero)
+        telemetry.add_number(prefix + 'requested_speed', lambda: self._requested_speed, rate=MEDIUM, deadband=0.01, enabled=debugging)
+        telemetry.add_number(prefix + 'encoder position', self.get_absolute_position, rate=MEDIUM, deadband=0.5, enabled=debugging)
+        telemetry.add_number(prefix + 'encoder_zero', lambda: self.encoder_zero, rate=SLOW, enabled=debugging)
 
-            self.sd.putNumber('drive/%s/PID Setpoint' % self.sd_prefix, self._pid_controller.getSetpoint())
-            self.sd.putNumber('drive/%s/PID Error' % self.sd_prefix, self._pid_controller.getPositionError())
-            self.sd.putBoolean('drive/%s/PID isAligned' % self.sd_prefix, self._pid_controller.atSetpoint())
+        # Looked up on every publish: set_steering_period replaces the controller
+        telemetry.add_number(prefix + 'PID Setpoint', lambda: self._pid_controller.getSetpoint(), rate=MEDIUM, deadband=0.5, enabled=debugging)
+        telemetry.add_number(prefix + 'PID Error', lambda: self._pid_controller.getPositionError(), rate=MEDIUM, deadband=0.5, enabled=debugging)
+        telemetry.add_boolean(prefix + 'PID isAligned', lambda: self._pid_controller.atSetpoint(), rate=MEDIUM, enabled=debugging)
 
-            self.sd.putBoolean('drive/%s/allow_reverse' % self.sd_prefix, self.allow_reverse)
\ No newline at end of file
+        telemetry.add_boolean(prefix + 'allow_reverse', lambda: self.allow_reverse, rate=SLOW, enabled=debugging)
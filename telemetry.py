@@ -0,0 +1,219 @@
+import threading
+
+from networktables import NetworkTables
+
+# Publish rates in Hz
+FAST = 50
+MEDIUM = 10
+SLOW = 1
+
+# How often publish() is called
+LOOP_RATE = 50
+
+# Most NetworkTables writes a single publish() may make
+DEFAULT_BUDGET = 16
+
+
+class Signal:
+    """
+    One value published to the dashboard: a preresolved entry, the function
+    that reads the value and the bookkeeping for rate and change detection.
+    """
+
+    __slots__ = ('key', 'write', 'getter', 'rate', 'period', 'countdown', 'deadband', 'is_boolean', 'enabled', 'last', 'pending')
+
+    def __init__(self, key, write, getter, rate, period, countdown, deadband, is_boolean, enabled):
+        self.key = key
+        self.write = write
+        self.getter = getter
+        self.rate = rate
+        self.period = period
+        self.countdown = countdown
+        self.deadband = deadband
+        self.is_boolean = is_boolean
+        self.enabled = enabled
+        self.last = None
+        self.pending = False
+
+
+class Telemetry:
+    """
+    Publishes values to the dashboard at a fixed rate per signal.
+
+    Subsystems register signals once with a getter. publish() is called every
+    loop and only reads the signals that are due at their rate, only writes the
+    ones that changed by more than their deadband, and never makes more than
+    `budget` writes in one loop. Signals left over by the budget go first on the
+    next loop, so nothing starves.
+
+    After start() is called, the NetworkTables writes move to a background
+    thread. publish() then only stores each changed value in its signal's slot
+    and marks it pending, which is the snapshot the loop hands over; the thread
+    wakes up and drains the pending slots to NetworkTables. A slot written again
+    before it was drained just carries the newer value, so the loop never
+    waits on the thread and no lock is taken.
+    """
+
+    def __init__(self, table='SmartDashboard', budget=DEFAULT_BUDGET, loop_rate=LOOP_RATE):
+        self.table_name = table
+        self.budget = budget
+        self.loop_rate = loop_rate
+
+        self._table = None
+        self._signals = []
+        self._cursor = 0
+
+        self._thread = None
+        self._wake = threading.Event()
+        self._running = False
+
+    def _add(self, key, getter, rate, deadband, is_boolean, enabled):
+        if self._table is None:
+            self._table = NetworkTables.getTable(self.table_name)
+
+        entry = self._table.getEntry(key)
+        write = entry.setBoolean if is_boolean else entry.setDouble
+
+        period = max(1, round(self.loop_rate / rate))
+        # Stagger the first publish so signals with the same rate don't all land on the same loop
+        countdown = 1 + len(self._signals) % period
+
+        signal = Signal(key, write, getter, rate, period, countdown, deadband, is_boolean, enabled)
+        self._signals.append(signal)
+        return signal
+
+    def set_loop_rate(self, loop_rate):
+        """
+        Change how often publish() is called, e.g. when it is scheduled slower than
+        the main loop. Every signal keeps its rate (as far as the new loop rate allows)
+        and the write budget scales so the same number of writes fit in a second.
+        :param loop_rate: publish() calls per second
+        """
+        self.budget = max(1, round(self.budget * self.loop_rate / loop_rate))
+        self.loop_rate = loop_rate
+
+        for index, signal in enumerate(self._signals):
+            signal.period = max(1, round(loop_rate / signal.rate))
+            signal.countdown = 1 + index % signal.period
+
+    def add_number(self, key, getter, rate=MEDIUM, deadband=0.0, enabled=None):
+        """
+        Publish a number.
+        :param key: the key in the table
+        :param getter: called with no arguments to read the value
+        :param rate: how many times per second to publish, e.g. FAST, MEDIUM or SLOW
+        :param deadband: only publish when the value moved by more than this
+        :param enabled: optional function; the signal is skipped while it returns False
+        :returns: the Signal
+        """
+        return self._add(key, getter, rate, deadband, False, enabled)
+
+    def add_boolean(self, key, getter, rate=MEDIUM, enabled=None):
+        """
+        Publish a boolean. Same as add_number, without a deadband.
+        :returns: the Signal
+        """
+        return self._add(key, getter, rate, 0.0, True, enabled)
+
+    def publish(self):
+        """
+        Publish the signals that are due. Call this once per robot loop.
+        :returns: the number of values written (or queued for the background thread)
+        """
+        signals = self._signals
+        count = len(signals)
+        if count == 0:
+            return 0
+
+        for signal in signals:
+            signal.countdown -= 1
+
+        background = self._thread is not None
+        budget = self.budget
+        written = 0
+        index = self._cursor
+        remaining = count
+
+        while remaining:
+            signal = signals[index]
+
+            if signal.countdown <= 0:
+                if written >= budget:
+                    # Out of budget: this signal stays due and goes first next loop
+                    break
+
+                signal.countdown = signal.period
+
+                if signal.enabled is None or signal.enabled():
+                    value = signal.getter()
+                    last = signal.last
+
+                    if signal.is_boolean:
+                        changed = value != last
+                    else:
+                        changed = last is None or abs(value - last) > signal.deadband
+
+                    if changed:
+                        signal.last = value
+                        if background:
+                            signal.pending = True
+                        else:
+                            signal.write(value)
+                        written += 1
+
+            index += 1
+            if index == count:
+                index = 0
+            remaining -= 1
+
+        self._cursor = index
+
+        if background and written:
+            self._wake.set()
+
+        return written
+
+    def start(self):
+        """
+        Move the NetworkTables writes to a background thread.
+        """
+        if self._thread is not None:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread after it drains what is pending.
+        Later calls to publish() write synchronously again.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+
+        self._running = False
+        self._wake.set()
+        thread.join()
+        self._thread = None
+        self._drain()
+
+    def _drain(self):
+        for signal in self._signals:
+            if signal.pending:
+                # Clear the flag before reading the value: if the loop writes a newer
+                # value in between, the signal stays pending and is sent again.
+                signal.pending = False
+                signal.write(signal.last)
+
+    def _run(self):
+        wake = self._wake
+        while self._running:
+            wake.wait()
+            wake.clear()
+            self._drain()
+
+
+# Shared by every subsystem; MyRobot calls telemetry.publish() each loop
+telemetry = Telemetry()
@@ -1,4 +1,3 @@
-from email.policy import default
 import robotconfig
 #from aimer import Aimer
 
@@ -127,6 +126,7 @@ class Tester():
         self.testTankDrive()
         self.testArcadeDrive()
         self.testArcadeDriveWithAutoRotate()
+        self.testStatusFrames()
 
     def testTankDrive(self):
         self.robot.drive_type = robotconfig.TANK
@@ -162,3 +162,11 @@ class Tester():
         print('\n******************')
         print('Arcade Drive With Auto Rotate: Passed!')
         print('******************\n')
+
+    def testStatusFrames(self):
+        if not self.robot.statusFrames:
+            return
+        result = 'Passed!' if self.robot.verifyStatusFrames() else 'FAILED! (see the log)'
+        print('\n******************')
+        print('Status Frames: ' + result)
+        print('******************\n')
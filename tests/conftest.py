@@ -0,0 +1,10 @@
+"""
+The robot's modules live at the top of the repository; put it on the path so
+the tests import them the way robot.py does.
+
+    $ python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
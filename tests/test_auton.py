@@ -0,0 +1,97 @@
+"""
+The autonomous timeline: when drive segments start and end, when hook
+toggles fire, and the schedule a routine compiles to.
+"""
+import pytest
+
+from auton import Autonomous, STOP, compile_routine
+
+ROUTINE = (
+    ('HOOK', 'RIGHT', 0.5),
+    ('DRIVE', (0.0, -0.8, 0.0), 0.25),
+    ('HOOK', 'RIGHT', 1.25),
+    ('DRIVE', (0.0, 0.5, 0.0), 0.5),
+)
+
+
+def test_schedule():
+    timeline = compile_routine('test', ROUTINE)
+
+    assert timeline.starts == [0.5, 2.0]
+    assert timeline.ends == [0.75, 2.5]
+    assert timeline.toggle_times == [0.0, 0.75]
+    assert timeline.duration == 2.5
+
+
+def test_drive_boundaries():
+    timeline = compile_routine('test', ROUTINE)
+
+    # A segment starts at its start time and is over at its end time
+    assert [timeline.drive_at(elapsed) for elapsed in (0.0, 0.499, 0.5, 0.749, 0.75, 1.999, 2.0, 2.499, 2.5, 10.0)] \
+        == [-1, -1, 0, 0, -1, -1, 1, 1, -1, -1]
+
+
+def test_drive_back_to_back():
+    timeline = compile_routine('test', (('DRIVE', (0.0, -0.8, 0.0), 0.25), ('DRIVE', (0.0, 0.5, 0.0), 0.5)))
+
+    assert [timeline.drive_at(elapsed) for elapsed in (0.0, 0.249, 0.25, 0.749, 0.75)] == [0, 0, 1, 1, -1]
+
+
+def test_drive_clock_goes_back():
+    timeline = compile_routine('test', ROUTINE)
+
+    assert timeline.drive_at(2.1) == 1
+    assert timeline.drive_at(0.6) == 0
+    assert timeline.drive_at(0.8) == -1
+
+    timeline.reset()
+    assert timeline.cursor == 0
+    assert timeline.drive_at(0.5) == 0
+
+
+def test_toggles_fire_once():
+    timeline = compile_routine('test', ROUTINE)
+
+    assert timeline.due_toggles(0.0) == ['RIGHT']
+    assert timeline.due_toggles(0.0) == []
+    assert timeline.due_toggles(0.749) == []
+    # Several loops' worth at once still fires every toggle, in order
+    assert timeline.due_toggles(3.0) == ['RIGHT']
+
+
+def test_parallel():
+    timeline = compile_routine('test', (
+        ('PARALLEL', (
+            ('HOOK', 'LEFT', 0.0),
+            ('SEQUENCE', (('WAIT', 0.5), ('DRIVE', (1.0, 0.0, 0.0), 1.0))),
+            ('WAIT', 0.25),
+        )),
+        ('HOOK', 'FRONT', 0.0),
+    ))
+
+    assert (timeline.starts, timeline.ends) == ([0.5], [1.5])
+    assert timeline.toggle_times == [0.0, 1.5]
+    assert timeline.toggles == ['LEFT', 'FRONT']
+    assert timeline.duration == 1.5
+
+
+@pytest.mark.parametrize('steps', [
+    (('PARALLEL', (('DRIVE', (1.0, 0.0, 0.0), 1.0), ('DRIVE', (0.0, 1.0, 0.0), 0.5))),),
+    (('PATH', 'SWEEP'),),
+    (('HOOK', 'UP', 0.0),),
+    (('JUMP',),),
+])
+def test_invalid(steps):
+    with pytest.raises(ValueError):
+        compile_routine('test', steps)
+
+
+def test_update():
+    auton = Autonomous({'ROUTINE': 'TEST', 'ROUTINES': {'TEST': ROUTINE}})
+    drives = []
+    auton.start(lambda x, y, rcw: drives.append((x, y, rcw)), None)
+
+    # The first update is the routine's start
+    for now in (10.0, 10.5, 10.75, 12.0, 12.5):
+        auton.update(now)
+    assert drives == [STOP, (0.0, -0.8, 0.0), STOP, (0.0, 0.5, 0.0), STOP]
@@ -0,0 +1,98 @@
+"""
+Status frame profiles: set_status_frames() and verify_status_frames(),
+against the simulation's SparkMax and CANCoder; and MotorOutput's stop.
+"""
+import ctre
+import rev
+
+from canbus import CANBus, MotorOutput, CANCODER_STATUS_FRAMES, SPARKMAX_STATUS_FRAMES
+from robotconfig import statusFrameConfig
+from simulation import Simulation, SimRobot, SimSparkMax, SimCANCoder
+
+
+class RoleRobot(SimRobot):
+    """
+    Notes the role every motor and encoder was created for.
+    """
+
+    def robotInit(self):
+        self.roles = []
+        super().robotInit()
+
+    def createMotor(self, canId, motorType, role=None):
+        motor = super().createMotor(canId, motorType, role)
+        self.roles.append((motor.device, role))
+        return motor
+
+    def createEncoder(self, canId, role=None):
+        encoder = super().createEncoder(canId, role)
+        self.roles.append((encoder, role))
+        return encoder
+
+
+def expected_periods(device, profile):
+    """
+    :returns: {vendor frame: period} the profile should have set on the device
+    """
+    if isinstance(device, SimSparkMax):
+        return {getattr(rev.CANSparkMaxLowLevel.PeriodicFrame, SPARKMAX_STATUS_FRAMES[frame][0]): period
+                for frame, period in profile.items()}
+    return {getattr(ctre.CANCoderStatusFrame, CANCODER_STATUS_FRAMES[frame][0]): period
+            for frame, period in profile.items()}
+
+
+def test_profiles_applied_per_role():
+    sim = Simulation(robot_class=RoleRobot)
+    roles = sim.robot.roles
+
+    assert {role for device, role in roles} >= {'DRIVE_MOTOR', 'STEER_MOTOR', 'STEER_ENCODER'}
+    for device, role in roles:
+        profile = statusFrameConfig.get(role, {})
+        assert device.statusFramePeriods == expected_periods(device, profile), role
+
+
+def test_verify_passes():
+    bus = CANBus()
+    bus.set_status_frames(SimSparkMax(1, None), 'SparkMax 1', statusFrameConfig['DRIVE_MOTOR'])
+    bus.set_status_frames(SimCANCoder(2), 'CANCoder 2', statusFrameConfig['STEER_ENCODER'])
+
+    assert bus.verify_status_frames() == []
+
+
+def test_verify_reports_mismatched_period():
+    bus = CANBus()
+    encoder = SimCANCoder(2)
+    bus.set_status_frames(encoder, 'CANCoder 2', {'SENSOR_DATA': 10})
+    # The device came back from a brownout with its factory settings
+    encoder.statusFramePeriods[ctre.CANCoderStatusFrame.SensorData] = 20
+
+    failures = bus.verify_status_frames()
+    assert len(failures) == 1
+    assert failures[0].startswith('CANCoder 2: SENSOR_DATA is 20 ms')
+
+
+def test_verify_reports_set_error():
+    class FailingSparkMax(SimSparkMax):
+        def setPeriodicFramePeriod(self, frame, periodMs):
+            return 'kTimeout'
+
+    bus = CANBus()
+    bus.set_status_frames(FailingSparkMax(3, None), 'SparkMax 3', {'STATUS_1': 500})
+    bus.set_status_frames(SimSparkMax(4, None), 'SparkMax 4', {'STATUS_1': 500})
+
+    assert bus.verify_status_frames() == ['SparkMax 3: STATUS_1: kTimeout']
+
+
+def test_stop_always_sent():
+    motor = SimSparkMax(1, None)
+    output = MotorOutput(motor, 'SparkMax 1')
+    output.set(0.5)
+    output.stopMotor()
+    output.stopMotor()
+    assert (output.sent, output.suppressed) == (3, 0)
+    assert motor.get() == 0.0
+
+    # The write after a stop is never taken for a repeat of the one before it
+    output.set(0.5)
+    assert (output.sent, output.suppressed) == (4, 0)
+    assert motor.get() == 0.5
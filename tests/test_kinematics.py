@@ -0,0 +1,73 @@
+"""
+SwerveKinematics: inverse then forward gives back the chassis motion, and
+a rectangular chassis matches the original per-quadrant SwerveDrive math.
+"""
+import math
+import random
+
+import pytest
+
+from kinematics import SwerveKinematics, rectangle
+
+WIDTH = 0.3
+LENGTH = 0.4
+
+
+def quadrant_vectors(fwd, strafe, rcw, width, length):
+    """
+    The speed and angle of every module, as SwerveDrive computed them before kinematics.py.
+    :returns: ([speed], [angle]) in MODULE_KEYS order
+    """
+    ratio = math.hypot(length, width)
+    frontX = strafe - rcw * (length / ratio)
+    rearX = strafe + rcw * (length / ratio)
+    leftY = fwd - rcw * (width / ratio)
+    rightY = fwd + rcw * (width / ratio)
+
+    vectors = ((frontX, rightY), (frontX, leftY), (rearX, rightY), (rearX, leftY))
+    return ([math.hypot(x, y) for x, y in vectors],
+            [math.degrees(math.atan2(x, y)) for x, y in vectors])
+
+
+def motions(count=50, seed=1076):
+    rng = random.Random(seed)
+    return [(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1)) for sample in range(count)]
+
+
+@pytest.mark.parametrize('positions', [
+    rectangle(WIDTH, LENGTH),
+    ((0.3, 0.1), (-0.2, 0.35), (0.0, -0.3)),
+])
+def test_round_trip(positions):
+    kinematics = SwerveKinematics(positions)
+    speeds = [0.0] * kinematics.count
+    angles = [0.0] * kinematics.count
+
+    for fwd, strafe, rcw in motions():
+        kinematics.inverse(fwd, strafe, rcw, speeds, angles)
+        lefts = [speed * math.sin(math.radians(angle)) for speed, angle in zip(speeds, angles)]
+        forwards = [speed * math.cos(math.radians(angle)) for speed, angle in zip(speeds, angles)]
+
+        result = kinematics.forward(lefts, forwards)
+        assert result == pytest.approx((fwd, strafe, rcw, 0.0), abs=1e-9)
+
+
+def test_inverse_matches_quadrants():
+    kinematics = SwerveKinematics(rectangle(WIDTH, LENGTH))
+    speeds = [0.0] * 4
+    angles = [0.0] * 4
+
+    for fwd, strafe, rcw in motions():
+        kinematics.inverse(fwd, strafe, rcw, speeds, angles)
+        expected_speeds, expected_angles = quadrant_vectors(fwd, strafe, rcw, WIDTH, LENGTH)
+        assert speeds == pytest.approx(expected_speeds)
+        assert angles == pytest.approx(expected_angles)
+
+
+def test_lock_angles():
+    # The original wheel lock, for the square chassis it was written for
+    assert SwerveKinematics(rectangle(WIDTH, WIDTH)).lock_angles == pytest.approx((45, -45, -45, 45))
+
+    # Otherwise every wheel lines up with the center
+    for (left, forward), angle in zip(rectangle(WIDTH, LENGTH), SwerveKinematics(rectangle(WIDTH, LENGTH)).lock_angles):
+        assert math.tan(math.radians(angle)) == pytest.approx(left / forward)
@@ -0,0 +1,130 @@
+"""
+The match recording format: writing and reading records back, a full
+file, the header checks, and a bit-for-bit replay of a simulated match.
+"""
+import struct
+
+import pytest
+
+from recorder import FIELDS, HEADER, MAGIC, RECORD, VERSION, MatchRecorder, iter_records, read_header
+from replay import Replay
+from simulation import Simulation
+
+VALUES = sum(count for name, count, code in FIELDS)
+
+
+def record_values(index):
+    """
+    :returns: a record's values, all different and all exact in their field's type
+    """
+    values = [float(index * VALUES + offset) for offset in range(VALUES)]
+    values[2] = index % 2 + 1       # mode
+    values[9] = index               # driver buttons
+    values[16] = 2 * index          # operator buttons
+    return values
+
+
+def expected_record(index):
+    values = record_values(index)
+    record = {}
+    offset = 0
+    for name, count, code in FIELDS:
+        record[name] = values[offset] if count == 1 else tuple(values[offset:offset + count])
+        offset += count
+    return record
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'test.rec')
+    recorder = MatchRecorder(path, capacity=10)
+    for index in range(4):
+        assert recorder.write(record_values(index))
+    recorder.close()
+
+    assert list(iter_records(path)) == [expected_record(index) for index in range(4)]
+
+
+def test_readable_while_recording(tmp_path):
+    # The header's count follows every write, so a crash leaves a readable file
+    path = str(tmp_path / 'test.rec')
+    recorder = MatchRecorder(path, capacity=10)
+    recorder.write(record_values(0))
+    recorder.write(record_values(1))
+    recorder.flush()
+
+    assert len(list(iter_records(path))) == 2
+    recorder.close()
+
+
+def test_full(tmp_path):
+    path = str(tmp_path / 'test.rec')
+    recorder = MatchRecorder(path, capacity=3)
+    written = [recorder.write(record_values(index)) for index in range(5)]
+    assert written == [True, True, True, False, False]
+    assert recorder.full
+    recorder.close()
+
+    # Recording stops when full: the first records are kept, nothing wraps over them
+    assert list(iter_records(path)) == [expected_record(index) for index in range(3)]
+
+
+def rewrite_header(path, **fields):
+    with open(path, 'r+b') as f:
+        magic, version, record_size, capacity, count = HEADER.unpack(f.read(HEADER.size))
+        header = dict(magic=magic, version=version, record_size=record_size, capacity=capacity, count=count)
+        header.update(fields)
+        f.seek(0)
+        f.write(HEADER.pack(header['magic'], header['version'], header['record_size'], header['capacity'], header['count']))
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'magic': b'WAPURTRJ'}, 'Not a match recording'),
+    ({'version': VERSION - 1}, 'version %d' % (VERSION - 1)),
+    ({'record_size': RECORD.size - 8}, 'version %d' % VERSION),
+])
+def test_header_checks(tmp_path, fields, message):
+    path = str(tmp_path / 'test.rec')
+    recorder = MatchRecorder(path, capacity=2)
+    recorder.write(record_values(0))
+    recorder.close()
+
+    rewrite_header(path, **fields)
+    with pytest.raises(ValueError, match=message):
+        list(iter_records(path))
+
+
+def test_header():
+    data = HEADER.pack(MAGIC, VERSION, RECORD.size, 100, 42)
+    assert read_header(data) == (RECORD.size, 100, 42)
+    with pytest.raises(struct.error):
+        read_header(data[:-1])
+
+
+def test_replay(tmp_path):
+    sim = Simulation(record=True)
+    sim.robot.recorderConfig['SIM_DIRECTORY'] = str(tmp_path)
+    sim.enable('teleop')
+    sim.driver.setAxis('RightY', -0.9)
+    sim.run(1.0)
+    sim.driver.setAxis('RightY', 0.0)
+    sim.driver.setAxis('RightX', 0.9)
+    sim.driver.setAxis('LeftX', 0.6)
+    sim.run(1.0)
+    sim.driver.reset()
+    sim.run(0.5)
+    sim.enable('disabled')
+    path = sim.robot.recorder.path
+    sim.robot.recorder.close()
+
+    replay = Replay(path)
+    result = replay.run()
+    assert result.cycles == len(replay.records) > 100
+    assert result.identical, str(result)
+
+    # A recording that does not match the code is caught at the loop it changed
+    replay = Replay(path)
+    speeds = list(replay.records[50]['requested_speed'])
+    speeds[0] += 0.01
+    replay.records[50]['requested_speed'] = tuple(speeds)
+    result = replay.run()
+    assert (result.mismatches, result.first_mismatch) == (1, 50)
@@ -0,0 +1,154 @@
+"""
+Trajectory files: sampling at and past the ends, regeneration of missing
+or stale files by load(), and the HolonomicFollower's commands.
+"""
+import math
+import os
+
+import pytest
+
+import trajectory
+from robotconfig import drivetrainConfig, trajectoryConfig
+from simulation import Simulation
+from trajectory import HEADER, PERIOD, Trajectory, load, write
+
+# x, y, heading, vx, vy, omega
+SAMPLES = [
+    (0.0, 0.0, 0.0, 0.0, 0.0, 0.0),
+    (0.01, 0.0, 0.1, 1.0, 0.0, 2.0),
+    (0.03, 0.02, 0.2, 1.0, 0.5, 0.0),
+]
+DIGEST = b'\x00' * 8
+
+
+def near(expected):
+    # The samples are stored as 32-bit floats
+    return pytest.approx(expected, rel=1e-6, abs=1e-6)
+
+
+@pytest.fixture
+def samples_file(tmp_path):
+    path = str(tmp_path / 'test.traj')
+    write(path, SAMPLES, DIGEST)
+    loaded = Trajectory(path)
+    yield loaded
+    loaded.close()
+
+
+def test_sample_ends(samples_file):
+    assert samples_file.duration == near(2 * PERIOD)
+    assert samples_file.count == 3
+
+    # Clamped to the first and last samples
+    assert samples_file.sample(-1.0) == near(SAMPLES[0])
+    assert samples_file.sample(0.0) == near(SAMPLES[0])
+    assert samples_file.sample(samples_file.duration) == near(SAMPLES[-1])
+    assert samples_file.sample(10.0) == near(SAMPLES[-1])
+
+
+def test_sample_between(samples_file):
+    assert samples_file.sample(PERIOD) == near(SAMPLES[1])
+    assert samples_file.sample(0.5 * PERIOD) == near((0.005, 0.0, 0.05, 0.5, 0.0, 1.0))
+    assert samples_file.sample(1.75 * PERIOD) == near((0.025, 0.015, 0.175, 1.0, 0.375, 0.5))
+
+
+def test_not_a_trajectory(tmp_path):
+    path = str(tmp_path / 'short.traj')
+    with open(path, 'wb') as f:
+        f.write(b'WAPURTRJ')
+    with pytest.raises(ValueError):
+        Trajectory(path)
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = dict(trajectoryConfig)
+    config['DIRECTORY'] = str(tmp_path)
+    config['PATHS'] = {'LINE': ((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))}
+    return config
+
+
+def test_load_generates_once(config):
+    first = load('LINE', config, drivetrainConfig)
+    path = first.path
+    first.close()
+    assert os.path.basename(path) == 'LINE.traj'
+    modified = os.stat(path).st_mtime_ns
+
+    second = load('LINE', config, drivetrainConfig)
+    assert second.digest == first.digest
+    assert second.sample(second.duration)[:2] == pytest.approx((1.0, 0.0), abs=1e-3)
+    second.close()
+    assert os.stat(path).st_mtime_ns == modified
+
+
+@pytest.mark.parametrize('change', [
+    lambda config: config.update(MAX_ACCELERATION=config['MAX_ACCELERATION'] / 2),
+    lambda config: config.update(PATHS={'LINE': ((0.0, 0.0, 0.0), (2.0, 0.0, 0.0))}),
+])
+def test_load_regenerates_stale(config, change):
+    first = load('LINE', config, drivetrainConfig)
+    first.close()
+
+    change(config)
+    second = load('LINE', config, drivetrainConfig)
+    assert second.digest != first.digest
+    assert second.duration > first.duration
+    second.close()
+
+
+def test_load_regenerates_other_version(config):
+    first = load('LINE', config, drivetrainConfig)
+    first.close()
+
+    with open(first.path, 'r+b') as f:
+        header = list(HEADER.unpack(f.read(HEADER.size)))
+        header[1] = trajectory.VERSION + 1
+        f.seek(0)
+        f.write(HEADER.pack(*header))
+    assert trajectory.read_header(first.path) is None
+
+    second = load('LINE', config, drivetrainConfig)
+    assert trajectory.read_header(second.path) == (second.period, second.count, first.digest)
+    second.close()
+
+
+@pytest.fixture
+def follower():
+    sim = Simulation()
+    return sim.robot.createFollower()
+
+
+def put(odometry, x, y, heading):
+    odometry.x = x
+    odometry.y = y
+    odometry.heading = heading
+
+
+def test_follower_feedforward(follower, samples_file):
+    drivetrain = follower.drivetrain
+    x, y, heading, vx, vy, omega = SAMPLES[1]
+    put(drivetrain.odometry, x, y, heading)
+
+    fwd, strafe, rcw = follower.command(samples_file, PERIOD)
+    assert fwd * follower.max_speed * drivetrain.xy_multiplier == near(vx)
+    assert strafe == near(0.0)
+    # Counterclockwise omega is negative rcw, scaled to the farthest module's speed
+    assert -rcw * follower.max_speed * drivetrain.rotation_multiplier == near(omega * drivetrain.kinematics.radius)
+
+
+def test_follower_at_the_end(follower, samples_file):
+    drivetrain = follower.drivetrain
+    x, y, heading, vx, vy, omega = SAMPLES[-1]
+
+    # Past the end, on the last pose: only the last sample's velocity
+    put(drivetrain.odometry, x, y, heading)
+    fwd, strafe, rcw = follower.command(samples_file, 1.0)
+    xy_scale = follower.max_speed * drivetrain.xy_multiplier
+    assert (fwd, strafe, rcw) == near((vx / xy_scale, vy / xy_scale, 0.0))
+
+    # Behind it, with the heading a full turn away: the position error is corrected, the heading is not
+    put(drivetrain.odometry, x - 0.1, y, heading + math.tau)
+    fwd, strafe, rcw = follower.command(samples_file, 1.0)
+    assert fwd == near((vx + 0.1 * follower.translation_gain) / xy_scale)
+    assert rcw == near(0.0)
@@ -0,0 +1,442 @@
+"""
+Precomputed holonomic trajectories for autonomous.
+
+A path is a list of (x, y, heading) waypoints in field coordinates: the
+odometry's frame, with the origin where the robot starts autonomous, x and
+y in meters and the heading counterclockwise in radians. The generator fits
+a cubic spline through the positions, lets the heading turn evenly between
+waypoints, and finds the fastest speed along it that stays within:
+
+ - the drive's top speed, shared between driving and turning: no wheel is
+   asked for more than DRIVE_MAX_SPEED * SPEED_SCALE
+ - the acceleration the feedforward says MAX_VOLTAGE can give, and MAX_ACCELERATION
+ - MAX_ACCELERATION sideways in the curves
+ - MAX_ANGULAR_VELOCITY
+
+The result is sampled every PERIOD seconds and written to a small binary
+file, one fixed-width record per sample. Generate every path in robotconfig
+before deploying:
+
+    $ python trajectory.py
+
+The robot memory-maps the files at startup. Each loop a setpoint is one
+index and an interpolation between two records, with no solving. A path
+whose file is missing or was generated from different settings is
+regenerated when the robot starts, with a warning, because that costs startup time.
+
+HolonomicFollower turns the setpoint and the odometry pose into a
+SwerveDrive.move request. It uses the trajectory's velocity as
+feedforward, plus proportional feedback on the position and heading
+error.
+"""
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+
+import logger
+
+log = logger.get_logger('trajectory')
+
+MAGIC = b'WAPURTRJ'
+VERSION = 1
+
+# Seconds between samples: one robot loop
+PERIOD = 0.02
+
+# x, y, heading, vx, vy, omega: field meters, radians, meters per second and radians per second
+SAMPLE = struct.Struct('<6f')
+
+# magic, version, sample size, period, sample count, settings digest
+HEADER = struct.Struct('<8sHHfI8s')
+
+# Spline points per waypoint-to-waypoint segment while measuring the path
+SPLINE_SAMPLES = 200
+# Spacing of the points the speed limits are worked out at, meters
+PATH_STEP = 0.01
+
+EXTENSION = '.traj'
+
+
+class Limits:
+    """
+    What the generator may ask of the drivetrain.
+    """
+
+    def __init__(self, max_speed, max_acceleration, max_angular_velocity, radius, feedforward, max_voltage):
+        """
+        :param max_speed: fastest any wheel may go, meters per second
+        :param max_acceleration: meters per second squared, along the path and sideways
+        :param max_angular_velocity: radians per second
+        :param radius: distance of the farthest module from the center, meters
+        :param feedforward: (kS, kV, kA) of the drive motors
+        :param max_voltage: the most the feedforward may ask for while accelerating
+        """
+        self.max_speed = max_speed
+        self.max_acceleration = max_acceleration
+        self.max_angular_velocity = max_angular_velocity
+        self.radius = radius
+        self.feedforward = tuple(feedforward)
+        self.max_voltage = max_voltage
+
+    @classmethod
+    def from_config(cls, trajectory_config, drivetrain_config):
+        from kinematics import SwerveKinematics
+
+        kinematics = SwerveKinematics(drivetrain_config['MODULE_POSITIONS'])
+        return cls(drivetrain_config['DRIVE_MAX_SPEED'] * trajectory_config['SPEED_SCALE'],
+                   trajectory_config['MAX_ACCELERATION'],
+                   trajectory_config['MAX_ANGULAR_VELOCITY'],
+                   kinematics.radius,
+                   drivetrain_config['DRIVE_FEEDFORWARD'],
+                   trajectory_config['MAX_VOLTAGE'])
+
+    def acceleration(self, speed):
+        """
+        :returns: the fastest the robot may speed up from speed
+        """
+        kS, kV, kA = self.feedforward
+        if kA <= 0:
+            return self.max_acceleration
+        return max(0.0, min(self.max_acceleration, (self.max_voltage - kS - kV * speed) / kA))
+
+    def digest(self, waypoints):
+        """
+        :returns: 8 bytes that change whenever the waypoints or the limits do
+        """
+        settings = (tuple(tuple(float(value) for value in waypoint) for waypoint in waypoints),
+                    self.max_speed, self.max_acceleration, self.max_angular_velocity, self.radius,
+                    self.feedforward, self.max_voltage, PERIOD, VERSION)
+        return hashlib.sha1(repr(settings).encode()).digest()[:8]
+
+
+def _spline_points(waypoints):
+    """
+    Sample a cubic Hermite spline through the waypoint positions, with Catmull-Rom tangents.
+    :returns: a list of (x, y, waypoint index, fraction of the way to the next waypoint)
+    """
+    positions = [(float(x), float(y)) for x, y, heading in waypoints]
+    last = len(positions) - 1
+
+    points = []
+    for index in range(last):
+        x0, y0 = positions[index]
+        x1, y1 = positions[index + 1]
+        before = positions[max(index - 1, 0)]
+        after = positions[min(index + 2, last)]
+        scale0 = 0.5 if index > 0 else 1.0
+        scale1 = 0.5 if index + 1 < last else 1.0
+        tx0, ty0 = (x1 - before[0]) * scale0, (y1 - before[1]) * scale0
+        tx1, ty1 = (after[0] - x0) * scale1, (after[1] - y0) * scale1
+
+        for step in range(SPLINE_SAMPLES + (index == last - 1)):
+            u = step / SPLINE_SAMPLES
+            u2 = u * u
+            u3 = u2 * u
+            h00 = 2 * u3 - 3 * u2 + 1
+            h10 = u3 - 2 * u2 + u
+            h01 = -2 * u3 + 3 * u2
+            h11 = u3 - u2
+            points.append((h00 * x0 + h10 * tx0 + h01 * x1 + h11 * tx1,
+                           h00 * y0 + h10 * ty0 + h01 * y1 + h11 * ty1,
+                           index, u))
+    return points
+
+
+def generate(waypoints, limits):
+    """
+    Time-parameterize a path.
+    :param waypoints: (x, y, heading) in field meters and radians; at least two, and the positions must move
+    :param limits: Limits
+    :returns: a list of SAMPLE tuples, one every PERIOD seconds from rest to rest
+    """
+    if len(waypoints) < 2:
+        raise ValueError("A path needs at least two waypoints")
+
+    points = _spline_points(waypoints)
+
+    # Arc length along the dense spline, and the heading at every point
+    headings = [float(heading) for x, y, heading in waypoints]
+    for index in range(1, len(headings)):
+        headings[index] = headings[index - 1] + math.remainder(headings[index] - headings[index - 1], math.tau)
+
+    distances = [0.0]
+    for (x0, y0, i0, u0), (x1, y1, i1, u1) in zip(points, points[1:]):
+        distances.append(distances[-1] + math.hypot(x1 - x0, y1 - y0))
+    length = distances[-1]
+    if length < PATH_STEP:
+        raise ValueError("A path has to move; turn in place with a DRIVE step")
+
+    # Headings turn evenly with distance between waypoints
+    waypoint_distances = [0.0] * len(waypoints)
+    for (x, y, index, u), distance in zip(points, distances):
+        if u == 0.0:
+            waypoint_distances[index] = distance
+    waypoint_distances[-1] = length
+    point_headings = []
+    for (x, y, index, u), distance in zip(points, distances):
+        span = waypoint_distances[index + 1] - waypoint_distances[index]
+        fraction = (distance - waypoint_distances[index]) / span if span > 0 else 1.0
+        point_headings.append(headings[index] + (headings[index + 1] - headings[index]) * fraction)
+
+    # Resample at an even spacing along the path
+    count = max(2, int(math.ceil(length / PATH_STEP)) + 1)
+    step = length / (count - 1)
+    xs, ys, thetas = [], [], []
+    cursor = 0
+    for n in range(count):
+        s = n * step
+        while cursor < len(distances) - 2 and distances[cursor + 1] < s:
+            cursor += 1
+        span = distances[cursor + 1] - distances[cursor]
+        fraction = (s - distances[cursor]) / span if span > 0 else 0.0
+        before = points[cursor]
+        after = points[cursor + 1]
+        xs.append(before[0] + (after[0] - before[0]) * fraction)
+        ys.append(before[1] + (after[1] - before[1]) * fraction)
+        thetas.append(point_headings[cursor] + (point_headings[cursor + 1] - point_headings[cursor]) * fraction)
+
+    # Direction of travel, its change (curvature) and the heading change, per meter
+    directions = []
+    for n in range(count):
+        a = max(n - 1, 0)
+        b = min(n + 1, count - 1)
+        directions.append(math.atan2(ys[b] - ys[a], xs[b] - xs[a]))
+    curvatures = []
+    turn_rates = []
+    for n in range(count):
+        a = max(n - 1, 0)
+        b = min(n + 1, count - 1)
+        distance = (b - a) * step
+        curvatures.append(math.remainder(directions[b] - directions[a], math.tau) / distance)
+        turn_rates.append((thetas[b] - thetas[a]) / distance)
+
+    # Fastest speed at every point
+    ceiling = []
+    for curvature, turn_rate in zip(curvatures, turn_rates):
+        # Driving and turning share the wheels: the outside wheel goes v + omega * r
+        speed = limits.max_speed / (1.0 + limits.radius * abs(turn_rate))
+        if abs(turn_rate) > 1e-9:
+            speed = min(speed, limits.max_angular_velocity / abs(turn_rate))
+        if abs(curvature) > 1e-9:
+            speed = min(speed, math.sqrt(limits.max_acceleration / abs(curvature)))
+        ceiling.append(speed)
+
+    # Speed up as hard as allowed from rest, then slow down in time to stop at the end
+    speeds = [0.0] * count
+    for n in range(1, count):
+        speeds[n] = min(ceiling[n], math.sqrt(speeds[n - 1] ** 2 + 2 * limits.acceleration(speeds[n - 1]) * step))
+    speeds[-1] = 0.0
+    for n in range(count - 2, -1, -1):
+        speeds[n] = min(speeds[n], math.sqrt(speeds[n + 1] ** 2 + 2 * limits.max_acceleration * step))
+
+    times = [0.0]
+    for n in range(1, count):
+        average = (speeds[n - 1] + speeds[n]) * 0.5
+        times.append(times[-1] + (step / average if average > 1e-9 else 0.0))
+
+    # Sample every PERIOD seconds
+    samples = []
+    cursor = 0
+    duration = times[-1]
+    for k in range(int(math.ceil(duration / PERIOD)) + 1):
+        t = min(k * PERIOD, duration)
+        while cursor < count - 2 and times[cursor + 1] < t:
+            cursor += 1
+        span = times[cursor + 1] - times[cursor]
+        fraction = (t - times[cursor]) / span if span > 0 else 0.0
+        a = cursor
+        b = cursor + 1
+
+        speed = speeds[a] + (speeds[b] - speeds[a]) * fraction
+        direction = directions[a] + math.remainder(directions[b] - directions[a], math.tau) * fraction
+        turn_rate = turn_rates[a] + (turn_rates[b] - turn_rates[a]) * fraction
+        samples.append((xs[a] + (xs[b] - xs[a]) * fraction,
+                        ys[a] + (ys[b] - ys[a]) * fraction,
+                        thetas[a] + (thetas[b] - thetas[a]) * fraction,
+                        speed * math.cos(direction),
+                        speed * math.sin(direction),
+                        speed * turn_rate))
+
+    return samples
+
+
+def write(path, samples, digest):
+    """
+    :param samples: from generate()
+    :param digest: Limits.digest() of the settings they were generated from
+    """
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, SAMPLE.size, PERIOD, len(samples), digest))
+        for sample in samples:
+            f.write(SAMPLE.pack(*sample))
+
+
+def read_header(path):
+    """
+    :returns: (period, sample count, digest), or None if the file is missing or not a current trajectory
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, version, sample_size, period, count, digest = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or sample_size != SAMPLE.size:
+        return None
+    return period, count, digest
+
+
+class Trajectory:
+    """
+    A generated trajectory, memory-mapped from its file.
+    """
+
+    def __init__(self, path):
+        header = read_header(path)
+        if header is None:
+            raise ValueError("Not a trajectory: %s" % path)
+        self.path = path
+        self.period, self.count, self.digest = header
+        self.duration = (self.count - 1) * self.period
+
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __repr__(self):
+        return 'trajectory %s (%.2f s)' % (os.path.basename(self.path), self.duration)
+
+    def sample(self, t):
+        """
+        :param t: seconds since the trajectory started; clamped to its ends
+        :returns: the interpolated (x, y, heading, vx, vy, omega)
+        """
+        position = t / self.period
+        if position <= 0:
+            return SAMPLE.unpack_from(self._map, HEADER.size)
+        index = int(position)
+        if index >= self.count - 1:
+            return SAMPLE.unpack_from(self._map, HEADER.size + (self.count - 1) * SAMPLE.size)
+
+        fraction = position - index
+        offset = HEADER.size + index * SAMPLE.size
+        x0, y0, heading0, vx0, vy0, omega0 = SAMPLE.unpack_from(self._map, offset)
+        x1, y1, heading1, vx1, vy1, omega1 = SAMPLE.unpack_from(self._map, offset + SAMPLE.size)
+        return (x0 + (x1 - x0) * fraction,
+                y0 + (y1 - y0) * fraction,
+                heading0 + (heading1 - heading0) * fraction,
+                vx0 + (vx1 - vx0) * fraction,
+                vy0 + (vy1 - vy0) * fraction,
+                omega0 + (omega1 - omega0) * fraction)
+
+    def close(self):
+        self._map.close()
+
+
+def path_file(directory, name):
+    """
+    :param directory: relative to the robot code, unless absolute
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), directory, name + EXTENSION)
+
+
+def load(name, trajectory_config, drivetrain_config):
+    """
+    Map a path's trajectory file, generating it first if it is missing or out of date.
+    :returns: the Trajectory
+    """
+    waypoints = trajectory_config['PATHS'][name]
+    limits = Limits.from_config(trajectory_config, drivetrain_config)
+    digest = limits.digest(waypoints)
+    path = path_file(trajectory_config['DIRECTORY'], name)
+
+    header = read_header(path)
+    if header is None or header[2] != digest:
+        log.warning("trajectory %s is missing or out of date, generating it now; run trajectory.py before deploying", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write(path, generate(waypoints, limits), digest)
+
+    return Trajectory(path)
+
+
+def load_all(trajectory_config, drivetrain_config):
+    """
+    :returns: {name: Trajectory} for every path in the config
+    """
+    return {name: load(name, trajectory_config, drivetrain_config) for name in trajectory_config['PATHS']}
+
+
+class HolonomicFollower:
+    """
+    Drives the robot along a trajectory with the odometry as feedback.
+    """
+
+    def __init__(self, drivetrain, max_speed, translation_gain, rotation_gain):
+        """
+        :param drivetrain: the SwerveDrive, with odometry
+        :param max_speed: wheel speed at a drive output of 1, meters per second
+        :param translation_gain: meters per second of correction per meter of position error
+        :param rotation_gain: radians per second of correction per radian of heading error
+        """
+        self.drivetrain = drivetrain
+        self.max_speed = max_speed
+        self.translation_gain = translation_gain
+        self.rotation_gain = rotation_gain
+
+    def command(self, trajectory, t):
+        """
+        :param t: seconds since the trajectory started
+        :returns: the (fwd, strafe, rcw) to pass to SwerveDrive.move
+        """
+        x, y, heading, vx, vy, omega = trajectory.sample(t)
+        odometry = self.drivetrain.odometry
+
+        vx += (x - odometry.x) * self.translation_gain
+        vy += (y - odometry.y) * self.translation_gain
+        omega += math.remainder(heading - odometry.heading, math.tau) * self.rotation_gain
+
+        # SwerveDrive.move is field oriented already; undo its scaling so the wheels get these speeds
+        drivetrain = self.drivetrain
+        xy_scale = self.max_speed * drivetrain.xy_multiplier
+        fwd = vx / xy_scale
+        strafe = vy / xy_scale
+        # rcw is the clockwise speed of the farthest module
+        rcw = -omega * drivetrain.kinematics.radius / (self.max_speed * drivetrain.rotation_multiplier)
+
+        if drivetrain.squared_inputs:
+            fwd = math.copysign(math.sqrt(abs(fwd)), fwd)
+            strafe = math.copysign(math.sqrt(abs(strafe)), strafe)
+            rcw = math.copysign(math.sqrt(abs(rcw)), rcw)
+
+        return fwd, strafe, rcw
+
+
+def main(argv=None):
+    from robotconfig import robotconfig
+
+    parser = argparse.ArgumentParser(description="Generate the autonomous trajectories in robotconfig")
+    parser.add_argument('--directory', help='write them here instead of the configured DIRECTORY')
+    args = parser.parse_args(argv)
+
+    trajectory_config = dict(robotconfig['TRAJECTORIES'])
+    if args.directory:
+        trajectory_config['DIRECTORY'] = args.directory
+    drivetrain_config = robotconfig['DRIVETRAIN']
+    limits = Limits.from_config(trajectory_config, drivetrain_config)
+
+    for name, waypoints in trajectory_config['PATHS'].items():
+        samples = generate(waypoints, limits)
+        path = path_file(trajectory_config['DIRECTORY'], name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write(path, samples, limits.digest(waypoints))
+        print('%-24s %6.2f s  %5d samples  %s' % (name, (len(samples) - 1) * PERIOD, len(samples), path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
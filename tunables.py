@@ -0,0 +1,98 @@
+import collections
+
+from networktables import NetworkTables
+
+
+class Tunable:
+    """
+    One dashboard setting: its NetworkTables entry, the last value
+    applied and the callbacks that push new values into the code.
+    """
+
+    __slots__ = ('key', 'entry', 'value', 'callbacks')
+
+    def __init__(self, key, entry, value):
+        self.key = key
+        self.entry = entry
+        self.value = value
+        self.callbacks = []
+
+
+class Tunables:
+    """
+    Registry of settings that can be tuned live from Shuffleboard.
+
+    Instead of reading NetworkTables every loop, each setting subscribes to
+    NT change notifications. The listener only queues the new value (it runs
+    on the NetworkTables thread); update() is called once per robot loop and
+    pushes queued values into Python attributes and PID objects. When nothing
+    changed on the dashboard, update() does no NT lookups at all.
+    """
+
+    def __init__(self):
+        self._tunables = {}
+        self._pending = collections.deque()
+
+    def register(self, key, default, callback=None):
+        """
+        Register a setting, or add a callback to one that is already registered.
+        The callback is called right away with the current value, then again
+        every time the value changes.
+        :param key: the full NetworkTables key, e.g. '/SmartDashboard/kP'
+        :param default: the value to use if the dashboard has none yet
+        :param callback: called with the new value when it changes
+        :returns: the Tunable
+        """
+        tunable = self._tunables.get(key)
+
+        if tunable is None:
+            entry = NetworkTables.getEntry(key)
+            entry.setDefaultValue(default)
+            value = entry.value
+            if value is None:
+                value = default
+
+            tunable = Tunable(key, entry, value)
+            self._tunables[key] = tunable
+
+            # Runs on the NetworkTables thread, so only queue the value here
+            pending = self._pending
+            flags = NetworkTables.NotifyFlags.NEW | NetworkTables.NotifyFlags.UPDATE
+            entry.addListener(lambda entry, key, value, param, tunable=tunable: pending.append((tunable, value)), flags)
+
+        if callback is not None:
+            tunable.callbacks.append(callback)
+            callback(tunable.value)
+
+        return tunable
+
+    def bind(self, obj, attr, key, default):
+        """
+        Keep a plain attribute of obj in sync with a dashboard setting.
+        :param obj: the object to set the attribute on
+        :param attr: the name of the attribute
+        :param key: the full NetworkTables key
+        :param default: the value to use if the dashboard has none yet
+        :returns: the Tunable
+        """
+        return self.register(key, default, lambda value: setattr(obj, attr, value))
+
+    def update(self):
+        """
+        Apply the values that changed on the dashboard since the last call.
+        Call this once per robot loop.
+        """
+        pending = self._pending
+        while pending:
+            tunable, value = pending.popleft()
+
+            if value == tunable.value:
+                continue
+
+            tunable.value = value
+            for callback in tunable.callbacks:
+                callback(value)
+
+
+# Shared by every subsystem; MyRobot calls tunables.update() each loop
+tunables = Tunables()